@@ -0,0 +1,67 @@
+"""Measure the import time and resident memory of the API and worker entry modules.
+
+Each import runs in a fresh interpreter. Run from the repository root:
+
+    python -m api.benchmarks.bench_api_import
+    python -m api.benchmarks.bench_api_import --module api.main api.services.tasks --repeat 10
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+
+HEAVY_MODULES = ["torch", "transformers", "sentence_transformers", "numpy", "PyPDF2", "docx"]
+
+PROBE = """
+import json, sys, time
+from api.services.memory import current_rss_bytes
+rss_before = current_rss_bytes()
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{
+    "seconds": seconds,
+    "rss_bytes": current_rss_bytes(),
+    "rss_delta_bytes": current_rss_bytes() - rss_before,
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(module):
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", nargs="+", default=["api.main", "api.services.tasks"])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for module in args.module:
+        try:
+            runs = [measure(module) for _ in range(args.repeat)]
+        except subprocess.CalledProcessError as err:
+            print(f"{module:>20}: import failed\n{err.stderr.strip()}")
+            continue
+        seconds = np.median([run["seconds"] for run in runs])
+        rss = np.median([run["rss_bytes"] for run in runs])
+        rss_delta = np.median([run["rss_delta_bytes"] for run in runs])
+        heavy = ", ".join(runs[0]["heavy"]) or "none"
+        print(
+            f"{module:>20}: median import {seconds:.2f}s, RSS {rss / 2**20:.0f}MB "
+            f"(+{rss_delta / 2**20:.0f}MB), heavy modules loaded: {heavy}"
+        )
+
+
+if __name__ == "__main__":
+    main()
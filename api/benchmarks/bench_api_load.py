@@ -0,0 +1,155 @@
+"""Measure API request latency under concurrent uploads, listings and status checks.
+
+Drives a running API over HTTP with --concurrency clients at once, each uploading a
+synthetic TXT document (with override, under its own filename), listing files and
+checking a status in turn. Reports the count, errors and p50/p95/p99/max latency
+of every endpoint as JSON, plus the database pool gauges from /metrics. Workers
+don't have to be running, uploads still go through extraction. Start the API,
+then run from the repository root:
+
+    uvicorn api.main:app --port 8000
+    python -m api.benchmarks.bench_api_load --url http://127.0.0.1:8000 --concurrency 32
+    python -m api.benchmarks.bench_api_load --requests 50 --size medium --output load.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import httpx
+import numpy as np
+
+from .corpus import SIZES, synthetic_text, to_txt
+
+
+async def timed(latencies, errors, endpoint, request):
+    """Await request, recording its latency, the response when it succeeded."""
+    start = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError:
+        response = None
+    latencies.setdefault(endpoint, []).append(time.perf_counter() - start)
+    if response is None or response.status_code >= 400:
+        errors[endpoint] = errors.get(endpoint, 0) + 1
+        return None
+    return response
+
+
+async def run_client(client, number, requests, document, latencies, errors):
+    for _ in range(requests):
+        response = await timed(
+            latencies,
+            errors,
+            "upload",
+            client.post(
+                "/files/upload",
+                params={"override": "true"},
+                files={"file": (f"load-{number}.txt", document, "text/plain")},
+            ),
+        )
+        await timed(latencies, errors, "list", client.get("/files/list", params={"limit": 50}))
+        if response:
+            file_id = response.json()["id"]
+            await timed(latencies, errors, "status", client.get(f"/files/status/{file_id}"))
+
+
+def pool_gauges(metrics: str):
+    gauges = {}
+    for line in metrics.splitlines():
+        if line.startswith("classifyinator_db_pool_"):
+            name, value = line.rsplit(" ", 1)
+            if "_created{" not in name:
+                gauges[name] = float(value)
+    return gauges
+
+
+async def sample_pool(client, samples, stop):
+    """Peak connections checked out of the API's pools while the load runs."""
+    while not stop.is_set():
+        try:
+            response = await client.get("/metrics")
+            for name, value in pool_gauges(response.text).items():
+                if "checked_out" in name:
+                    samples[name] = max(samples.get(name, 0), value)
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.25)
+
+
+def summarise(latencies, errors, seconds):
+    summary = {}
+    for endpoint, values in latencies.items():
+        values = np.array(values) * 1000
+        summary[endpoint] = {
+            "requests": len(values),
+            "errors": errors.get(endpoint, 0),
+            "per_second": len(values) / seconds,
+            "p50_ms": float(np.percentile(values, 50)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)),
+            "max_ms": float(values.max()),
+        }
+    return summary
+
+
+async def run(args):
+    document = to_txt(synthetic_text(SIZES[args.size], 0))
+    latencies, errors, peaks = {}, {}, {}
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_pool(client, peaks, stop))
+        start = time.perf_counter()
+        await asyncio.gather(
+            *(
+                run_client(client, number, args.requests, document, latencies, errors)
+                for number in range(args.concurrency)
+            )
+        )
+        seconds = time.perf_counter() - start
+        stop.set()
+        await sampler
+        final = pool_gauges((await client.get("/metrics")).text)
+    return {
+        "url": args.url,
+        "concurrency": args.concurrency,
+        "requests_per_client": args.requests,
+        "document_bytes": len(document),
+        "seconds": seconds,
+        "endpoints": summarise(latencies, errors, seconds),
+        "pool_peak_checked_out": peaks,
+        "pool": final,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clients running at once")
+    parser.add_argument("--requests", type=int, default=20, help="Rounds of upload, list and status per client")
+    parser.add_argument("--size", default="small", choices=list(SIZES), help="Size of the uploaded document")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="Write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    for endpoint, entry in report["endpoints"].items():
+        print(
+            f"{endpoint:>8}: {entry['requests']} requests, {entry['errors']} errors, "
+            f"p50 {entry['p50_ms']:.0f}ms p95 {entry['p95_ms']:.0f}ms p99 {entry['p99_ms']:.0f}ms "
+            f"max {entry['max_ms']:.0f}ms",
+            file=sys.stderr,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Compare the quantized and ONNX inference backends with torch on accuracy and latency.
+
+Each .txt file of the corpus directory is chunked and classified by every backend,
+scores are compared against the torch ones. Run from the repository root:
+
+    python -m api.benchmarks.bench_backends --corpus samples/
+    python -m api.benchmarks.bench_backends --model facebook/bart-large-mnli --backends torch quantized
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import numpy as np
+
+from ..models.file_model import ChunkingStrategy, ClassificationLabel, InferenceBackend, Models
+from ..services.chunking import chunk_document
+from ..services.inference import classify_chunks
+from ..services.model_registry import get_model_pipeline, model_registry
+from .bench_batched_inference import SAMPLE_PARAGRAPHS, compare
+
+
+def load_corpus(directory):
+    if not directory:
+        return {"sample": "\n\n".join(SAMPLE_PARAGRAPHS * 8)}
+    corpus = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            corpus[os.path.basename(path)] = f.read()
+    if not corpus:
+        raise SystemExit(f"No .txt files in {directory}")
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=Models.comprehend_it_base.value)
+    parser.add_argument("--corpus", help="Directory of UTF-8 .txt files, a synthetic sample if not given")
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=[backend.value for backend in InferenceBackend],
+        choices=[backend.value for backend in InferenceBackend],
+    )
+    parser.add_argument("--multi-label", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    candidate_labels = [label.value for label in ClassificationLabel]
+    corpus = load_corpus(args.corpus)
+    texts = [
+        chunk["text"]
+        for document in corpus.values()
+        for chunk in chunk_document(args.model, document, ChunkingStrategy.number)
+    ]
+    print(f"{len(corpus)} documents, {len(texts)} chunks x {len(candidate_labels)} labels with {args.model}")
+
+    # torch is the reference the others are compared with
+    backends = [InferenceBackend.torch.value] + [b for b in args.backends if b != InferenceBackend.torch.value]
+    results, timings = {}, {}
+    for backend in backends:
+        start = time.perf_counter()
+        get_model_pipeline(args.model, backend)
+        load_seconds = time.perf_counter() - start
+        weights = next(
+            entry["size_bytes"]
+            for entry in model_registry.stats()
+            if entry["kind"] == f"{backend} pipeline" and entry["name"] == args.model
+        )
+
+        values = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            results[backend] = classify_chunks(
+                args.model, texts, candidate_labels, args.multi_label, backend=backend
+            )
+            values.append(time.perf_counter() - start)
+        timings[backend] = np.median(values)
+        print(
+            f"{backend:>9}: load {load_seconds:.1f}s, weights {weights / 2**20:.0f}MB, "
+            f"median {timings[backend]:.2f}s, {len(texts) / timings[backend]:.1f} chunks/s"
+        )
+
+    for backend in backends[1:]:
+        max_diff, same_top = compare(results[InferenceBackend.torch.value], results[backend], candidate_labels)
+        print(
+            f"{backend:>9} vs torch: {timings[InferenceBackend.torch.value] / timings[backend]:.2f}x, "
+            f"max score difference {max_diff:.2e}, same top label on {same_top}/{len(texts)} chunks"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Compare the per-chunk pipeline loop with batched zero-shot inference.
+
+Run from the repository root:
+
+    python -m api.benchmarks.bench_batched_inference --model knowledgator/comprehend_it-base
+    python -m api.benchmarks.bench_batched_inference --file contract.txt --batch-size 16
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from ..models.file_model import ChunkingStrategy, ClassificationLabel, Models
+from ..services.chunking import chunk_document
+from ..services.inference import classify_chunks
+from ..services.model_registry import get_model_pipeline
+
+SAMPLE_PARAGRAPHS = [
+    "This Agreement is entered into by and between the parties and shall be governed by the laws of the State.",
+    "The API exposes a REST endpoint that accepts JSON payloads and returns the processed result with a status code.",
+    "We propose a phased rollout that reduces operating costs by twenty percent over the first fiscal year.",
+    "In this paper we evaluate transformer architectures on three benchmark datasets and report significant gains.",
+    "The festival returned to the city centre this weekend, drawing thousands of visitors despite the rain.",
+]
+
+
+def build_chunks(model_name, path, paragraphs):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = "\n\n".join(
+            " ".join([SAMPLE_PARAGRAPHS[i % len(SAMPLE_PARAGRAPHS)]] * (1 + i % 4))
+            for i in range(paragraphs)
+        )
+    chunks = chunk_document(model_name, text, ChunkingStrategy.paragraph)
+    return [chunk["text"] for chunk in chunks]
+
+
+def run_loop(model_name, texts, candidate_labels, multi_label):
+    classifier = get_model_pipeline(model_name)
+    return [classifier(text, candidate_labels, multi_label=multi_label) for text in texts]
+
+
+def compare(loop_results, batched_results, candidate_labels):
+    max_diff, same_top = 0.0, 0
+    for loop_result, batched_result in zip(loop_results, batched_results):
+        loop_scores = dict(zip(loop_result["labels"], loop_result["scores"]))
+        batched_scores = dict(zip(batched_result["labels"], batched_result["scores"]))
+        diffs = [abs(loop_scores[label] - batched_scores[label]) for label in candidate_labels]
+        max_diff = max(max_diff, max(diffs))
+        same_top += loop_result["labels"][0] == batched_result["labels"][0]
+    return max_diff, same_top
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=Models.comprehend_it_base.value)
+    parser.add_argument("--file", help="UTF-8 text file to chunk instead of the synthetic sample")
+    parser.add_argument("--paragraphs", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--multi-label", action="store_true")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    candidate_labels = [label.value for label in ClassificationLabel]
+    texts = build_chunks(args.model, args.file, args.paragraphs)
+    print(f"{len(texts)} chunks x {len(candidate_labels)} labels with {args.model}")
+
+    # warm up so model loading is not part of either timing
+    classify_chunks(args.model, texts[:1], candidate_labels, args.multi_label, args.batch_size)
+    run_loop(args.model, texts[:1], candidate_labels, args.multi_label)
+
+    timings = {"loop": [], "batched": []}
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        loop_results = run_loop(args.model, texts, candidate_labels, args.multi_label)
+        timings["loop"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        batched_results = classify_chunks(
+            args.model, texts, candidate_labels, args.multi_label, args.batch_size
+        )
+        timings["batched"].append(time.perf_counter() - start)
+
+    for name, values in timings.items():
+        print(
+            f"{name:>8}: median {np.median(values):.3f}s, "
+            f"{len(texts) / np.median(values):.1f} chunks/s"
+        )
+    print(f" speedup: {np.median(timings['loop']) / np.median(timings['batched']):.2f}x")
+
+    max_diff, same_top = compare(loop_results, batched_results, candidate_labels)
+    print(f"max score difference {max_diff:.2e}, same top label on {same_top}/{len(texts)} chunks")
+
+
+if __name__ == "__main__":
+    main()
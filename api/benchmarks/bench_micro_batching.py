@@ -0,0 +1,65 @@
+"""Classify many small documents from concurrent threads with and without micro-batching.
+
+Mimics a threads-pool worker receiving a burst of small documents. Run from the
+repository root:
+
+    python -m api.benchmarks.bench_micro_batching --threads 8 --documents 64
+    python -m api.benchmarks.bench_micro_batching --model intfloat/multilingual-e5-large-instruct --max-wait-ms 5
+"""
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .. import config
+from ..models.file_model import ClassificationLabel, Models
+from ..services.batching import get_inference_scheduler
+from ..services.inference import classify_chunks
+from .bench_batched_inference import SAMPLE_PARAGRAPHS
+
+
+def run(model_name, documents, candidate_labels, threads):
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda texts: classify_chunks(model_name, texts, candidate_labels), documents))
+        return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=Models.comprehend_it_base.value)
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent tasks, like --concurrency")
+    parser.add_argument("--documents", type=int, default=64)
+    parser.add_argument("--chunks-per-document", type=int, default=2)
+    parser.add_argument("--max-wait-ms", type=float, default=config.INFERENCE_MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    config.INFERENCE_MAX_WAIT_MS = args.max_wait_ms
+    candidate_labels = [label.value for label in ClassificationLabel]
+    documents = [
+        [SAMPLE_PARAGRAPHS[(i + j) % len(SAMPLE_PARAGRAPHS)] for j in range(args.chunks_per_document)]
+        for i in range(args.documents)
+    ]
+    chunks = args.documents * args.chunks_per_document
+    print(f"{args.documents} documents of {args.chunks_per_document} chunks from {args.threads} threads")
+
+    # warm up so model loading is not part of either timing
+    classify_chunks(args.model, documents[0], candidate_labels)
+
+    timings = {}
+    for micro_batching in (False, True):
+        config.INFERENCE_MICRO_BATCHING = micro_batching
+        name = "micro-batched" if micro_batching else "per-task"
+        timings[name] = run(args.model, documents, candidate_labels, args.threads)
+        print(f"{name:>13}: {timings[name]:.2f}s, {chunks / timings[name]:.1f} chunks/s")
+    print(f"      speedup: {timings['per-task'] / timings['micro-batched']:.2f}x")
+
+    for key, stats in get_inference_scheduler().stats().items():
+        print(
+            f"{key}: {stats['batches']} batches, mean size {stats['mean_batch_size']:.1f}, "
+            f"mean wait {stats['mean_wait_seconds'] * 1000:.1f}ms, max queue depth {stats['max_queue_depth']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Compare per-row ORM inserts with the bulk insert process_file uses for results.
+
+The per-row variant also stores every chunk's text as process_file used to, the bulk
+one only offsets and packed scores, so the database sizes are reported too. Runs
+against throwaway SQLite databases, run from the repository root:
+
+    python -m api.benchmarks.bench_persistence
+    python -m api.benchmarks.bench_persistence --chunks 2000 --runs 20 --no-pragmas
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine
+
+from ..database import set_sqlite_pragmas
+from ..models.file_model import (
+    ChunkingStrategy,
+    ClassificationLabel,
+    FileClassification,
+    FileClassificationChunk,
+    FileClassificationScore,
+    FileRecord,
+)
+from ..services.results import insert_classification_rows
+
+CANDIDATE_LABELS = [label.value for label in ClassificationLabel]
+
+
+def build_results(chunk_count, chunk_chars):
+    rng = np.random.default_rng(0)
+    label_scores = dict(zip(CANDIDATE_LABELS, rng.dirichlet(np.ones(len(CANDIDATE_LABELS))).tolist()))
+    chunks = []
+    for i in range(chunk_count):
+        chunks.append(
+            {
+                "text": "x" * chunk_chars,
+                "start": i * chunk_chars,
+                "end": (i + 1) * chunk_chars,
+                "chunk_classification": {
+                    "label": CANDIDATE_LABELS[i % len(CANDIDATE_LABELS)],
+                    "score": float(rng.random()),
+                    "model": "benchmark",
+                    "scores": dict(
+                        zip(CANDIDATE_LABELS, rng.dirichlet(np.ones(len(CANDIDATE_LABELS))).tolist())
+                    ),
+                },
+            }
+        )
+    return label_scores, chunks
+
+
+def new_classification(db, file_id):
+    file_classification = FileClassification(
+        file_id=file_id, model="benchmark", chunking_strategy=ChunkingStrategy.paragraph
+    )
+    db.add(file_classification)
+    return file_classification
+
+
+def persist_per_row(engine, file_id, label_scores, chunks):
+    """What process_file did before: commit the classification, then one ORM object per row
+    with a copy of the chunk text."""
+    with Session(engine) as db:
+        file_classification = new_classification(db, file_id)
+        db.commit()
+        db.refresh(file_classification)
+        for label, score in label_scores.items():
+            db.add(
+                FileClassificationScore(
+                    file_classification_id=file_classification.id,
+                    classification=label,
+                    classification_score=score,
+                )
+            )
+        for chunk in chunks:
+            db.add(
+                FileClassificationChunk(
+                    file_classification_id=file_classification.id,
+                    start=chunk["start"],
+                    end=chunk["end"],
+                    chunk=chunk["text"],
+                    chunk_classification_score=chunk["chunk_classification"]["score"],
+                    chunk_classification_label=chunk["chunk_classification"]["label"],
+                    model=chunk["chunk_classification"]["model"],
+                )
+            )
+        db.commit()
+
+
+def persist_bulk(engine, file_id, label_scores, chunks):
+    with Session(engine) as db:
+        file_classification = new_classification(db, file_id)
+        db.flush()
+        insert_classification_rows(db, file_classification.id, label_scores, chunks)
+        db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=500, help="Chunks per classification run")
+    parser.add_argument("--chunk-chars", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--no-pragmas", action="store_true", help="Use SQLite's defaults instead of WAL and friends"
+    )
+    args = parser.parse_args()
+
+    label_scores, chunks = build_results(args.chunks, args.chunk_chars)
+    print(
+        f"{args.runs} runs of {args.chunks} chunks ({args.chunk_chars} chars) + "
+        f"{len(label_scores)} scores, {'default' if args.no_pragmas else 'tuned'} pragmas"
+    )
+    timings, sizes = {}, {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, persist in (("per-row", persist_per_row), ("bulk", persist_bulk)):
+            # a database each, so their sizes can be compared
+            path = os.path.join(directory, f"{name}.db")
+            engine = create_engine(f"sqlite:///{path}")
+            if not args.no_pragmas:
+                event.listen(engine, "connect", set_sqlite_pragmas)
+            SQLModel.metadata.create_all(engine)
+            with Session(engine) as db:
+                file = FileRecord(filename="benchmark.txt", text_length=args.chunks * args.chunk_chars)
+                db.add(file)
+                db.commit()
+                file_id = file.id
+
+            timings[name] = []
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                persist(engine, file_id, label_scores, chunks)
+                timings[name].append(time.perf_counter() - start)
+            with engine.connect() as connection:
+                connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+            engine.dispose()
+            sizes[name] = os.path.getsize(path)
+
+    rows = args.chunks + len(label_scores)
+    for name, values in timings.items():
+        print(
+            f"{name:>8}: median {np.median(values) * 1000:.1f}ms per run, "
+            f"{rows / np.median(values):.0f} rows/s, database {sizes[name] / 2**20:.1f}MB"
+        )
+    print(f" speedup: {np.median(timings['per-row']) / np.median(timings['bulk']):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+"""Time every stage of the classification pipeline for each model on the synthetic corpus.
+
+Drives the code the API and workers run: file_reader_factory -> chunk_text ->
+group_similar_chunks -> chunk_by_token -> the model -> persistence into a throwaway
+SQLite database. Each stage reports wall time, chunks/s, tokens/s and the peak RSS
+seen while it ran, as JSON. With --baseline, stages that got slower than a previous
+run by more than --tolerance are listed and the exit code is 1. Run from the
+repository root:
+
+    python -m api.benchmarks.bench_pipeline --output results.json
+    python -m api.benchmarks.bench_pipeline --models knowledgator/comprehend_it-base --sizes small
+    python -m api.benchmarks.bench_pipeline --baseline results.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import event
+from sqlmodel import Session, SQLModel, create_engine
+
+from .. import config
+from ..database import set_sqlite_pragmas
+from ..models.file_model import (
+    ChunkingStrategy,
+    ClassificationLabel,
+    FileClassification,
+    FileRecord,
+    Models,
+)
+from ..services.chunking import (
+    DEFAULT_CHUNK_SIZE,
+    chunk_by_token,
+    chunk_text,
+    group_similar_chunks,
+    normalise_newlines,
+    sentence_breaks,
+    tokenize_with_offsets,
+    word_breaks,
+)
+from ..services.embeddings import embed_paragraphs, embedding_cache
+from ..services.extraction import file_reader_factory
+from ..services.inference import classify_chunks
+from ..services.memory import current_rss_bytes
+from ..services.model_registry import SIMILARITY_MODEL
+from ..services.results import insert_classification_rows
+from .corpus import FORMATS, SIZES, build_corpus
+
+
+class Stage:
+    """Times a block and samples the process RSS every interval seconds while it runs."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.seconds = None
+        self.peak_rss_bytes = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss_bytes = max(self.peak_rss_bytes or 0, current_rss_bytes() or 0)
+
+    def __enter__(self):
+        self.peak_rss_bytes = current_rss_bytes()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+        self._sampler.start()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._start
+        self._stop.set()
+        self._sampler.join()
+        self.peak_rss_bytes = max(self.peak_rss_bytes or 0, current_rss_bytes() or 0) or None
+
+
+def row(stage, model, document, timer, chunks=None, tokens=None):
+    return {
+        "stage": stage,
+        "model": model,
+        "document": document,
+        "seconds": timer.seconds,
+        "chunks": chunks,
+        "tokens": tokens,
+        "peak_rss_bytes": timer.peak_rss_bytes,
+    }
+
+
+def persist(engine, text, model, chunks, results):
+    """Store one run like process_file does, a classification and its score and chunk rows."""
+    label_scores = {}
+    weights = [len(chunk["text"].split()) for chunk in chunks]
+    for label in results[0]["labels"] if results else []:
+        scores = [dict(zip(result["labels"], result["scores"]))[label] for result in results]
+        label_scores[label] = float(np.average(scores, weights=weights))
+    for chunk, result in zip(chunks, results):
+        chunk["chunk_classification"] = {
+            "label": result["labels"][0],
+            "score": result["scores"][0],
+            "model": model,
+            "scores": dict(zip(result["labels"], result["scores"])),
+        }
+    with Session(engine) as db:
+        file = FileRecord(filename="benchmark", text_length=len(text))
+        db.add(file)
+        db.flush()
+        file_classification = FileClassification(
+            file_id=file.id, model=model, chunking_strategy=ChunkingStrategy.paragraph
+        )
+        db.add(file_classification)
+        db.flush()
+        insert_classification_rows(db, file_classification.id, label_scores, chunks)
+        db.commit()
+
+
+def run_document(engine, name, contents, models, candidate_labels, chunk_size):
+    """Rows for every stage of one document, the model independent stages come first."""
+    rows = []
+    with Stage() as timer:
+        text = normalise_newlines(file_reader_factory(name).read(contents))
+    rows.append(row("extract", None, name, timer))
+
+    with Stage() as timer:
+        paragraphs = chunk_text(text)
+    rows.append(row("chunk_text", None, name, timer, chunks=len(paragraphs)))
+
+    # the embeddings of earlier runs would otherwise be cache hits
+    embedding_cache.clear()
+    with Stage() as timer:
+        groups = group_similar_chunks(paragraphs)
+    rows.append(row("group_similar_chunks", SIMILARITY_MODEL, name, timer, chunks=len(groups)))
+
+    for model in models:
+        with Stage() as timer:
+            offsets = tokenize_with_offsets(model, text)
+            breaks = [sentence_breaks(text, offsets), word_breaks(text, offsets)]
+            chunks = []
+            for group in groups:
+                chunks.extend(chunk_by_token(text, offsets, group, chunk_size, breaks))
+        tokens = sum(chunk["token_count"] for chunk in chunks)
+        rows.append(row("chunk_by_token", model, name, timer, chunks=len(chunks), tokens=tokens))
+
+        with Stage() as timer:
+            results = classify_chunks(model, [chunk["text"] for chunk in chunks], candidate_labels)
+        rows.append(row("classify", model, name, timer, chunks=len(chunks), tokens=tokens))
+
+        with Stage() as timer:
+            persist(engine, text, model, chunks, results)
+        rows.append(row("persist", model, name, timer, chunks=len(chunks), tokens=tokens))
+    return rows
+
+
+def summarise(rows):
+    """Totals per (stage, model) over the corpus, the median run of each document is used."""
+    by_key = {}
+    for entry in rows:
+        by_key.setdefault((entry["stage"], entry["model"], entry["document"]), []).append(entry)
+    totals = {}
+    for (stage, model, _), runs in by_key.items():
+        total = totals.setdefault(
+            (stage, model),
+            {
+                "stage": stage,
+                "model": model,
+                "seconds": 0.0,
+                "chunks": None,
+                "tokens": None,
+                "peak_rss_bytes": None,
+            },
+        )
+        total["seconds"] += float(np.median([run["seconds"] for run in runs]))
+        for field in ("chunks", "tokens"):
+            if runs[0][field] is not None:
+                total[field] = (total[field] or 0) + runs[0][field]
+        peaks = [run["peak_rss_bytes"] for run in runs if run["peak_rss_bytes"]]
+        if peaks:
+            total["peak_rss_bytes"] = max(total["peak_rss_bytes"] or 0, max(peaks))
+    for total in totals.values():
+        for field in ("chunks", "tokens"):
+            known = total[field] is not None and total["seconds"]
+            total[f"{field}_per_second"] = total[field] / total["seconds"] if known else None
+    return list(totals.values())
+
+
+def compare(summary, baseline, tolerance):
+    """Stages of summary more than tolerance slower than the same stage in baseline."""
+    previous = {(entry["stage"], entry["model"]): entry for entry in baseline["summary"]}
+    regressions = []
+    for entry in summary:
+        before = previous.get((entry["stage"], entry["model"]))
+        if before and before["seconds"] and entry["seconds"] > before["seconds"] * (1 + tolerance):
+            regressions.append(
+                {
+                    "stage": entry["stage"],
+                    "model": entry["model"],
+                    "seconds": entry["seconds"],
+                    "baseline_seconds": before["seconds"],
+                    "ratio": entry["seconds"] / before["seconds"],
+                }
+            )
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", nargs="+", default=[model.value for model in Models])
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=list(SIZES))
+    parser.add_argument("--formats", nargs="+", default=FORMATS, choices=FORMATS)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per document, the median is reported")
+    parser.add_argument("--output", help="Write the JSON here instead of stdout")
+    parser.add_argument("--baseline", help="JSON of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown over the baseline")
+    args = parser.parse_args()
+
+    candidate_labels = [label.value for label in ClassificationLabel]
+    corpus = build_corpus(args.sizes, args.formats)
+
+    # model loading is reported on its own so it isn't part of the first document's stages
+    load_rows, models, errors = [], [], {}
+    with Stage() as timer:
+        embed_paragraphs(["warm up"])
+    load_rows.append(row("load", SIMILARITY_MODEL, None, timer))
+    for model in args.models:
+        try:
+            with Stage() as timer:
+                classify_chunks(model, ["warm up"], candidate_labels)
+        except Exception as err:
+            errors[model] = str(err)
+            print(f"Skipping {model}: {err}", file=sys.stderr)
+            continue
+        load_rows.append(row("load", model, None, timer))
+        models.append(model)
+
+    rows = list(load_rows)
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_engine(f"sqlite:///{os.path.join(directory, 'benchmark.db')}")
+        event.listen(engine, "connect", set_sqlite_pragmas)
+        SQLModel.metadata.create_all(engine)
+        for _ in range(args.repeat):
+            for name, document in corpus:
+                print(f"{name}...", file=sys.stderr)
+                rows.extend(
+                    run_document(
+                        engine, name, document["contents"], models, candidate_labels, args.chunk_size
+                    )
+                )
+        engine.dispose()
+
+    summary = summarise(rows)
+    report = {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "chunk_size": args.chunk_size,
+            "repeat": args.repeat,
+            "inference_batch_size": config.INFERENCE_BATCH_SIZE,
+            "inference_micro_batching": config.INFERENCE_MICRO_BATCHING,
+            "inference_backend": config.INFERENCE_BACKEND,
+        },
+        "documents": [
+            {
+                "name": name,
+                "size": document["size"],
+                "format": document["format"],
+                "bytes": len(document["contents"]),
+            }
+            for name, document in corpus
+        ],
+        "errors": errors,
+        "summary": summary,
+        "runs": rows,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["regressions"] = compare(summary, json.load(f), args.tolerance)
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    for entry in summary:
+        throughput = f", {entry['chunks_per_second']:.1f} chunks/s" if entry["chunks_per_second"] else ""
+        if entry["tokens_per_second"]:
+            throughput += f", {entry['tokens_per_second']:.0f} tokens/s"
+        print(
+            f"{entry['stage']:>20} {entry['model'] or '':<40} {entry['seconds']:.2f}s{throughput}, "
+            f"peak RSS {(entry['peak_rss_bytes'] or 0) / 2**20:.0f}MB",
+            file=sys.stderr,
+        )
+    for regression in report.get("regressions", []):
+        print(
+            f"Regression: {regression['stage']} {regression['model'] or ''} {regression['ratio']:.2f}x "
+            f"({regression['baseline_seconds']:.2f}s -> {regression['seconds']:.2f}s)",
+            file=sys.stderr,
+        )
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Compare the document throughput of a threads worker with a prefork worker on this machine.
+
+Both pools run the worker's classification path (chunk_document -> classify_chunks)
+over the same synthetic documents, --concurrency documents at a time:
+
+    threads  one process with a thread per task, sharing torch's thread pool and the
+             GIL, like `celery worker --pool=threads`
+    prefork  the model is loaded in a parent that forks --concurrency children, each
+             running torch on its share of the CPUs (WORKER_TORCH_THREADS), like
+             `celery worker --pool=prefork`
+
+Each pool runs in a fresh interpreter after a warm up round. Documents are chunked
+by token count, so the similarity model isn't needed. Reports documents/s, chunks/s
+and the RSS and PSS of every process as JSON. The children's PSS adds up to what they
+take together, their RSS counts the shared weights once per child. Run from the
+repository root:
+
+    python -m api.benchmarks.bench_worker_pools --concurrency 4 --documents 32
+    python -m api.benchmarks.bench_worker_pools --model facebook/bart-large-mnli --size medium --output pools.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+from .. import config
+from ..models.file_model import ChunkingStrategy, ClassificationLabel, Models
+from ..services.chunking import DEFAULT_CHUNK_SIZE, chunk_document
+from ..services.inference import classify_chunks
+from ..services.memory import format_bytes, process_memory
+from ..services.model_registry import preload_models
+from ..services.worker_processes import (
+    available_cpus,
+    freeze_parent,
+    init_child,
+    prepare_parent,
+    set_torch_threads,
+)
+from .corpus import SIZES, synthetic_text
+
+POOLS = ["threads", "prefork"]
+CANDIDATE_LABELS = [label.value for label in ClassificationLabel]
+
+
+def classify_document(job):
+    """Chunk and classify one document, returning the process it ran in, its chunks and memory."""
+    model, text, chunk_size = job
+    chunks = chunk_document(model, text, ChunkingStrategy.number, chunk_size)
+    classify_chunks(model, [chunk["text"] for chunk in chunks], CANDIDATE_LABELS)
+    return os.getpid(), len(chunks), torch.get_num_threads(), process_memory()
+
+
+def run_pool(pool, model, concurrency, documents, size, chunk_size):
+    """Throughput of one pool kind, run in this process (and the children it forks)."""
+    jobs = [(model, synthetic_text(SIZES[size], seed), chunk_size) for seed in range(documents)]
+    warm_up = [
+        (model, synthetic_text(SIZES["small"], documents + seed), chunk_size)
+        for seed in range(concurrency)
+    ]
+    if pool == "prefork":
+        prepare_parent(concurrency)
+    else:
+        set_torch_threads()
+    preload_models([model])
+
+    if pool == "prefork":
+        freeze_parent()
+        context = multiprocessing.get_context("fork")
+        with context.Pool(concurrency, initializer=init_child) as workers:
+            workers.map(classify_document, warm_up, chunksize=1)
+            start = time.perf_counter()
+            results = workers.map(classify_document, jobs, chunksize=1)
+            seconds = time.perf_counter() - start
+    else:
+        with ThreadPoolExecutor(concurrency) as workers:
+            list(workers.map(classify_document, warm_up))
+            start = time.perf_counter()
+            results = list(workers.map(classify_document, jobs))
+            seconds = time.perf_counter() - start
+
+    # the largest reading of every process, the parent's is taken last
+    processes = {}
+    for pid, _, torch_threads, memory in results:
+        entry = processes.setdefault(pid, {"pid": pid, "torch_threads": torch_threads, "documents": 0})
+        entry["documents"] += 1
+        for kind, value in memory.items():
+            if value is not None:
+                entry[kind] = max(entry.get(kind, 0), value)
+    parent = {"pid": os.getpid(), "torch_threads": torch.get_num_threads(), **process_memory()}
+    children = [entry for pid, entry in processes.items() if pid != parent["pid"]]
+    chunks = sum(count for _, count, _, _ in results)
+    everyone = [parent, *children]
+    return {
+        "pool": pool,
+        "seconds": seconds,
+        "documents": documents,
+        "chunks": chunks,
+        "documents_per_second": documents / seconds,
+        "chunks_per_second": chunks / seconds,
+        "parent": parent,
+        "children": children,
+        "total_rss_bytes": sum(entry.get("rss") or 0 for entry in everyone),
+        "total_pss_bytes": (
+            sum(entry["pss"] for entry in everyone) if all(entry.get("pss") for entry in everyone) else None
+        ),
+    }
+
+
+def run_in_subprocess(pool, args):
+    command = [
+        sys.executable,
+        "-m",
+        "api.benchmarks.bench_worker_pools",
+        "--run-pool",
+        pool,
+        "--model",
+        args.model,
+        "--concurrency",
+        str(args.concurrency),
+        "--documents",
+        str(args.documents),
+        "--size",
+        args.size,
+        "--chunk-size",
+        str(args.chunk_size),
+    ]
+    completed = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True)
+    return json.loads(completed.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=Models.comprehend_it_base.value)
+    parser.add_argument("--concurrency", type=int, default=4, help="Tasks at a time, threads or children")
+    parser.add_argument("--documents", type=int, default=16, help="Documents classified by each pool")
+    parser.add_argument("--size", default="small", choices=list(SIZES), help="Size of every document")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--pools", nargs="+", default=POOLS, choices=POOLS)
+    parser.add_argument("--output", help="Write the JSON here instead of stdout")
+    # runs one pool in this process, how main runs each of them in a fresh interpreter
+    parser.add_argument("--run-pool", choices=POOLS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_pool:
+        result = run_pool(
+            args.run_pool, args.model, args.concurrency, args.documents, args.size, args.chunk_size
+        )
+        print(json.dumps(result))
+        return
+
+    runs = []
+    for pool in args.pools:
+        print(f"{pool}...", file=sys.stderr)
+        runs.append(run_in_subprocess(pool, args))
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": available_cpus(),
+        "settings": {
+            "model": args.model,
+            "concurrency": args.concurrency,
+            "documents": args.documents,
+            "size": args.size,
+            "chunk_size": args.chunk_size,
+            "worker_torch_threads": config.WORKER_TORCH_THREADS,
+            "inference_batch_size": config.INFERENCE_BATCH_SIZE,
+            "inference_micro_batching": config.INFERENCE_MICRO_BATCHING,
+            "inference_backend": config.INFERENCE_BACKEND,
+        },
+        "runs": runs,
+    }
+    by_pool = {run["pool"]: run for run in runs}
+    if len(by_pool) == len(POOLS):
+        report["prefork_speedup"] = (
+            by_pool["prefork"]["documents_per_second"] / by_pool["threads"]["documents_per_second"]
+        )
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    for run in runs:
+        print(
+            f"{run['pool']:>8}: {run['documents_per_second']:.2f} documents/s, "
+            f"{run['chunks_per_second']:.1f} chunks/s, {len(run['children']) or 1} processes, "
+            f"RSS {format_bytes(run['total_rss_bytes'])}, PSS {format_bytes(run['total_pss_bytes'])}",
+            file=sys.stderr,
+        )
+    if "prefork_speedup" in report:
+        print(f"prefork is {report['prefork_speedup']:.2f}x threads", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
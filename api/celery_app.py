@@ -1,53 +1,142 @@
+from typing import List, Optional
+
 from celery import Celery
-from celery.signals import worker_process_init
+from celery.signals import (
+    celeryd_after_setup,
+    task_postrun,
+    worker_init,
+    worker_process_init,
+    worker_process_shutdown,
+)
 
-import torch
-from functools import lru_cache
+from api import config
 from api.models.file_model import Models
-from api.database import create_db_and_tables
-from transformers import pipeline, AutoTokenizer
-from sentence_transformers import SentenceTransformer
 
+# Kept free of the ML libraries, the API imports this module to enqueue tasks by name
+# and only workers import the task module (through include)
+PROCESS_FILE_TASK = "api.services.tasks.process_file"
+
+SIZE_TIERS = ["small", "large"]
 
 celery_app = Celery(
-    "tasks", broker="redis://localhost:6379/0", backend="redis://localhost:6379/0"
+    "tasks",
+    broker=config.REDIS_URL,
+    backend=config.REDIS_URL,
+    include=["api.services.tasks"],
 )
-celery_app.autodiscover_tasks(["api.services.file_services"])
+celery_app.conf.update(
+    # poll a worker's queues in the order it subscribed to them, small tiers first
+    broker_transport_options={"queue_order_strategy": "priority"},
+    # don't hold queued small documents behind a long task already running
+    worker_prefetch_multiplier=1,
+)
+
+
+def size_tier(text_length: Optional[int]) -> str:
+    if text_length is not None and text_length < config.SMALL_DOCUMENT_CHARS:
+        return "small"
+    return "large"
+
+
+def process_file_queue(model_name: str, text_length: Optional[int]) -> str:
+    return f"{Models(model_name).name}.{size_tier(text_length)}"
+
+
+def worker_queues(model_names: List[str], tiers: List[str]) -> List[str]:
+    return [f"{Models(model_name).name}.{tier}" for tier in tiers for model_name in model_names]
+
+
+@celeryd_after_setup.connect
+def subscribe_to_model_queues(sender, instance, **kwargs):
+    queues = instance.app.amqp.queues
+    default_queue = celery_app.conf.task_default_queue
+    if set(queues.consume_from) - {default_queue}:
+        # queues given with -Q
+        return
+    from api.services.model_registry import models_to_preload
 
-def get_device():
-    if torch.cuda.is_available():
-        return "cuda"
+    # the similarity model has no queue of its own
+    model_names = [
+        name for name in models_to_preload(config.PRELOAD_MODELS) if name in Models._value2member_map_
+    ]
+    if config.WORKER_LAZY_MODELS:
+        # the other models are loaded on first use, after the preloaded ones in each tier,
+        # so requests for them aren't left in a queue nobody consumes
+        model_names += [model.value for model in Models if model.value not in model_names]
+    tiers = [tier.strip() for tier in config.WORKER_SIZE_TIERS.split(",") if tier.strip()]
+    for tier in tiers:
+        if tier not in SIZE_TIERS:
+            raise ValueError(f"Unknown size tier in WORKER_SIZE_TIERS: {tier}")
+    for queue in worker_queues(model_names or [model.value for model in Models], tiers):
+        queues.select_add(queue)
+    # only the model queues, not celery's default one
+    queues.deselect(default_queue)
+    print(f"Consuming from queues: {', '.join(queues.consume_from)}")
+
+
+@worker_init.connect
+def serve_worker_metrics(**kwargs):
+    if not config.WORKER_METRICS_PORT:
+        return
+    from api.services.metrics import serve_metrics
+
+    try:
+        serve_metrics(config.WORKER_METRICS_PORT)
+    except OSError as err:
+        # e.g. a second worker on the same host, give it its own WORKER_METRICS_PORT
+        print(f"Not serving metrics on port {config.WORKER_METRICS_PORT}: {err}")
+        return
+    print(f"Serving metrics on port {config.WORKER_METRICS_PORT}")
+
+
+def uses_prefork(worker) -> bool:
+    from celery.concurrency import get_implementation
+
+    return get_implementation(worker.pool_cls).__module__ == "celery.concurrency.prefork"
+
+
+@worker_init.connect
+def preload_models_for_worker(sender, **kwargs):
+    # worker_init runs in the parent, a prefork pool's children share what it loads
+    from api.services.memory import format_bytes
+    from api.services.model_registry import models_to_preload, preload_models
+    from api.services.worker_processes import freeze_parent, prepare_parent, set_torch_threads
+
+    prefork = uses_prefork(sender)
+    if prefork:
+        threads = prepare_parent(sender.concurrency)
+        print(f"Prefork pool of {sender.concurrency} processes, {threads} torch threads each")
     else:
-        return "cpu"
+        set_torch_threads()
+    model_names = models_to_preload(config.PRELOAD_MODELS)
+    if not model_names:
+        print("No models to preload, they are loaded on first use.")
+    else:
+        print(f"Preloading models for Celery worker: {', '.join(model_names)}")
+        preload_models(model_names)
+        print("Models preloaded successfully for Celery worker.")
+    if prefork:
+        memory = freeze_parent()
+        print(f"Models shared with the pool's processes, parent RSS {format_bytes(memory['rss'])}")
+
 
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    from api.services.worker_processes import init_child
 
-@lru_cache(maxsize=6)
-def get_model_pipeline(model_name, multi_label=False):
-    print(f"Loading model {model_name}")
-    device = get_device()
-    print(f"Using device {device}")
-    return pipeline("zero-shot-classification", model=model_name, device=device, multi_label=multi_label)
+    init_child()
 
 
-@lru_cache(maxsize=3)
-def get_tokenizer(model_name):
-    return AutoTokenizer.from_pretrained(model_name, use_fast=True)
+@worker_process_shutdown.connect
+def shutdown_worker_process(**kwargs):
+    from api.services.metrics import mark_process_dead
 
+    mark_process_dead()
 
-@lru_cache(maxsize=1)
-def get_embed_model(model_name="all-MiniLM-L6-v2"):
-    device = get_device()
-    return SentenceTransformer(model_name, device=device)
 
+@task_postrun.connect
+def record_memory_after_task(**kwargs):
+    # per process, every child of a prefork worker reports its own
+    from api.services.metrics import record_worker_memory
 
-@celery_app.on_after_finalize.connect
-def preload_models_for_worker(**kwargs):
-    print("Preloading models for Celery worker...")
-    # Preload the embedding model
-    get_embed_model()
-    # Preload the classification models and their tokenizers
-    for model in Models:
-        get_model_pipeline(model.value)
-        get_model_pipeline(model.value, True)
-        get_tokenizer(model.value)
-    print("Models preloaded successfully for Celery worker.")
\ No newline at end of file
+    record_worker_memory()
@@ -0,0 +1,123 @@
+import os
+
+# Number of (chunk, hypothesis) pairs sent through an NLI model in one forward pass
+INFERENCE_BATCH_SIZE = int(os.getenv("INFERENCE_BATCH_SIZE", "32"))
+# Forward passes of concurrent tasks in a worker are merged into shared batches, a batch
+# waits at most INFERENCE_MAX_WAIT_MS for more work before it runs
+INFERENCE_MICRO_BATCHING = os.getenv("INFERENCE_MICRO_BATCHING", "true").lower() in ("1", "true", "yes")
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Chunk classification cache, "disk" (local SQLite file), "redis" or "none"
+CLASSIFICATION_CACHE_BACKEND = os.getenv("CLASSIFICATION_CACHE_BACKEND", "disk")
+CLASSIFICATION_CACHE_PATH = os.getenv(
+    "CLASSIFICATION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "classification_cache.db"),
+)
+CLASSIFICATION_CACHE_MAX_ENTRIES = int(os.getenv("CLASSIFICATION_CACHE_MAX_ENTRIES", "200000"))
+
+# Embedding classifier, cosine similarities are scaled before softmax (single label) and
+# shifted by the threshold before the sigmoid (multi label)
+EMBEDDING_LOGIT_SCALE = float(os.getenv("EMBEDDING_LOGIT_SCALE", "50"))
+EMBEDDING_MULTI_LABEL_THRESHOLD = float(os.getenv("EMBEDDING_MULTI_LABEL_THRESHOLD", "0.8"))
+
+# Paragraph embeddings kept in memory by each worker for semantic merging
+PARAGRAPH_EMBEDDING_CACHE_SIZE = int(os.getenv("PARAGRAPH_EMBEDDING_CACHE_SIZE", "50000"))
+
+# Upload text extraction runs in a process pool so it never blocks the API event loop
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", "2"))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+MAX_PDF_PAGES = int(os.getenv("MAX_PDF_PAGES", "500"))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "1000"))
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_BYTES", str(500 * 1024 * 1024)))
+
+# Progress events for /files/events, "auto" uses Redis when it is reachable and falls
+# back to in-process pub/sub, which only reaches subscribers in the same process
+PROGRESS_BACKEND = os.getenv("PROGRESS_BACKEND", "auto")
+# Chunks classified between two progress events
+PROGRESS_CHUNK_INTERVAL = int(os.getenv("PROGRESS_CHUNK_INTERVAL", "32"))
+# Seconds between keep-alive comments on an idle event stream
+PROGRESS_HEARTBEAT_SECONDS = float(os.getenv("PROGRESS_HEARTBEAT_SECONDS", "15"))
+
+# Results database, api/database.db when not set. The API's routers reach it through an
+# async driver, aiosqlite for SQLite and asyncpg for Postgres URLs without a driver
+DATABASE_URL = os.getenv("DATABASE_URL")
+# echo logs every statement
+DATABASE_ECHO = os.getenv("DATABASE_ECHO", "false").lower() in ("1", "true", "yes")
+# Connections each engine keeps open, how many more it may open under load, and the
+# seconds a request waits for a free connection before failing
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+# Milliseconds a connection waits for another writer before "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Page cache per connection
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+
+# Models a worker keeps loaded, least recently used ones are unloaded past this many MB
+# of weights. A model larger than the budget is still loaded, on its own
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "6144"))
+# Comma separated models loaded when a worker starts, "all", or empty to load on first use
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "knowledgator/comprehend_it-base,all-MiniLM-L6-v2")
+
+# How NLI models run when a request doesn't choose: "torch", "quantized" (dynamic int8)
+# or "onnx" (ONNX Runtime, needs optimum[onnxruntime])
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+# Quantized weights and ONNX exports are converted once and kept here
+MODEL_ARTIFACT_DIR = os.getenv(
+    "MODEL_ARTIFACT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_artifacts"),
+)
+
+# Tasks go to a queue per model and size tier ("<model>.small" or "<model>.large"),
+# documents shorter than this many characters take the small lane
+SMALL_DOCUMENT_CHARS = int(os.getenv("SMALL_DOCUMENT_CHARS", "20000"))
+# Size tiers a worker consumes, small first. Its models come from PRELOAD_MODELS (every
+# model when that is empty or WORKER_LAZY_MODELS is on), celery's -Q option overrides all
+WORKER_SIZE_TIERS = os.getenv("WORKER_SIZE_TIERS", "small,large")
+# Whether a worker also consumes the queues of the models it doesn't preload, loading them
+# on first use. false leaves those models to other workers, which must preload them
+WORKER_LAZY_MODELS = os.getenv("WORKER_LAZY_MODELS", "true").lower() in ("1", "true", "yes")
+# Intra-op threads torch uses in each child of a prefork worker (--pool=prefork), 0 splits
+# the CPUs the worker may use evenly between its --concurrency children. Other pools keep
+# torch's default unless this is set
+WORKER_TORCH_THREADS = int(os.getenv("WORKER_TORCH_THREADS", "0"))
+
+# Cascade mode, a chunk is classified again by the cascade model when the first model's
+# top score or its margin over the second label is below these
+CASCADE_MIN_SCORE = float(os.getenv("CASCADE_MIN_SCORE", "0.5"))
+CASCADE_MIN_MARGIN = float(os.getenv("CASCADE_MIN_MARGIN", "0.2"))
+
+# Adaptive mode, chunks are classified ADAPTIVE_ROUND_CHUNKS at a time in stratified random
+# order until the top label's lead is clear at ADAPTIVE_CONFIDENCE (after at least
+# ADAPTIVE_MIN_CHUNKS), or the chunk or time budget runs out
+ADAPTIVE_ROUND_CHUNKS = int(os.getenv("ADAPTIVE_ROUND_CHUNKS", "16"))
+ADAPTIVE_MIN_CHUNKS = int(os.getenv("ADAPTIVE_MIN_CHUNKS", "32"))
+ADAPTIVE_MAX_CHUNKS = int(os.getenv("ADAPTIVE_MAX_CHUNKS", "256"))
+ADAPTIVE_TIME_BUDGET_SECONDS = float(os.getenv("ADAPTIVE_TIME_BUDGET_SECONDS", "120"))
+ADAPTIVE_CONFIDENCE = float(os.getenv("ADAPTIVE_CONFIDENCE", "0.95"))
+
+# Port each worker serves its Prometheus /metrics on, 0 to not serve them. The API serves
+# its own on /metrics. Forking servers need PROMETHEUS_MULTIPROC_DIR set as well
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9808"))
+# cProfile stats of runs started with "profile": true are written here
+PROFILE_DIR = os.getenv(
+    "PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"),
+)
+
+# Extracted text, and the uploaded files when BLOB_STORE_UPLOADS is set, are stored here
+# as content addressed files instead of in the database. The API and the workers need to
+# see the same directory
+BLOB_STORE_DIR = os.getenv(
+    "BLOB_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "blobs"),
+)
+BLOB_STORE_UPLOADS = os.getenv("BLOB_STORE_UPLOADS", "false").lower() in ("1", "true", "yes")
+
+# Identical process requests attach to a task queued or started less than this many seconds
+# ago instead of enqueuing another, older ones are taken for dead workers
+TASK_COALESCE_SECONDS = int(os.getenv("TASK_COALESCE_SECONDS", "3600"))
+# Most seconds between a running task's checks for having been cancelled
+TASK_CANCEL_CHECK_SECONDS = float(os.getenv("TASK_CANCEL_CHECK_SECONDS", "1"))
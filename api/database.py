@@ -1,14 +1,78 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlmodel import create_engine, SQLModel, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 import os
 
+from . import config
+from .services.metrics import instrument_pool
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'database.db')}"
+DATABASE_URL = config.DATABASE_URL or f"sqlite:///{os.path.join(BASE_DIR, 'database.db')}"
+
+# drivers the async engine uses for URLs that don't name one
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def async_database_url(url: str):
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+
+POOL_OPTIONS = {
+    "pool_size": config.DATABASE_POOL_SIZE,
+    "max_overflow": config.DATABASE_MAX_OVERFLOW,
+    "pool_timeout": config.DATABASE_POOL_TIMEOUT,
+}
+POOL_LIMIT = config.DATABASE_POOL_SIZE + max(config.DATABASE_MAX_OVERFLOW, 0)
+
+# workers, migrations and scripts use the sync engine, the API's routers the async one
+engine = create_engine(DATABASE_URL, echo=config.DATABASE_ECHO, poolclass=QueuePool, **POOL_OPTIONS)
+async_engine = create_async_engine(
+    async_database_url(DATABASE_URL),
+    echo=config.DATABASE_ECHO,
+    poolclass=AsyncAdaptedQueuePool,
+    **POOL_OPTIONS,
+)
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Let the API and the worker threads read while a task is writing results.
+
+    WAL keeps readers off the writer's lock, synchronous=NORMAL is durable in WAL
+    mode apart from the last commits on power loss, and busy_timeout makes a
+    writer wait for another one instead of failing with "database is locked".
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+# the aiosqlite connection takes the same pragmas through its sync adapter
+for name, sync_engine in (("sync", engine), ("async", async_engine.sync_engine)):
+    if sync_engine.dialect.name == "sqlite":
+        event.listen(sync_engine, "connect", set_sqlite_pragmas)
+    instrument_pool(sync_engine, name, POOL_LIMIT)
 
-engine = create_engine(DATABASE_URL, echo=True)
 
 def create_db_and_tables():
+    from .migrations import run_migrations
+
     SQLModel.metadata.create_all(engine)
+    run_migrations(engine)
 
 def get_session():
     with Session(engine) as session:
-        yield session
\ No newline at end of file
+        yield session
+
+
+async def get_async_session():
+    # objects stay loaded after a commit, an AsyncSession can't lazily reload them
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
@@ -1,12 +1,14 @@
 from typing import Annotated
 from api.models.file_model import Models
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import Session
-from .database import create_db_and_tables, get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .database import async_engine, create_db_and_tables, get_async_session
 from .routers import files as file_routes
+from .services.extraction import shutdown_extraction_pool
+from .services.metrics import render_metrics
 
-SessionDep = Annotated[Session, Depends(get_session)]
+SessionDep = Annotated[AsyncSession, Depends(get_async_session)]
 
 origins = [
     "http://localhost:3000",
@@ -24,6 +26,19 @@ app.add_middleware(
 
 app.include_router(file_routes.router)
 
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 @app.on_event("startup")
 def on_startup():
     create_db_and_tables()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    shutdown_extraction_pool()
+    await async_engine.dispose()
@@ -0,0 +1,327 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, text
+
+# create_all only creates missing tables, schema changes to existing tables are
+# applied here once per database, in order. New databases already have them, so
+# every migration has to be safe to run against an up to date schema.
+
+
+def add_column(connection, table: str, column: str, ddl: str):
+    columns = {c["name"] for c in inspect(connection).get_columns(table)}
+    if column not in columns:
+        connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def add_index(connection, table: str, name: str, columns: str):
+    connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+
+def backfill_top_label(connection):
+    connection.execute(
+        text(
+            "UPDATE fileclassification SET "
+            "top_label = (SELECT s.classification FROM fileclassificationscore s "
+            "WHERE s.file_classification_id = fileclassification.id "
+            "ORDER BY s.classification_score DESC LIMIT 1), "
+            "top_score = (SELECT MAX(s.classification_score) FROM fileclassificationscore s "
+            "WHERE s.file_classification_id = fileclassification.id) "
+            "WHERE top_label IS NULL"
+        )
+    )
+
+
+def backfill_chunk_model(connection):
+    # before cascades every chunk was scored by its classification's model
+    connection.execute(
+        text(
+            "UPDATE fileclassificationchunk SET model = (SELECT c.model FROM fileclassification c "
+            "WHERE c.id = fileclassificationchunk.file_classification_id) WHERE model IS NULL"
+        )
+    )
+
+
+def backfill_chunk_counts(connection):
+    # runs before adaptive mode classified every chunk
+    connection.execute(
+        text(
+            "UPDATE fileclassification SET chunks_total = (SELECT COUNT(*) FROM fileclassificationchunk c "
+            "WHERE c.file_classification_id = fileclassification.id) WHERE chunks_total IS NULL"
+        )
+    )
+    connection.execute(
+        text(
+            "UPDATE fileclassification SET chunks_classified = chunks_total "
+            "WHERE chunks_classified IS NULL"
+        )
+    )
+
+
+def compact_chunks(connection):
+    # chunk text used to be copied into every row, it is sliced from the file's text now.
+    # SQLite can't drop the NOT NULL of chunk in place, so the table is rebuilt, keeping
+    # the text only of rows that aren't a slice of their file. VACUUM reclaims the space
+    columns = {c["name"]: c for c in inspect(connection).get_columns("fileclassificationchunk")}
+    if columns["chunk"]["nullable"]:
+        return
+    connection.execute(text("DROP INDEX IF EXISTS ix_fileclassificationchunk_file_classification_id"))
+    connection.execute(text("ALTER TABLE fileclassificationchunk RENAME TO fileclassificationchunk_old"))
+    connection.execute(
+        text(
+            "CREATE TABLE fileclassificationchunk ("
+            "id INTEGER NOT NULL, "
+            "file_classification_id INTEGER, "
+            "start INTEGER NOT NULL, "
+            '"end" INTEGER NOT NULL, '
+            "chunk VARCHAR, "
+            "chunk_classification_label VARCHAR(23) NOT NULL, "
+            "chunk_classification_score FLOAT NOT NULL, "
+            "scores BLOB, "
+            "model VARCHAR, "
+            "PRIMARY KEY (id), "
+            "FOREIGN KEY(file_classification_id) REFERENCES fileclassification (id))"
+        )
+    )
+    connection.execute(
+        text(
+            'INSERT INTO fileclassificationchunk (id, file_classification_id, start, "end", chunk, '
+            "chunk_classification_label, chunk_classification_score, scores, model) "
+            'SELECT o.id, o.file_classification_id, o.start, o."end", '
+            # the same newline normalisation the chunker applies
+            "CASE WHEN o.chunk = replace(replace(substr(f.file_contents, o.start + 1, "
+            "o.\"end\" - o.start), char(13) || char(10), ' ' || char(10)), char(13), char(10)) "
+            "THEN NULL ELSE o.chunk END, "
+            "o.chunk_classification_label, o.chunk_classification_score, o.scores, o.model "
+            "FROM fileclassificationchunk_old o "
+            "LEFT JOIN fileclassification c ON c.id = o.file_classification_id "
+            "LEFT JOIN filerecord f ON f.id = c.file_id"
+        )
+    )
+    connection.execute(text("DROP TABLE fileclassificationchunk_old"))
+    add_index(
+        connection,
+        "fileclassificationchunk",
+        "ix_fileclassificationchunk_file_classification_id",
+        "file_classification_id",
+    )
+
+
+def move_file_contents(connection):
+    # document text used to be a column of filerecord, it is in the blob store now.
+    # Rows are moved one at a time so a large database isn't held in memory
+    from .services.blob_store import get_blob_store
+
+    columns = {c["name"] for c in inspect(connection).get_columns("filerecord")}
+    if "file_contents" not in columns:
+        return
+    blob_store = get_blob_store()
+    file_ids = connection.execute(
+        text(
+            "SELECT id FROM filerecord WHERE text_ref IS NULL "
+            "AND (file_contents != '' OR extraction_seconds IS NOT NULL)"
+        )
+    ).scalars().all()
+    for file_id in file_ids:
+        contents = connection.execute(
+            text("SELECT file_contents FROM filerecord WHERE id = :id"), {"id": file_id}
+        ).scalar_one()
+        text_ref, text_length = blob_store.put_text(contents or "")
+        connection.execute(
+            text("UPDATE filerecord SET text_ref = :text_ref, text_length = :text_length WHERE id = :id"),
+            {"text_ref": text_ref, "text_length": text_length, "id": file_id},
+        )
+    connection.execute(text("ALTER TABLE filerecord DROP COLUMN file_contents"))
+
+
+def unique_paragraph_embeddings(connection):
+    # concurrent runs could each store a file's embeddings, keep the latest row
+    connection.execute(
+        text(
+            "DELETE FROM fileparagraphembedding WHERE id NOT IN "
+            "(SELECT MAX(id) FROM fileparagraphembedding GROUP BY file_id, model)"
+        )
+    )
+    connection.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_fileparagraphembedding_file_model "
+            "ON fileparagraphembedding (file_id, model)"
+        )
+    )
+
+
+MIGRATIONS = [
+    (
+        "0001_filerecord_extraction_seconds",
+        lambda connection: add_column(connection, "filerecord", "extraction_seconds", "FLOAT"),
+    ),
+    (
+        "0002_filerecord_batch_id",
+        lambda connection: add_column(
+            connection, "filerecord", "batch_id", "INTEGER REFERENCES filebatch (id)"
+        ),
+    ),
+    (
+        "0003_filerecord_batch_id_index",
+        lambda connection: add_index(connection, "filerecord", "ix_filerecord_batch_id", "batch_id"),
+    ),
+    (
+        "0004_fileclassification_top_label",
+        lambda connection: add_column(connection, "fileclassification", "top_label", "VARCHAR(23)"),
+    ),
+    (
+        "0005_fileclassification_top_score",
+        lambda connection: add_column(connection, "fileclassification", "top_score", "FLOAT"),
+    ),
+    ("0006_backfill_fileclassification_top_label", backfill_top_label),
+    (
+        "0007_fileclassification_top_label_index",
+        lambda connection: add_index(
+            connection, "fileclassification", "ix_fileclassification_top_label", "top_label"
+        ),
+    ),
+    (
+        "0008_fileclassification_file_id_index",
+        lambda connection: add_index(
+            connection, "fileclassification", "ix_fileclassification_file_id", "file_id"
+        ),
+    ),
+    (
+        "0009_filerecord_filename_index",
+        lambda connection: add_index(connection, "filerecord", "ix_filerecord_filename", "filename"),
+    ),
+    (
+        "0010_fileclassificationscore_file_classification_id_index",
+        lambda connection: add_index(
+            connection,
+            "fileclassificationscore",
+            "ix_fileclassificationscore_file_classification_id",
+            "file_classification_id",
+        ),
+    ),
+    (
+        "0011_fileclassificationchunk_file_classification_id_index",
+        lambda connection: add_index(
+            connection,
+            "fileclassificationchunk",
+            "ix_fileclassificationchunk_file_classification_id",
+            "file_classification_id",
+        ),
+    ),
+    (
+        "0012_filerecord_content_hash",
+        lambda connection: add_column(connection, "filerecord", "content_hash", "VARCHAR"),
+    ),
+    (
+        "0013_filerecord_content_hash_index",
+        lambda connection: add_index(
+            connection, "filerecord", "ix_filerecord_content_hash", "content_hash"
+        ),
+    ),
+    (
+        "0014_fileclassification_backend",
+        lambda connection: add_column(connection, "fileclassification", "backend", "VARCHAR(9)"),
+    ),
+    (
+        # NLI classifications made before backends were selectable ran on torch
+        "0015_backfill_fileclassification_backend",
+        lambda connection: connection.execute(
+            text(
+                "UPDATE fileclassification SET backend = 'torch' WHERE backend IS NULL AND model IN "
+                "('facebook/bart-large-mnli', 'knowledgator/comprehend_it-base')"
+            )
+        ),
+    ),
+    (
+        "0016_fileclassification_cascade_model",
+        lambda connection: add_column(connection, "fileclassification", "cascade_model", "VARCHAR"),
+    ),
+    (
+        "0017_fileclassification_cascade_min_score",
+        lambda connection: add_column(connection, "fileclassification", "cascade_min_score", "FLOAT"),
+    ),
+    (
+        "0018_fileclassification_cascade_min_margin",
+        lambda connection: add_column(connection, "fileclassification", "cascade_min_margin", "FLOAT"),
+    ),
+    (
+        "0019_fileclassificationchunk_model",
+        lambda connection: add_column(connection, "fileclassificationchunk", "model", "VARCHAR"),
+    ),
+    ("0020_backfill_fileclassificationchunk_model", backfill_chunk_model),
+    (
+        "0021_fileclassification_adaptive",
+        lambda connection: add_column(
+            connection, "fileclassification", "adaptive", "BOOLEAN NOT NULL DEFAULT 0"
+        ),
+    ),
+    (
+        "0022_fileclassification_chunks_classified",
+        lambda connection: add_column(connection, "fileclassification", "chunks_classified", "INTEGER"),
+    ),
+    (
+        "0023_fileclassification_chunks_total",
+        lambda connection: add_column(connection, "fileclassification", "chunks_total", "INTEGER"),
+    ),
+    ("0024_backfill_fileclassification_chunk_counts", backfill_chunk_counts),
+    (
+        "0025_fileclassification_duration_seconds",
+        lambda connection: add_column(connection, "fileclassification", "duration_seconds", "FLOAT"),
+    ),
+    (
+        "0026_fileclassification_cache_hits",
+        lambda connection: add_column(connection, "fileclassification", "cache_hits", "INTEGER"),
+    ),
+    (
+        "0027_fileclassification_cache_misses",
+        lambda connection: add_column(connection, "fileclassification", "cache_misses", "INTEGER"),
+    ),
+    (
+        "0028_fileclassificationchunk_scores",
+        lambda connection: add_column(connection, "fileclassificationchunk", "scores", "BLOB"),
+    ),
+    ("0029_compact_fileclassificationchunk", compact_chunks),
+    (
+        "0030_filerecord_text_ref",
+        lambda connection: add_column(connection, "filerecord", "text_ref", "VARCHAR"),
+    ),
+    (
+        "0031_filerecord_text_length",
+        lambda connection: add_column(connection, "filerecord", "text_length", "INTEGER"),
+    ),
+    (
+        "0032_filerecord_upload_ref",
+        lambda connection: add_column(connection, "filerecord", "upload_ref", "VARCHAR"),
+    ),
+    (
+        "0033_filerecord_text_ref_index",
+        lambda connection: add_index(connection, "filerecord", "ix_filerecord_text_ref", "text_ref"),
+    ),
+    (
+        "0034_filerecord_upload_ref_index",
+        lambda connection: add_index(connection, "filerecord", "ix_filerecord_upload_ref", "upload_ref"),
+    ),
+    # SQLite 3.35+ for DROP COLUMN, VACUUM afterwards to return the space
+    ("0035_move_filerecord_contents_to_blob_store", move_file_contents),
+    ("0036_fileparagraphembedding_unique_file_model", unique_paragraph_embeddings),
+]
+
+
+def run_migrations(engine):
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE IF NOT EXISTS schema_migrations "
+                "(name VARCHAR PRIMARY KEY, applied_at DATETIME NOT NULL)"
+            )
+        )
+        applied = {
+            row[0] for row in connection.execute(text("SELECT name FROM schema_migrations"))
+        }
+        for name, migrate in MIGRATIONS:
+            if name in applied:
+                continue
+            migrate(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (name, applied_at) VALUES (:name, :applied_at)"),
+                {"name": name, "applied_at": datetime.now(timezone.utc)},
+            )
@@ -1,6 +1,7 @@
 from datetime import datetime, timezone
-from typing import Optional
+from typing import Dict, Optional
 from enum import Enum
+from sqlalchemy import Index, text
 from sqlmodel import Field, SQLModel, Relationship
 from typing import List
 
@@ -18,12 +19,37 @@ class Models(str, Enum):
     e5_large = "intfloat/multilingual-e5-large-instruct"
 
 
+# Bi-encoders, these classify by embedding similarity instead of the NLI pipeline
+EMBEDDING_MODELS = {Models.qwen_embedding, Models.e5_large}
+
+
+class FileBatch(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    total_files: int
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+
 class FileRecord(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    filename: str
-    file_contents: str
+    filename: str = Field(index=True)
+    # the extracted text is in the blob store, text_ref is the sha256 of its UTF-8 bytes
+    # and text_length its length in characters. Both are unset until extraction is done
+    text_ref: Optional[str] = Field(default=None, index=True)
+    text_length: Optional[int] = None
+    # sha256 of the uploaded bytes, files with the same hash share extraction and results
+    content_hash: Optional[str] = Field(default=None, index=True)
+    # set when the uploaded bytes were kept in the blob store too (BLOB_STORE_UPLOADS)
+    upload_ref: Optional[str] = Field(default=None, index=True)
     status: FileStatus = Field(default=FileStatus.processing)
+    extraction_seconds: Optional[float] = None
+    batch_id: Optional[int] = Field(default=None, foreign_key="filebatch.id", index=True)
     classifications: List["FileClassification"] = Relationship(back_populates="file")
+    paragraph_embeddings: List["FileParagraphEmbedding"] = Relationship(
+        back_populates="file",
+        sa_relationship_kwargs={"cascade": "all, delete, delete-orphan"}
+    )
     created_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc), nullable=False
     )
@@ -32,6 +58,58 @@ class FileRecord(SQLModel, table=True):
     )
 
 
+class FileTaskStatus(str, Enum):
+    queued = "Queued"
+    running = "Running"
+    cancelled = "Cancelled"
+
+
+# process_file tasks that are queued or running. A request with the same key attaches to
+# the task instead of enqueuing another, re-uploads and deletes cancel a file's tasks.
+# Workers delete their row when they finish
+class FileTask(SQLModel, table=True):
+    __table_args__ = (
+        # one live task per key, cancelled ones can linger until their worker sees it
+        Index(
+            "ix_filetask_key_live",
+            "key",
+            unique=True,
+            sqlite_where=text("status != 'cancelled'"),
+            postgresql_where=text("status != 'cancelled'"),
+        ),
+    )
+
+    task_id: str = Field(primary_key=True)
+    # sha256 of the file, its content hash and the classification parameters, see task_key
+    key: str
+    file_id: int = Field(foreign_key="filerecord.id", index=True)
+    status: FileTaskStatus = Field(default=FileTaskStatus.queued)
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc), nullable=False
+    )
+    updated_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+
+class FileParagraphEmbedding(SQLModel, table=True):
+    __table_args__ = (
+        # one row per file and model, concurrent runs of a file upsert into it
+        Index("ix_fileparagraphembedding_file_model", "file_id", "model", unique=True),
+    )
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    file_id: Optional[int] = Field(default=None, foreign_key="filerecord.id", index=True)
+    model: str
+    # sha256 of the text the paragraphs were taken from, stale once the file is re-uploaded
+    text_hash: str
+    paragraph_count: int
+    dimensions: int
+    # float32 (paragraph_count, dimensions) array in paragraph order
+    embeddings: bytes
+    file: Optional[FileRecord] = Relationship(back_populates="paragraph_embeddings")
+
+
 class ClassificationLabel(str, Enum):
     technical_documentation = "Technical Documentation"
     business_proposal = "Business Proposal"
@@ -47,14 +125,37 @@ class ChunkingStrategy(str, Enum):
     sentence = "Sentence"
 
 
+# How NLI models are run, the embedding models always use sentence-transformers
+class InferenceBackend(str, Enum):
+    torch = "torch"
+    quantized = "quantized"
+    onnx = "onnx"
+
+
 class FileClassification(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
-    file_id: Optional[int] = Field(default=None, foreign_key="filerecord.id")
+    file_id: Optional[int] = Field(default=None, foreign_key="filerecord.id", index=True)
     model: str
     multi_label: bool = Field(default=False)
     chunking_strategy: Optional[ChunkingStrategy] = None
     chunk_size: Optional[int] = None
     chunk_overlap_size: Optional[int] = None
+    backend: Optional[InferenceBackend] = None
+    # chunks the first model was unsure about were classified again by cascade_model
+    cascade_model: Optional[str] = None
+    cascade_min_score: Optional[float] = None
+    cascade_min_margin: Optional[float] = None
+    # adaptive runs only classify a sample of the chunks, chunks_classified of chunks_total
+    adaptive: bool = Field(default=False)
+    chunks_classified: Optional[int] = None
+    chunks_total: Optional[int] = None
+    # wall time of the run and its chunk classification cache lookups, see the stages for more
+    duration_seconds: Optional[float] = None
+    cache_hits: Optional[int] = None
+    cache_misses: Optional[int] = None
+    # highest document level score, kept on the row so listings don't need the scores
+    top_label: Optional[ClassificationLabel] = Field(default=None, index=True)
+    top_score: Optional[float] = None
     created_at: datetime = Field(
         default_factory=lambda: datetime.now(timezone.utc), nullable=False
     )
@@ -67,12 +168,16 @@ class FileClassification(SQLModel, table=True):
         back_populates="file_classification",
         sa_relationship_kwargs={"cascade": "all, delete, delete-orphan"}
     )
+    file_classification_stages: List["FileClassificationStage"] = Relationship(
+        back_populates="file_classification",
+        sa_relationship_kwargs={"cascade": "all, delete, delete-orphan"}
+    )
 
 
 class FileClassificationScore(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     file_classification_id: Optional[int] = Field(
-        default=None, foreign_key="fileclassification.id"
+        default=None, foreign_key="fileclassification.id", index=True
     )
     classification_score: float
     classification: ClassificationLabel
@@ -84,19 +189,55 @@ class FileClassificationScore(SQLModel, table=True):
 class FileClassificationChunk(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     file_classification_id: Optional[int] = Field(
-        default=None, foreign_key="fileclassification.id"
+        default=None, foreign_key="fileclassification.id", index=True
     )
+    # character offsets into the file's text, which the chunk text is sliced from on read.
+    # Only rows stored before that have the text in chunk
     start: int
     end: int
-    chunk: str
+    chunk: Optional[str] = None
     chunk_classification_label: ClassificationLabel
     chunk_classification_score: float
+    # float32 score of every ClassificationLabel in enum order, see results.pack_scores
+    scores: Optional[bytes] = None
+    # model that produced the score, the cascade model for escalated chunks
+    model: Optional[str] = None
     file_classification: Optional[FileClassification] = Relationship(
         back_populates="file_classification_chunks"
     )
 
 
-class FileClassificationWithScoresAndChunks(SQLModel):
+class FileClassificationChunkRead(SQLModel):
+    id: int
+    file_classification_id: int
+    start: int
+    end: int
+    chunk: str
+    chunk_classification_label: ClassificationLabel
+    chunk_classification_score: float
+    # None for chunks classified before every label's score was kept
+    scores: Optional[Dict[ClassificationLabel, float]] = None
+    model: Optional[str] = None
+
+
+# How long each stage of a run took (embed, chunk, tokenize, classify, escalate, persist,
+# load_model, reuse), tokenize is part of chunk
+class FileClassificationStage(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    file_classification_id: Optional[int] = Field(
+        default=None, foreign_key="fileclassification.id", index=True
+    )
+    stage: str
+    model: Optional[str] = None
+    seconds: float
+    chunks: Optional[int] = None
+    tokens: Optional[int] = None
+    file_classification: Optional[FileClassification] = Relationship(
+        back_populates="file_classification_stages"
+    )
+
+
+class FileClassificationSummary(SQLModel):
     id: int
     file_id: int
     model: str
@@ -104,16 +245,66 @@ class FileClassificationWithScoresAndChunks(SQLModel):
     chunking_strategy: ChunkingStrategy
     chunk_size: Optional[int]
     chunk_overlap_size: Optional[int]
+    backend: Optional[InferenceBackend] = None
+    cascade_model: Optional[str] = None
+    cascade_min_score: Optional[float] = None
+    cascade_min_margin: Optional[float] = None
+    adaptive: bool = False
+    chunks_classified: Optional[int] = None
+    chunks_total: Optional[int] = None
+    duration_seconds: Optional[float] = None
+    cache_hits: Optional[int] = None
+    cache_misses: Optional[int] = None
+    top_label: Optional[ClassificationLabel]
+    top_score: Optional[float]
     created_at: datetime
     file_classification_scores: List[FileClassificationScore] = Field(default_factory=list)
-    file_classification_chunks: List[FileClassificationChunk] = Field(default_factory=list)
 
 
-class FileRecordWithClassifications(SQLModel):
+class FileRecordSummary(SQLModel):
     id: int
     filename: str
-    # file_contents: str
+    content_hash: Optional[str] = None
+    text_length: Optional[int] = None
     status: FileStatus
+    extraction_seconds: Optional[float] = None
+    batch_id: Optional[int] = None
     created_at: datetime
     updated_at: datetime
-    classifications: List[FileClassificationWithScoresAndChunks] = Field(default_factory=list)
+    classifications: List[FileClassificationSummary] = Field(default_factory=list)
+
+
+class FileRecordPage(SQLModel):
+    items: List[FileRecordSummary] = Field(default_factory=list)
+    # pass back as cursor to get the next page, None on the last page
+    next_cursor: Optional[int] = None
+
+
+class FileClassificationChunkPage(SQLModel):
+    items: List[FileClassificationChunkRead] = Field(default_factory=list)
+    next_cursor: Optional[int] = None
+
+
+class BatchUploadedFile(SQLModel):
+    id: int
+    filename: str
+
+
+class BatchRejectedFile(SQLModel):
+    filename: str
+    detail: str
+
+
+class BatchUploadResponse(SQLModel):
+    batch_id: int
+    files: List[BatchUploadedFile] = Field(default_factory=list)
+    rejected: List[BatchRejectedFile] = Field(default_factory=list)
+
+
+class BatchProgress(SQLModel):
+    batch_id: int
+    total: int
+    processing: int
+    completed: int
+    failed: int
+    finished: bool
@@ -1,27 +1,69 @@
+import asyncio
+import json
 from datetime import datetime, timezone
-from typing import Optional
-from ..services.file_services import file_reader_factory, check_file
+from typing import List, Optional, Tuple
+import zipfile
+from celery import chain, group
+from ..services.file_services import (
+    FileTooLargeError,
+    check_archive_member,
+    check_file,
+    claim_default_processing,
+    content_hash,
+    default_processing_args,
+    fail_unqueued,
+    find_extracted_texts,
+    process_file_signature,
+    read_upload,
+    release_blobs,
+    store_extraction_results,
+    store_uploads,
+    unpack_zip,
+)
+from ..services.blob_store import get_blob_store, read_file_text
+from ..services.extraction import extract_to_store, file_reader_factory, get_extraction_pool
+from ..services.metrics import EXTRACTION_SECONDS
+from ..services.results import chunk_read, delete_classifications, delete_file as delete_file_rows
+from ..services.progress import TERMINAL_STAGES, clear_progress, get_progress_broker, publish_progress
+from ..services.task_registry import cancel_file_tasks, claim_task, task_key
 from fastapi import (
     APIRouter,
+    BackgroundTasks,
     Depends,
     File,
     UploadFile,
     HTTPException,
     Body,
+    Query,
+    Request,
+    Response,
 )
-from ..services.file_services import process_file
-from sqlmodel import Session, select
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import selectinload
+from sqlmodel import func, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from pydantic import BaseModel, Field
 
-from ..database import get_session
+from .. import config
+from ..database import async_engine, get_async_session
 from ..models.file_model import (
+    EMBEDDING_MODELS,
+    BatchProgress,
+    BatchRejectedFile,
+    BatchUploadedFile,
+    BatchUploadResponse,
     ChunkingStrategy,
+    FileBatch,
+    ClassificationLabel,
     FileClassificationChunk,
+    FileClassificationChunkPage,
     FileClassification,
-    FileClassificationScore,
+    FileClassificationStage,
     FileRecord,
-    FileRecordWithClassifications,
+    FileRecordPage,
     FileStatus,
+    InferenceBackend,
     Models,
 )
 import logging
@@ -34,10 +76,104 @@ router = APIRouter(
 logger = logging.getLogger("classifyinator")
 
 
-@router.get("/list", response_model=list[FileRecordWithClassifications])
-def list_files(db: Session = Depends(get_session)):
-    files = db.query(FileRecord).all()
-    return files
+@router.get("/list", response_model=FileRecordPage)
+async def list_files(
+    cursor: Optional[int] = None,
+    limit: int = Query(default=50, ge=1, le=500),
+    status: Optional[FileStatus] = None,
+    label: Optional[ClassificationLabel] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_session),
+):
+    """Newest files first, with a summary of each classification but no chunks or contents."""
+    statement = (
+        select(FileRecord)
+        .options(
+            selectinload(FileRecord.classifications).selectinload(
+                FileClassification.file_classification_scores
+            ),
+        )
+        .order_by(FileRecord.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        statement = statement.where(FileRecord.id < cursor)
+    if status is not None:
+        statement = statement.where(FileRecord.status == status)
+    if label is not None:
+        statement = statement.where(
+            FileRecord.id.in_(
+                select(FileClassification.file_id).where(FileClassification.top_label == label)
+            )
+        )
+    if created_after is not None:
+        statement = statement.where(FileRecord.created_at >= created_after)
+    if created_before is not None:
+        statement = statement.where(FileRecord.created_at < created_before)
+
+    files = (await db.exec(statement)).all()
+    next_cursor = files[limit - 1].id if len(files) > limit else None
+    return FileRecordPage(items=files[:limit], next_cursor=next_cursor)
+
+
+@router.get(
+    "/classifications/{file_classification_id}/chunks",
+    response_model=FileClassificationChunkPage,
+)
+async def list_classification_chunks(
+    file_classification_id: int,
+    cursor: Optional[int] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_session),
+):
+    """Chunks of one classification in document order, for the deep dive view.
+
+    Each chunk has every label's score and its text, sliced from the file's text.
+    """
+    file_classification = await db.get(FileClassification, file_classification_id)
+    if not file_classification:
+        raise HTTPException(status_code=404, detail="Classification not found")
+    statement = (
+        select(FileClassificationChunk)
+        .where(FileClassificationChunk.file_classification_id == file_classification_id)
+        .order_by(FileClassificationChunk.id)
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        statement = statement.where(FileClassificationChunk.id > cursor)
+    chunks = (await db.exec(statement)).all()
+    next_cursor = chunks[limit - 1].id if len(chunks) > limit else None
+    chunks = chunks[:limit]
+    file_contents = None
+    if any(chunk.chunk is None for chunk in chunks):
+        text_ref = (
+            await db.exec(
+                select(FileRecord.text_ref).where(FileRecord.id == file_classification.file_id)
+            )
+        ).first()
+        file_contents = await run_in_threadpool(read_file_text, text_ref)
+    return FileClassificationChunkPage(
+        items=[chunk_read(chunk, file_contents) for chunk in chunks], next_cursor=next_cursor
+    )
+
+
+@router.get(
+    "/classifications/{file_classification_id}/stages",
+    response_model=List[FileClassificationStage],
+)
+async def list_classification_stages(
+    file_classification_id: int, db: AsyncSession = Depends(get_async_session)
+):
+    """How long each stage of the run took, in the order they finished."""
+    if not await db.get(FileClassification, file_classification_id):
+        raise HTTPException(status_code=404, detail="Classification not found")
+    statement = (
+        select(FileClassificationStage)
+        .where(FileClassificationStage.file_classification_id == file_classification_id)
+        .order_by(FileClassificationStage.id)
+    )
+    return (await db.exec(statement)).all()
 
 
 class ProcessFileRequest(BaseModel):
@@ -47,62 +183,135 @@ class ProcessFileRequest(BaseModel):
     chunk_size: Optional[int] = None
     overlap: Optional[int] = None
     multi_label: bool = False
+    # how NLI models run, the worker's INFERENCE_BACKEND when not given
+    backend: Optional[InferenceBackend] = None
+    # cascade mode, chunks model is unsure about are classified again by cascade_model,
+    # the thresholds default to CASCADE_MIN_SCORE and CASCADE_MIN_MARGIN
+    cascade_model: Optional[Models] = None
+    cascade_min_score: Optional[float] = Field(default=None, ge=0, le=1)
+    cascade_min_margin: Optional[float] = Field(default=None, ge=0, le=1)
+    # only classify chunks until the top label is settled or the ADAPTIVE_* budgets run out
+    adaptive: bool = False
+    # write a cProfile dump of the run to the worker's PROFILE_DIR
+    profile: bool = False
 
 
 @router.post("/process", response_model=FileRecord)
 async def process_file_request(
+    response: Response,
     file_details: ProcessFileRequest = Body(...),
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
 ):
+    """Queue a classification run of a file, the run's id is in the X-Task-Id header.
+
+    A request for a run that is already queued or running attaches to it instead,
+    X-Task-Coalesced is then true and nothing is deleted or queued.
+    """
     if file_details.chunking_strategy != ChunkingStrategy.paragraph:
-        if file_details.chunk_size <= file_details.overlap - 1:
+        if file_details.chunk_size is not None and file_details.chunk_size <= (
+            file_details.overlap or 0
+        ):
             raise HTTPException(
                 status_code=400,
                 detail="Chunk size must be greater than overlap",
             )
+    if file_details.cascade_model == file_details.model:
+        raise HTTPException(
+            status_code=400,
+            detail="The cascade model must be different from the model",
+        )
 
-    # If it is called with the same params as before we will delete it
-    statement = select(FileClassification).where(
-        FileClassification.model == file_details.model,
-        FileClassification.file_id == file_details.file_id,
-        FileClassification.chunking_strategy == file_details.chunking_strategy,
-        FileClassification.chunk_size == file_details.chunk_size,
-        FileClassification.chunk_overlap_size == file_details.overlap,
-        FileClassification.multi_label == file_details.multi_label,
-    )
-    classifications = db.exec(statement).all()
-    for classification in classifications:
-        db.delete(classification)
-
-    file_record = db.get(FileRecord, file_details.file_id)
+    file_record = await db.get(FileRecord, file_details.file_id)
     if not file_record:
         raise HTTPException(status_code=404, detail=f"File with id {file_details.file_id} not found")
+    if file_record.text_ref is None:
+        # the upload's extraction classifies it with the default settings when it is done
+        if file_record.status == FileStatus.failed:
+            detail = "Text could not be extracted from this file, upload it again"
+        else:
+            detail = "Text of this file is still being extracted, retry once it is"
+        raise HTTPException(status_code=409, detail=detail)
 
-    file_record.status = FileStatus.processing
-    db.add(file_record)
-    db.commit()
-    db.refresh(file_record)
-    process_file.delay(
+    args = (
         file_details.file_id,
         file_details.model.value,
         file_details.chunking_strategy,
         file_details.chunk_size,
         file_details.overlap,
         file_details.multi_label,
+        file_details.backend,
+        file_details.cascade_model.value if file_details.cascade_model else None,
+        file_details.cascade_min_score,
+        file_details.cascade_min_margin,
+        file_details.adaptive,
+    )
+    task_id, created = await claim_task(
+        db, task_key(file_record.content_hash, *args), file_details.file_id
     )
+    response.headers["X-Task-Id"] = task_id
+    response.headers["X-Task-Coalesced"] = str(not created).lower()
+    if not created:
+        logger.info(f"Attached a process request for file {file_details.file_id} to task {task_id}")
+        await db.refresh(file_record)
+        return file_record
+
+    # If it is called with the same params as before we will delete it, the backend and
+    # cascade thresholds are compared as the worker stores them, with the defaults filled in
+    backend = None
+    if file_details.model not in EMBEDDING_MODELS:
+        backend = InferenceBackend(file_details.backend or config.INFERENCE_BACKEND)
+    cascade_min_score = cascade_min_margin = None
+    if file_details.cascade_model:
+        cascade_min_score = file_details.cascade_min_score
+        if cascade_min_score is None:
+            cascade_min_score = config.CASCADE_MIN_SCORE
+        cascade_min_margin = file_details.cascade_min_margin
+        if cascade_min_margin is None:
+            cascade_min_margin = config.CASCADE_MIN_MARGIN
+    statement = select(FileClassification.id).where(
+        FileClassification.model == file_details.model,
+        FileClassification.file_id == file_details.file_id,
+        FileClassification.chunking_strategy == file_details.chunking_strategy,
+        FileClassification.chunk_size == file_details.chunk_size,
+        FileClassification.chunk_overlap_size == file_details.overlap,
+        FileClassification.multi_label == file_details.multi_label,
+        FileClassification.backend == backend,
+        FileClassification.cascade_model == (
+            file_details.cascade_model.value if file_details.cascade_model else None
+        ),
+        FileClassification.cascade_min_score == cascade_min_score,
+        FileClassification.cascade_min_margin == cascade_min_margin,
+        FileClassification.adaptive == file_details.adaptive,
+    )
+    await delete_classifications(db, (await db.exec(statement)).all())
+
+    file_record.status = FileStatus.processing
+    db.add(file_record)
+    await db.commit()
+    await db.refresh(file_record)
+    publish_progress(file_record.id, "queued", model=file_details.model.value)
+    try:
+        process_file_signature(
+            *args, file_details.profile, text_length=file_record.text_length, task_id=task_id
+        ).delay()
+    except Exception as e:
+        logger.error(f"Could not queue task {task_id} of file {file_record.id}: {e}")
+        await fail_unqueued({file_record.id: task_id})
+        raise HTTPException(status_code=503, detail="Could not queue the file for processing, retry later")
 
     return file_record
 
 
 @router.post("/upload", response_model=FileRecord)
 async def upload_file(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     override: bool = False,
-    db: Session = Depends(get_session),
+    db: AsyncSession = Depends(get_async_session),
 ):
     # check if file exists in db
     statement = select(FileRecord).where(FileRecord.filename == file.filename)
-    file_record = db.exec(statement).first()
+    file_record = (await db.exec(statement)).first()
 
     if not override and file_record:
         raise HTTPException(
@@ -113,67 +322,369 @@ async def upload_file(
     if not is_file_safe:
         raise HTTPException(status_code=400, detail=err)
     try:
-        file_contents = await file_reader_factory(file.filename).read(file)
+        # unsupported extensions are rejected before the upload is read
+        file_reader_factory(file.filename)
+        contents, file_hash = await read_upload(file, config.MAX_UPLOAD_BYTES)
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        await file.close()
+
+    old_refs = []
+    try:
+        # the text is filled in by the extraction job, the record id is the job id
         if not file_record:
-            file_record = FileRecord(
-                filename=file.filename, file_contents=file_contents
-            )
+            file_record = FileRecord(filename=file.filename, content_hash=file_hash)
             db.add(file_record)
         else:
-            file_record.file_contents = file_contents
+            old_refs = [file_record.text_ref, file_record.upload_ref]
+            file_record.content_hash = file_hash
+            file_record.text_ref = None
+            file_record.text_length = None
+            file_record.upload_ref = None
+            file_record.extraction_seconds = None
             file_record.status = FileStatus.processing
             file_record.updated_at = datetime.now(timezone.utc)
             db.add(file_record)
-            statement = select(FileClassification).where(
+            statement = select(FileClassification.id).where(
                 FileClassification.file_id == file_record.id
             )
-            file_classifications = db.exec(statement).all()
-            for file_classification in file_classifications:
-                db.delete(file_classification)
-
-        db.commit()
-        db.refresh(file_record)
-        process_file.delay(
-            file_record.id,
-            Models.comprehend_it_base.value,
-            ChunkingStrategy.paragraph,
-            None,
-            None,
-            False,
-        )
-        return file_record
+            await delete_classifications(db, (await db.exec(statement)).all())
+            # runs on the old contents are stopped, the new contents get a run of their own
+            await cancel_file_tasks(db, [file_record.id])
+
+        await db.commit()
+        await db.refresh(file_record)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        await file.close()
+    # replaces the latest event of the file's previous run, which new subscribers get first
+    publish_progress(file_record.id, "uploaded")
+
+    background_tasks.add_task(
+        extract_and_process, [(file_record.id, file.filename, contents, file_hash)]
+    )
+    background_tasks.add_task(release_blobs, old_refs)
+    return file_record
+
+
+async def extract_and_process(files: List[Tuple[int, str, bytes, str]]):
+    """Extract every file concurrently in the pool, then classify the ones that worked.
+
+    files are (file id, filename, contents, content hash). Content that was extracted
+    before, or appears more than once, is only extracted once.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_extraction_pool()
+    known_texts = await find_extracted_texts(list({file_hash for *_, file_hash in files}))
+    to_extract, uploads = {}, {}
+    for _, filename, contents, file_hash in files:
+        uploads.setdefault(file_hash, contents)
+        if file_hash not in known_texts:
+            to_extract.setdefault(file_hash, (filename, contents))
+
+    async def extract_all(to_extract):
+        # the pool writes the text to the blob store, only its ref and length come back
+        results = await asyncio.gather(
+            *(loop.run_in_executor(pool, extract_to_store, filename, contents) for filename, contents in to_extract.values()),
+            return_exceptions=True,
+        )
+        return dict(zip(to_extract, results))
+
+    results = await extract_all(to_extract)
+    # a reused text is only safe from release_blobs once its blob is fresh, the text of a
+    # file deleted since it was looked up may be gone and is extracted again
+    missing = set(
+        await run_in_threadpool(get_blob_store().touch, [text_ref for text_ref, _ in known_texts.values()])
+    )
+    if missing:
+        known_texts = {
+            file_hash: text for file_hash, text in known_texts.items() if text[0] not in missing
+        }
+        to_extract = {}
+        for _, filename, contents, file_hash in files:
+            if file_hash not in known_texts and file_hash not in results:
+                to_extract.setdefault(file_hash, (filename, contents))
+        results.update(await extract_all(to_extract))
+    upload_refs = {}
+    if config.BLOB_STORE_UPLOADS:
+        upload_refs = dict(zip(uploads, await run_in_threadpool(store_uploads, list(uploads.values()))))
+
+    extracted, failed = {}, []
+    for file_id, filename, _, file_hash in files:
+        if file_hash in known_texts:
+            logger.info(f"Reusing the text of an identical upload for '{filename}'")
+            extracted[file_id] = (*known_texts[file_hash], 0.0)
+            continue
+        result = results[file_hash]
+        if isinstance(result, BaseException):
+            logger.error(f"Failed to extract text from '{filename}': {result}")
+            failed.append(file_id)
+        else:
+            text_ref, text_length, extraction_seconds = result
+            logger.info(f"Extracted {text_length} characters from '{filename}' in {extraction_seconds:.2f}s")
+            EXTRACTION_SECONDS.labels(filename.rsplit(".", 1)[-1].lower()).observe(extraction_seconds)
+            extracted[file_id] = result
+            known_texts[file_hash] = (text_ref, text_length)
+
+    hashes = {file_id: file_hash for file_id, _, _, file_hash in files}
+    file_upload_refs = {
+        file_id: upload_refs[file_hash] for file_id, file_hash in hashes.items() if file_hash in upload_refs
+    }
+    # files re-uploaded while this ran are skipped, so their stale text is never classified
+    file_ids = await store_extraction_results(extracted, failed, hashes, file_upload_refs)
+    # a /process request for the same run may have got in first
+    task_ids = await claim_default_processing({file_id: hashes[file_id] for file_id in file_ids})
+    file_ids = [file_id for file_id in file_ids if file_id in task_ids]
+    text_lengths = {file_id: extracted[file_id][1] for file_id in file_ids}
+    try:
+        if len(file_ids) == 1:
+            process_file_signature(
+                *default_processing_args(file_ids[0]),
+                text_length=text_lengths[file_ids[0]],
+                task_id=task_ids[file_ids[0]],
+            ).delay()
+        elif file_ids:
+            # identical files are classified one after another so the later ones reuse the first's results
+            runs = {}
+            for file_id in file_ids:
+                runs.setdefault(hashes[file_id], []).append(file_id)
+            group(
+                chain(
+                    *(
+                        process_file_signature(
+                            *default_processing_args(file_id),
+                            text_length=text_lengths[file_id],
+                            task_id=task_ids[file_id],
+                        )
+                        for file_id in run
+                    )
+                )
+                for run in runs.values()
+            ).apply_async()
+    except Exception as e:
+        logger.error(f"Could not queue the classification of files {file_ids}: {e}")
+        await fail_unqueued({file_id: task_ids[file_id] for file_id in file_ids})
+
+
+@router.post("/upload/batch", response_model=BatchUploadResponse)
+async def upload_files(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    override: bool = False,
+    db: AsyncSession = Depends(get_async_session),
+):
+    if len(files) > config.MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch can contain at most {config.MAX_BATCH_FILES} files",
+        )
+
+    # zips are expanded into their members, everything is validated before anything is stored
+    candidates, rejected = [], []
+    batch_bytes = 0
+    for file in files:
+        try:
+            if file.filename.lower().endswith(".zip"):
+                contents, _ = await read_upload(file, config.MAX_UPLOAD_BYTES)
+                members = await run_in_threadpool(
+                    unpack_zip,
+                    contents,
+                    config.MAX_BATCH_FILES - len(candidates),
+                    config.MAX_UPLOAD_BYTES,
+                    config.MAX_BATCH_BYTES - batch_bytes,
+                )
+                batch_bytes += sum(len(data) for _, data in members)
+                for filename, data in members:
+                    is_file_safe, err = check_archive_member(filename, data)
+                    if is_file_safe:
+                        candidates.append((filename, data, content_hash(data)))
+                    else:
+                        rejected.append(BatchRejectedFile(filename=filename, detail=err))
+            else:
+                is_file_safe, err = await check_file(file)
+                if is_file_safe:
+                    contents, file_hash = await read_upload(file, config.MAX_UPLOAD_BYTES)
+                    if batch_bytes + len(contents) > config.MAX_BATCH_BYTES:
+                        raise FileTooLargeError(
+                            f"'{file.filename}' is larger than the "
+                            f"{config.MAX_BATCH_BYTES - batch_bytes} bytes left in this batch"
+                        )
+                    batch_bytes += len(contents)
+                    candidates.append((file.filename, contents, file_hash))
+                else:
+                    rejected.append(BatchRejectedFile(filename=file.filename, detail=err))
+        except (ValueError, zipfile.BadZipFile) as e:
+            rejected.append(BatchRejectedFile(filename=file.filename, detail=str(e)))
+        finally:
+            await file.close()
+
+    if len(candidates) > config.MAX_BATCH_FILES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"A batch can contain at most {config.MAX_BATCH_FILES} files",
+        )
+
+    accepted = {}
+    for filename, contents, file_hash in candidates:
+        try:
+            file_reader_factory(filename)
+        except ValueError as e:
+            rejected.append(BatchRejectedFile(filename=filename, detail=str(e)))
+            continue
+        if filename in accepted:
+            rejected.append(BatchRejectedFile(filename=filename, detail="Duplicate filename in batch"))
+            continue
+        accepted[filename] = (contents, file_hash)
+
+    statement = select(FileRecord).where(FileRecord.filename.in_(list(accepted)))
+    existing = {file_record.filename: file_record for file_record in (await db.exec(statement)).all()}
+    if not override:
+        for filename in existing:
+            del accepted[filename]
+            rejected.append(
+                BatchRejectedFile(
+                    filename=filename,
+                    detail=f"File '{filename}' already exists - retry with override flag set to true to re-upload it.",
+                )
+            )
+
+    # every record of the batch goes in with a single commit
+    batch = FileBatch(total_files=len(accepted))
+    db.add(batch)
+    await db.flush()
+    file_records, old_refs = [], []
+    now = datetime.now(timezone.utc)
+    for filename in accepted:
+        file_hash = accepted[filename][1]
+        file_record = existing.get(filename)
+        if file_record:
+            old_refs += [file_record.text_ref, file_record.upload_ref]
+            file_record.content_hash = file_hash
+            file_record.text_ref = None
+            file_record.text_length = None
+            file_record.upload_ref = None
+            file_record.extraction_seconds = None
+            file_record.status = FileStatus.processing
+            file_record.updated_at = now
+            file_record.batch_id = batch.id
+        else:
+            file_record = FileRecord(filename=filename, content_hash=file_hash, batch_id=batch.id)
+        db.add(file_record)
+        file_records.append(file_record)
+    if override:
+        statement = select(FileClassification.id).where(
+            FileClassification.file_id.in_([file_record.id for file_record in existing.values()])
+        )
+        await delete_classifications(db, (await db.exec(statement)).all())
+        await cancel_file_tasks(db, [file_record.id for file_record in existing.values()])
+    await db.commit()
+    for file_record in file_records:
+        publish_progress(file_record.id, "uploaded")
+
+    background_tasks.add_task(
+        extract_and_process,
+        [
+            (file_record.id, file_record.filename, *accepted[file_record.filename])
+            for file_record in file_records
+        ],
+    )
+    background_tasks.add_task(release_blobs, old_refs)
+    return BatchUploadResponse(
+        batch_id=batch.id,
+        files=[BatchUploadedFile(id=file_record.id, filename=file_record.filename) for file_record in file_records],
+        rejected=rejected,
+    )
+
+
+@router.get("/upload/batch/{batch_id}", response_model=BatchProgress)
+async def batch_progress(batch_id: int, db: AsyncSession = Depends(get_async_session)):
+    batch = await db.get(FileBatch, batch_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    statement = (
+        select(FileRecord.status, func.count())
+        .where(FileRecord.batch_id == batch_id)
+        .group_by(FileRecord.status)
+    )
+    counts = {status: count for status, count in (await db.exec(statement)).all()}
+    processing = counts.get(FileStatus.processing, 0)
+    return BatchProgress(
+        batch_id=batch_id,
+        total=batch.total_files,
+        processing=processing,
+        completed=counts.get(FileStatus.completed, 0),
+        failed=counts.get(FileStatus.failed, 0),
+        finished=processing == 0,
+    )
 
 
 @router.get("/status/{file_id}")
-def check_file_status(file_id: int, db: Session = Depends(get_session)):
-    file = db.get(FileRecord, file_id)
-    if not file:
+async def check_file_status(file_id: int, db: AsyncSession = Depends(get_async_session)):
+    # only select the status, not the whole row
+    status = (await db.exec(select(FileRecord.status).where(FileRecord.id == file_id))).first()
+    if not status:
         raise HTTPException(status_code=404, detail="File not found")
-    if file.status == FileStatus.failed:
+    if status == FileStatus.failed:
         return {
-            "status": file.status,
+            "status": status,
             "message": "File processing failed, please check your file is not corrupted and try again",
         }
-    return {"status": file.status}
+    return {"status": status}
+
+
+def format_event(event: dict) -> str:
+    return f"event: {event['stage']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def stream_progress(file_id: int, status: FileStatus, request: Request):
+    # a run that has already finished won't publish anything else
+    if status != FileStatus.processing:
+        stage = "failed" if status == FileStatus.failed else "completed"
+        yield format_event({"file_id": file_id, "stage": stage})
+        return
+    async for event in get_progress_broker().subscribe(file_id, config.PROGRESS_HEARTBEAT_SECONDS):
+        if await request.is_disconnected():
+            break
+        if event is None:
+            yield ": keep-alive\n\n"
+            continue
+        if event["stage"] == "cancelled":
+            async with AsyncSession(async_engine) as db:
+                status = (await db.exec(select(FileRecord.status).where(FileRecord.id == file_id))).first()
+            # a run superseded by a re-upload, the new run publishes its own events
+            if status == FileStatus.processing:
+                continue
+        yield format_event(event)
+        if event["stage"] in TERMINAL_STAGES:
+            break
+
+
+@router.get("/events/{file_id}")
+async def file_events(file_id: int, request: Request, db: AsyncSession = Depends(get_async_session)):
+    """Server-Sent Events stream of a file's processing progress, ends when it completes or fails."""
+    status = (await db.exec(select(FileRecord.status).where(FileRecord.id == file_id))).first()
+    if not status:
+        raise HTTPException(status_code=404, detail="File not found")
+    return StreamingResponse(
+        stream_progress(file_id, status, request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.delete("/delete/{file_id}")
-def delete_file(file_id: int, db: Session = Depends(get_session)):
+async def delete_file(file_id: int, db: AsyncSession = Depends(get_async_session)):
     statement = select(FileRecord).where(FileRecord.id == file_id)
-    file_id_exists = db.exec(statement).first()
+    file_id_exists = (await db.exec(statement)).first()
     if not file_id_exists:
         return HTTPException(status_code=404, detail="File not found")
 
-    statement = select(FileClassification).where(FileClassification.file_id == file_id)
-    file_classifications = db.exec(statement).all()
-
-    for file_classification in file_classifications:
-        db.delete(file_classification)
-    statement = select(FileRecord).where(FileRecord.id == file_id)
-    db.delete(db.exec(statement).first())
-    db.commit()
+    old_refs = [file_id_exists.text_ref, file_id_exists.upload_ref]
+    await cancel_file_tasks(db, [file_id])
+    await delete_file_rows(db, file_id)
+    await db.commit()
+    clear_progress(file_id)
+    await release_blobs(old_refs)
     return {"message": "File deleted successfully"}
@@ -0,0 +1,187 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import Callable, Dict, Hashable, List, Sequence
+
+import numpy as np
+
+from .. import config
+from .metrics import INFERENCE_BATCH_ITEMS, INFERENCE_QUEUE_DEPTH, INFERENCE_WAIT_SECONDS
+
+# run_batch(items) -> array with one row per item
+RunBatch = Callable[[Sequence], np.ndarray]
+
+
+def _flatten_key(key: Hashable) -> List:
+    """Parts of a scheduler queue key, which nests the model key in (key, batch size)."""
+    if not isinstance(key, tuple):
+        return [key]
+    return [part for item in key for part in _flatten_key(item)]
+
+
+class _Request:
+    def __init__(self, items: Sequence, run_batch: RunBatch):
+        self.items = items
+        self.run_batch = run_batch
+        self.future = Future()
+        self.submitted_at = time.monotonic()
+        # items before next_index have been put in a batch
+        self.next_index = 0
+        self.parts: List[np.ndarray] = []
+
+
+class _ModelQueue:
+    """Requests for one model, run by a dedicated thread in batches of up to max_batch_size items.
+
+    A batch is started once max_batch_size items are waiting or the oldest request has
+    waited max_wait_seconds. Large requests are split over several batches and small
+    ones from different tasks share a batch.
+    """
+
+    def __init__(self, key: Hashable, max_batch_size: int, max_wait_seconds: float):
+        self.key = key
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self._requests = deque()
+        self._pending_items = 0
+        self._condition = threading.Condition()
+        label = "/".join(str(getattr(part, "value", part)) for part in _flatten_key(key))
+        self._depth_gauge = INFERENCE_QUEUE_DEPTH.labels(label)
+        self._batch_items = INFERENCE_BATCH_ITEMS.labels(label)
+        self._wait_seconds = INFERENCE_WAIT_SECONDS.labels(label)
+        self._metrics = {
+            "requests": 0,
+            "batches": 0,
+            "items": 0,
+            "max_batch_size_seen": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "max_queue_depth": 0,
+        }
+        threading.Thread(target=self._run, name=f"inference-batcher-{key}", daemon=True).start()
+
+    def submit(self, items: Sequence, run_batch: RunBatch) -> Future:
+        request = _Request(items, run_batch)
+        if not items:
+            request.future.set_result(np.empty((0,)))
+            return request.future
+        with self._condition:
+            self._requests.append(request)
+            self._pending_items += len(items)
+            self._metrics["requests"] += 1
+            self._metrics["max_queue_depth"] = max(self._metrics["max_queue_depth"], self._pending_items)
+            self._depth_gauge.set(self._pending_items)
+            self._condition.notify()
+        return request.future
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._requests:
+                self._condition.wait()
+            deadline = self._requests[0].submitted_at + self.max_wait_seconds
+            while self._pending_items < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            now = time.monotonic()
+            batch, taken = [], 0
+            while self._requests and taken < self.max_batch_size:
+                request = self._requests[0]
+                if request.next_index == 0:
+                    waited = now - request.submitted_at
+                    self._metrics["wait_seconds_total"] += waited
+                    self._metrics["wait_seconds_max"] = max(self._metrics["wait_seconds_max"], waited)
+                    self._wait_seconds.observe(waited)
+                end = min(len(request.items), request.next_index + self.max_batch_size - taken)
+                batch.append((request, request.next_index, end))
+                taken += end - request.next_index
+                request.next_index = end
+                if end == len(request.items):
+                    self._requests.popleft()
+            self._pending_items -= taken
+            self._metrics["batches"] += 1
+            self._metrics["items"] += taken
+            self._metrics["max_batch_size_seen"] = max(self._metrics["max_batch_size_seen"], taken)
+            self._depth_gauge.set(self._pending_items)
+            self._batch_items.observe(taken)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            items = [item for request, start, end in batch for item in request.items[start:end]]
+            try:
+                # every request of a key runs the same model, any of their run_batch will do
+                outputs = batch[0][0].run_batch(items)
+            except BaseException as err:
+                self._fail([request for request, _, _ in batch], err)
+                continue
+            offset = 0
+            for request, start, end in batch:
+                request.parts.append(outputs[offset : offset + end - start])
+                offset += end - start
+                if end == len(request.items) and not request.future.done():
+                    request.future.set_result(np.concatenate(request.parts))
+
+    def _fail(self, requests: List[_Request], err: BaseException):
+        with self._condition:
+            for request in requests:
+                # drop what is still queued of a failed request
+                if request in self._requests:
+                    self._requests.remove(request)
+                    self._pending_items -= len(request.items) - request.next_index
+            self._depth_gauge.set(self._pending_items)
+        for request in requests:
+            if not request.future.done():
+                request.future.set_exception(err)
+
+    def stats(self) -> Dict:
+        with self._condition:
+            metrics = dict(self._metrics)
+            metrics["queue_depth"] = self._pending_items
+            metrics["queued_requests"] = len(self._requests)
+        metrics["mean_batch_size"] = metrics["items"] / metrics["batches"] if metrics["batches"] else 0.0
+        metrics["mean_wait_seconds"] = (
+            metrics["wait_seconds_total"] / metrics["requests"] if metrics["requests"] else 0.0
+        )
+        return metrics
+
+
+class InferenceScheduler:
+    """Batches the forward passes of every task running in this worker, per model."""
+
+    def __init__(self, max_wait_seconds: float):
+        self.max_wait_seconds = max_wait_seconds
+        self._queues: Dict[Hashable, _ModelQueue] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: Hashable, run_batch: RunBatch, items: Sequence, batch_size: int) -> Future:
+        """Queue items for the model behind key, the future resolves to run_batch's rows for them."""
+        queue_key = (key, batch_size)
+        with self._lock:
+            queue = self._queues.get(queue_key)
+            if queue is None:
+                queue = self._queues[queue_key] = _ModelQueue(queue_key, batch_size, self.max_wait_seconds)
+        return queue.submit(items, run_batch)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            queues = list(self._queues.values())
+        return {str(queue.key): queue.stats() for queue in queues}
+
+
+@lru_cache(maxsize=1)
+def get_inference_scheduler() -> InferenceScheduler:
+    return InferenceScheduler(config.INFERENCE_MAX_WAIT_MS / 1000)
+
+
+def run_batched(key: Hashable, run_batch: RunBatch, items: Sequence, batch_size: int) -> np.ndarray:
+    """run_batch over items batch_size at a time, shared with other tasks when micro-batching is on."""
+    if config.INFERENCE_MICRO_BATCHING:
+        return get_inference_scheduler().submit(key, run_batch, items, batch_size).result()
+    outputs = [run_batch(items[start : start + batch_size]) for start in range(0, len(items), batch_size)]
+    return np.concatenate(outputs) if outputs else np.empty((0,))
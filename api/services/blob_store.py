@@ -0,0 +1,128 @@
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .. import config
+
+
+class BlobNotFoundError(FileNotFoundError):
+    pass
+
+
+class BlobStore:
+    """Content addressed files on local disk, a blob's ref is the sha256 of its bytes.
+
+    Document bodies live here instead of in SQLite rows, so metadata queries never
+    page them in. Blobs are read through mmap, the pages come from the OS page cache
+    that every worker process on the machine shares, and writes are atomic renames,
+    so a blob is either complete or missing. Identical contents are stored once.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, ref: str) -> str:
+        return os.path.join(self.root, ref[:2], ref)
+
+    def put(self, data: bytes) -> str:
+        ref = hashlib.sha256(data).hexdigest()
+        path = self.path(ref)
+        if os.path.exists(path):
+            # a fresh mtime keeps remove_unreferenced off a blob that is about to be referenced
+            os.utime(path)
+            return ref
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return ref
+
+    def put_text(self, text: str) -> Tuple[str, int]:
+        """Store text as UTF-8, returning its ref and length in characters."""
+        return self.put(text.encode("utf-8")), len(text)
+
+    @contextmanager
+    def open(self, ref: str) -> Iterator[memoryview]:
+        """A read only view of a blob, only valid inside the block."""
+        try:
+            f = open(self.path(ref), "rb")
+        except FileNotFoundError:
+            raise BlobNotFoundError(f"Blob {ref} is not in {self.root}")
+        with f:
+            # an empty file can't be mapped
+            if not os.fstat(f.fileno()).st_size:
+                yield memoryview(b"")
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+    def read(self, ref: str) -> bytes:
+        with self.open(ref) as view:
+            return view.tobytes()
+
+    def read_text(self, ref: str) -> str:
+        with self.open(ref) as view:
+            return str(view, "utf-8")
+
+    def exists(self, ref: str) -> bool:
+        return os.path.exists(self.path(ref))
+
+    def touch(self, refs: Iterable[str]) -> List[str]:
+        """Refresh the mtime of blobs that are about to be referenced again, returning the refs that are gone.
+
+        Keeps remove_unreferenced off them for its grace period, like put does.
+        """
+        missing = []
+        for ref in set(refs):
+            try:
+                os.utime(self.path(ref))
+            except FileNotFoundError:
+                missing.append(ref)
+        return missing
+
+    def remove_unreferenced(
+        self, refs: Iterable[str], referenced: Iterable[str], grace_seconds: float = 60
+    ) -> List[str]:
+        """Delete the blobs of refs that aren't in referenced, returning the deleted refs.
+
+        Blobs written or put again in the last grace_seconds are kept, an upload may be
+        about to store a reference to them.
+        """
+        referenced = set(referenced)
+        removed = []
+        for ref in set(refs) - referenced:
+            path = self.path(ref)
+            try:
+                if time.time() - os.path.getmtime(path) < grace_seconds:
+                    continue
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            removed.append(ref)
+        return removed
+
+
+@lru_cache(maxsize=1)
+def get_blob_store() -> BlobStore:
+    return BlobStore(config.BLOB_STORE_DIR)
+
+
+def read_file_text(text_ref: Optional[str]) -> str:
+    """Text of a FileRecord, empty until extraction has stored it."""
+    if not text_ref:
+        return ""
+    return get_blob_store().read_text(text_ref)
@@ -0,0 +1,236 @@
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ..models.file_model import ChunkingStrategy
+from .embeddings import embed_paragraphs
+from .extraction import normalise_newlines
+from .metrics import stage
+from .model_registry import get_tokenizer
+
+DEFAULT_CHUNK_SIZE = 500
+
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+
+
+def strip_span(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def chunk_text(text: str):
+    # basic implementation but allows easy improvements for headings and lists
+    chunks = []
+    text = normalise_newlines(text)
+    paragraph_start = 0
+    breaks = [(m.start(), m.end()) for m in PARAGRAPH_BREAK.finditer(text)]
+    for break_start, break_end in breaks + [(len(text), len(text))]:
+        start, end = strip_span(text, paragraph_start, break_start)
+        if start < end:
+            chunks.append(
+                {
+                    "text": text[start:end],
+                    "start": start,
+                    "end": end,
+                    "token_count": None,
+                }
+            )
+        paragraph_start = break_end
+
+    return chunks
+
+
+def group_similar_chunks(
+    chunks: List[Dict],
+    similarity_threshold: float = 0.8,
+    embeddings: Optional[np.ndarray] = None,
+    return_embeddings: bool = False,
+):
+    """Merge runs of neighbouring chunks whose embeddings are similar.
+
+    A chunk joins the previous group when its cosine similarity with the previous
+    chunk is above the threshold. The input chunks are not modified. With
+    return_embeddings the normalised mean embedding of each group is returned too.
+    """
+    if embeddings is None:
+        embeddings = embed_paragraphs([chunk["text"] for chunk in chunks])
+    if not chunks:
+        return ([], embeddings) if return_embeddings else []
+
+    # because the embeddings are normalised the dot product is the cosine sim
+    similarities = np.einsum("ij,ij->i", embeddings[:-1], embeddings[1:])
+    group_starts = np.flatnonzero(np.concatenate([[True], similarities <= similarity_threshold]))
+    group_ends = np.append(group_starts[1:], len(chunks))
+
+    grouped_chunks = [
+        {
+            "text": "\n".join(chunk["text"] for chunk in chunks[start:end]),
+            "start": chunks[start]["start"],
+            "end": chunks[end - 1]["end"],
+            "token_count": None,
+        }
+        for start, end in zip(group_starts, group_ends)
+    ]
+    if not return_embeddings:
+        return grouped_chunks
+    group_embeddings = np.add.reduceat(embeddings, group_starts, axis=0)
+    group_embeddings /= np.linalg.norm(group_embeddings, axis=1, keepdims=True)
+    return grouped_chunks, group_embeddings
+
+
+def tokenize_with_offsets(model_name: str, text: str) -> np.ndarray:
+    """Tokenize the whole document once, returning the (start, end) char span of every token."""
+    encoding = get_tokenizer(model_name)(
+        text,
+        add_special_tokens=False,
+        return_offsets_mapping=True,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+        verbose=False,
+    )
+    return np.asarray(encoding["offset_mapping"], dtype=np.int64).reshape(-1, 2)
+
+
+def word_breaks(text: str, offsets: np.ndarray) -> np.ndarray:
+    # tokens that start a new word, some tokenizers include the leading space in the offset
+    return np.array(
+        [
+            i
+            for i, (start, _) in enumerate(offsets)
+            if start == 0 or text[start].isspace() or text[start - 1].isspace()
+        ],
+        dtype=np.int64,
+    )
+
+
+def sentence_breaks(text: str, offsets: np.ndarray) -> np.ndarray:
+    starts = [m.end() for m in SENTENCE_BREAK.finditer(text)]
+    starts += [m.end() for m in PARAGRAPH_BREAK.finditer(text)]
+    return np.unique(np.searchsorted(offsets[:, 0], starts, side="left"))
+
+
+def window_end(start: int, hi: int, max_tokens: int, breaks: Sequence[np.ndarray]) -> int:
+    # last break that keeps the window within max_tokens, by order of preference
+    end = min(start + max_tokens, hi)
+    if end < hi:
+        for candidates in breaks:
+            k = np.searchsorted(candidates, end, side="right") - 1
+            if k >= 0 and candidates[k] > start:
+                return int(candidates[k])
+    return end
+
+
+def pack_tokens(
+    lo: int,
+    hi: int,
+    max_tokens: int,
+    breaks: Sequence[np.ndarray],
+    overlap: int = 0,
+) -> List[Tuple[int, int]]:
+    """Cut tokens [lo, hi) into windows of at most max_tokens.
+
+    Each window ends on the last break that fits, trying each array in breaks in
+    order of preference (e.g. sentences then words) before cutting mid-word. With
+    overlap, the next window starts on the first preferred break within the last
+    overlap tokens, as long as that window still reaches past the current one.
+    """
+    windows = []
+    start = lo
+    while start < hi:
+        end = window_end(start, hi, max_tokens, breaks)
+        windows.append((start, end))
+        if end >= hi:
+            break
+        next_start = end
+        if overlap:
+            candidates = breaks[0]
+            k = np.searchsorted(candidates, end - overlap, side="left")
+            if k < len(candidates) and start < candidates[k] < end:
+                if window_end(int(candidates[k]), hi, max_tokens, breaks) > end:
+                    next_start = int(candidates[k])
+        start = next_start
+    return windows
+
+
+def window_to_chunk(text: str, offsets: np.ndarray, window: Tuple[int, int]) -> Dict:
+    first, last = window
+    start, end = strip_span(text, int(offsets[first, 0]), int(offsets[last - 1, 1]))
+    return {
+        "text": text[start:end],
+        "start": start,
+        "end": end,
+        "token_count": last - first,
+    }
+
+
+def chunk_by_token(
+    text: str,
+    offsets: np.ndarray,
+    chunk: Dict,
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    breaks: Optional[Sequence[np.ndarray]] = None,
+) -> List[Dict]:
+    """Split one chunk of text into pieces of at most chunk_size tokens.
+
+    Uses the document's token offsets, so no re-tokenization happens here and
+    start/end stay character offsets into the document.
+    """
+    lo, hi = np.searchsorted(offsets[:, 0], [chunk["start"], chunk["end"]], side="left")
+    if lo == hi:
+        return []
+    if breaks is None:
+        breaks = [sentence_breaks(text, offsets), word_breaks(text, offsets)]
+    return [
+        window_to_chunk(text, offsets, window)
+        for window in pack_tokens(int(lo), int(hi), chunk_size, breaks)
+    ]
+
+
+def chunk_document(
+    model_name: str,
+    text: str,
+    chunking_strategy: ChunkingStrategy,
+    chunk_size: Optional[int] = None,
+    overlap: Optional[int] = None,
+    paragraph_embeddings: Optional[np.ndarray] = None,
+) -> List[Dict]:
+    """Chunk a document with the given strategy from a single tokenization pass.
+
+    paragraph: paragraphs merged by semantic similarity, split to chunk_size tokens
+    number:    windows of chunk_size tokens, overlapping by overlap tokens
+    sentence:  whole sentences packed up to chunk_size tokens, overlapping by at
+               most overlap tokens of trailing sentences
+
+    paragraph_embeddings, one row per chunk_text paragraph, skips embedding them again.
+    """
+    chunking_strategy = ChunkingStrategy(chunking_strategy)
+    chunk_size = chunk_size or DEFAULT_CHUNK_SIZE
+    overlap = min(overlap or 0, chunk_size - 1)
+    text = normalise_newlines(text)
+    with stage("tokenize", model_name) as counts:
+        offsets = tokenize_with_offsets(model_name, text)
+        counts["tokens"] = len(offsets)
+    if len(offsets) == 0:
+        return []
+
+    if chunking_strategy == ChunkingStrategy.number:
+        breaks = [word_breaks(text, offsets)]
+    else:
+        breaks = [sentence_breaks(text, offsets), word_breaks(text, offsets)]
+
+    if chunking_strategy == ChunkingStrategy.paragraph:
+        chunks = []
+        paragraphs = chunk_text(text)
+        for chunk in group_similar_chunks(paragraphs, embeddings=paragraph_embeddings):
+            chunks.extend(chunk_by_token(text, offsets, chunk, chunk_size, breaks))
+        return chunks
+
+    return [
+        window_to_chunk(text, offsets, window)
+        for window in pack_tokens(0, len(offsets), chunk_size, breaks, overlap)
+    ]
@@ -0,0 +1,256 @@
+from abc import ABC, abstractmethod
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .. import config
+from ..models.file_model import InferenceBackend
+from .inference import classify_chunks
+from .metrics import record_cache_lookups
+from .model_registry import inference_backend
+
+
+def cache_key(model_name: str, multi_label: bool, candidate_labels: Iterable[str], text: str) -> str:
+    """Content address of a chunk classification.
+
+    Scores depend on the model, multi_label and the whole label set (labels
+    compete in the softmax), so all of them are part of the key with the text hash.
+    """
+    text_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    params = json.dumps([model_name, bool(multi_label), sorted(candidate_labels), text_hash])
+    return hashlib.sha256(params.encode("utf-8")).hexdigest()
+
+
+class ClassificationCache(ABC):
+    """Label -> score vectors keyed by cache_key, with hit/miss counters."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def get_many(self, keys: List[str]) -> Dict[str, Dict[str, float]]:
+        found = self._get_many(keys)
+        with self._counter_lock:
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        record_cache_lookups(len(found), len(keys) - len(found))
+        return found
+
+    def set_many(self, entries: Dict[str, Dict[str, float]]):
+        if entries:
+            self._set_many(entries)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "size": self.size(),
+            "max_entries": self.max_entries,
+        }
+
+    @abstractmethod
+    def _get_many(self, keys: List[str]) -> Dict[str, Dict[str, float]]:
+        pass
+
+    @abstractmethod
+    def _set_many(self, entries: Dict[str, Dict[str, float]]):
+        pass
+
+    @abstractmethod
+    def size(self) -> int:
+        pass
+
+
+class NullCache(ClassificationCache):
+    def _get_many(self, keys):
+        return {}
+
+    def _set_many(self, entries):
+        pass
+
+    def size(self):
+        return 0
+
+
+class DiskCache(ClassificationCache):
+    """SQLite file on local disk, evicting the least recently used entries."""
+
+    def __init__(self, path: str, max_entries: int):
+        super().__init__(max_entries)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_scores "
+            "(key TEXT PRIMARY KEY, scores TEXT NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_chunk_scores_accessed_at ON chunk_scores (accessed_at)"
+        )
+
+    def _get_many(self, keys):
+        found = {}
+        with self._lock:
+            # stay under SQLite's bound parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start : start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, scores FROM chunk_scores WHERE key IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                found.update({key: json.loads(scores) for key, scores in rows})
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE chunk_scores SET accessed_at = ? WHERE key = ?",
+                    [(now, key) for key in found],
+                )
+        return found
+
+    def _set_many(self, entries):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunk_scores (key, scores, accessed_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(scores), now) for key, scores in entries.items()],
+            )
+            overflow = self._size() - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM chunk_scores WHERE key IN "
+                    "(SELECT key FROM chunk_scores ORDER BY accessed_at LIMIT ?)",
+                    (overflow,),
+                )
+            self._conn.execute("COMMIT")
+
+    def _size(self):
+        return self._conn.execute("SELECT COUNT(*) FROM chunk_scores").fetchone()[0]
+
+    def size(self):
+        with self._lock:
+            return self._size()
+
+
+class RedisCache(ClassificationCache):
+    """Shared across workers, recency is tracked in a sorted set for eviction."""
+
+    prefix = "classification-cache:"
+    recency_key = "classification-cache:recency"
+
+    def __init__(self, url: str, max_entries: int):
+        super().__init__(max_entries)
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+
+    def _get_many(self, keys):
+        if not keys:
+            return {}
+        values = self._redis.mget([self.prefix + key for key in keys])
+        found = {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+        if found:
+            now = time.time()
+            self._redis.zadd(self.recency_key, {key: now for key in found})
+        return found
+
+    def _set_many(self, entries):
+        now = time.time()
+        pipe = self._redis.pipeline()
+        pipe.mset({self.prefix + key: json.dumps(scores) for key, scores in entries.items()})
+        pipe.zadd(self.recency_key, {key: now for key in entries})
+        pipe.execute()
+        overflow = self._redis.zcard(self.recency_key) - self.max_entries
+        if overflow > 0:
+            evicted = self._redis.zpopmin(self.recency_key, overflow)
+            self._redis.delete(*[self.prefix + key.decode() for key, _ in evicted])
+
+    def size(self):
+        return self._redis.zcard(self.recency_key)
+
+
+@lru_cache(maxsize=1)
+def get_classification_cache() -> ClassificationCache:
+    backend = config.CLASSIFICATION_CACHE_BACKEND
+    if backend == "disk":
+        return DiskCache(config.CLASSIFICATION_CACHE_PATH, config.CLASSIFICATION_CACHE_MAX_ENTRIES)
+    if backend == "redis":
+        return RedisCache(config.REDIS_URL, config.CLASSIFICATION_CACHE_MAX_ENTRIES)
+    if backend == "none":
+        return NullCache(0)
+    raise ValueError(f"Unsupported classification cache backend: {backend}")
+
+
+def classify_chunks_cached(
+    model_name: str,
+    texts: List[str],
+    candidate_labels: List[str],
+    multi_label: bool = False,
+    classify: Callable[..., List[Dict]] = classify_chunks,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    progress_interval: Optional[int] = None,
+    backend: Optional[str] = None,
+) -> List[Dict]:
+    """classify_chunks that only sends cache misses to the model.
+
+    Identical chunks inside the document are classified once as well. With
+    on_progress, misses are classified progress_interval chunks at a time and
+    on_progress(chunks_done, chunks_total) is called after each slice.
+    """
+    cache = get_classification_cache()
+    backend = inference_backend(model_name, backend)
+    # converted backends score slightly differently, keep them apart from the torch scores
+    cached_model = (
+        model_name if backend in (None, InferenceBackend.torch) else f"{model_name}@{backend.value}"
+    )
+    keys = [cache_key(cached_model, multi_label, candidate_labels, text) for text in texts]
+    unique_keys = list(dict.fromkeys(keys))
+    scores = cache.get_many(unique_keys)
+
+    missing = {key: text for key, text in zip(keys, texts) if key not in scores}
+    missing_keys = list(missing)
+    key_counts = Counter(keys)
+    done = len(keys) - sum(key_counts[key] for key in missing_keys)
+    interval = (progress_interval or config.PROGRESS_CHUNK_INTERVAL) if on_progress else len(missing_keys)
+    interval = max(interval, 1)
+    for start in range(0, len(missing_keys), interval):
+        batch_keys = missing_keys[start : start + interval]
+        results = classify(
+            model_name,
+            [missing[key] for key in batch_keys],
+            candidate_labels,
+            multi_label,
+            backend=backend,
+        )
+        computed = {
+            key: dict(zip(result["labels"], result["scores"]))
+            for key, result in zip(batch_keys, results)
+        }
+        cache.set_many(computed)
+        scores.update(computed)
+        if on_progress:
+            done += sum(key_counts[key] for key in batch_keys)
+            on_progress(done, len(keys))
+
+    results = []
+    for key in keys:
+        ranked = sorted(scores[key].items(), key=lambda item: item[1], reverse=True)
+        results.append(
+            {
+                "labels": [label for label, _ in ranked],
+                "scores": [score for _, score in ranked],
+            }
+        )
+    return results
@@ -0,0 +1,64 @@
+from functools import lru_cache, partial
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .. import config
+from .model_registry import get_embed_model
+from ..models.file_model import ClassificationLabel
+from .batching import run_batched
+
+TASK_INSTRUCTION = "Identify the type of document the given text was taken from"
+
+# Embedded as the "documents" side, the chunks are the instructed queries
+LABEL_DESCRIPTIONS = {
+    ClassificationLabel.technical_documentation.value: "Technical documentation such as user manuals, API references, specifications, installation and configuration guides.",
+    ClassificationLabel.business_proposal.value: "A business proposal pitching a product, service or project with pricing, timelines, deliverables and expected benefits.",
+    ClassificationLabel.legal_document.value: "A legal document such as a contract, agreement, terms and conditions, policy or court filing with clauses and obligations.",
+    ClassificationLabel.academic_paper.value: "An academic paper with an abstract, methodology, experiments, results, citations and references.",
+    ClassificationLabel.general_article.value: "A general article such as a news story, blog post, feature or opinion piece written for a broad audience.",
+    ClassificationLabel.other.value: "Other text such as fiction, poetry, personal notes, letters or anything that is not a typical document type.",
+}
+
+
+def format_query(text: str) -> str:
+    # instruction format shared by multilingual-e5-large-instruct and Qwen3-Embedding
+    return f"Instruct: {TASK_INSTRUCTION}\nQuery: {text}"
+
+
+@lru_cache(maxsize=8)
+def get_label_embeddings(model_name: str, candidate_labels: Tuple[str, ...]) -> np.ndarray:
+    descriptions = [LABEL_DESCRIPTIONS.get(label, label) for label in candidate_labels]
+    return get_embed_model(model_name).encode(descriptions, normalize_embeddings=True)
+
+
+def encode_queries(embed_model, queries: List[str]) -> np.ndarray:
+    return embed_model.encode(queries, normalize_embeddings=True, batch_size=len(queries))
+
+
+def embedding_scores(
+    model_name: str,
+    texts: List[str],
+    candidate_labels: List[str],
+    multi_label: bool = False,
+    batch_size: Optional[int] = None,
+) -> np.ndarray:
+    """Score every chunk against every label with one encode pass and one matrix multiply.
+
+    Returns an array of shape (chunks, labels), softmax over the labels for single
+    label and an independent sigmoid per label for multi label.
+    """
+    label_embeddings = get_label_embeddings(model_name, tuple(candidate_labels))
+    chunk_embeddings = run_batched(
+        ("embedding", model_name),
+        partial(encode_queries, get_embed_model(model_name)),
+        [format_query(text) for text in texts],
+        batch_size or config.INFERENCE_BATCH_SIZE,
+    )
+    similarities = chunk_embeddings @ label_embeddings.T
+    if multi_label:
+        logits = (similarities - config.EMBEDDING_MULTI_LABEL_THRESHOLD) * config.EMBEDDING_LOGIT_SCALE
+        return 1 / (1 + np.exp(-logits))
+    logits = similarities * config.EMBEDDING_LOGIT_SCALE
+    exp = np.exp(logits - logits.max(-1, keepdims=True))
+    return exp / exp.sum(-1, keepdims=True)
@@ -0,0 +1,117 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from .. import config
+from ..database import engine
+from ..models.file_model import FileParagraphEmbedding, FileRecord
+from .model_registry import SIMILARITY_MODEL, get_embed_model
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Per-text LRU of normalised embeddings shared by the worker's threads."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is not None:
+                self._entries.move_to_end(key)
+            return embedding
+
+    def set(self, key, embedding):
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+embedding_cache = EmbeddingCache(config.PARAGRAPH_EMBEDDING_CACHE_SIZE)
+
+
+def embed_paragraphs(texts: List[str], model_name: str = SIMILARITY_MODEL) -> np.ndarray:
+    """Normalised float32 embeddings, only encoding paragraphs not already cached."""
+    keys = [(model_name, text_hash(text)) for text in texts]
+    embeddings = [embedding_cache.get(key) for key in keys]
+    missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+    if missing:
+        encoded = get_embed_model(model_name).encode(
+            [texts[i] for i in missing], normalize_embeddings=True, batch_size=32
+        )
+        for i, embedding in zip(missing, encoded):
+            embeddings[i] = np.asarray(embedding, dtype=np.float32)
+            embedding_cache.set(keys[i], embeddings[i])
+    if not embeddings:
+        return np.empty((0, 0), dtype=np.float32)
+    return np.stack(embeddings)
+
+
+def get_file_paragraph_embeddings(
+    db: Session, file: FileRecord, texts: List[str], model_name: str = SIMILARITY_MODEL
+) -> np.ndarray:
+    """Paragraph embeddings stored for this file, computed and stored on first use.
+
+    They only depend on the file's text, so every later classification of the file
+    (whatever NLI model it uses) skips the embedding stage.
+    """
+    # the blob store addresses the text by the same sha256
+    contents_hash = file.text_ref or text_hash("")
+    statement = select(FileParagraphEmbedding).where(
+        FileParagraphEmbedding.file_id == file.id,
+        FileParagraphEmbedding.model == model_name,
+    )
+    stored = db.exec(statement).first()
+    if stored and stored.text_hash == contents_hash and stored.paragraph_count == len(texts):
+        return np.frombuffer(stored.embeddings, dtype=np.float32).reshape(
+            stored.paragraph_count, stored.dimensions
+        )
+
+    embeddings = embed_paragraphs(texts, model_name)
+    store_file_paragraph_embeddings(
+        file.id,
+        model_name,
+        text_hash=contents_hash,
+        paragraph_count=len(texts),
+        dimensions=embeddings.shape[1] if len(texts) else 0,
+        embeddings=embeddings.tobytes(),
+    )
+    return embeddings
+
+
+def store_file_paragraph_embeddings(file_id: int, model_name: str, **values):
+    """Upsert a file's embeddings in a session of their own, the run's stays one transaction.
+
+    Two runs of the same file with different NLI models may both have computed them,
+    the one that commits second leaves the first's row alone, the embeddings are the same.
+    """
+    with Session(engine) as db:
+        statement = (
+            update(FileParagraphEmbedding)
+            .where(FileParagraphEmbedding.file_id == file_id, FileParagraphEmbedding.model == model_name)
+            .values(**values)
+        )
+        if not db.exec(statement).rowcount:
+            db.add(FileParagraphEmbedding(file_id=file_id, model=model_name, **values))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
@@ -0,0 +1,108 @@
+from abc import abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+import io
+import time
+from typing import List, Tuple
+
+from .. import config
+from .blob_store import get_blob_store
+
+
+class ExtractionError(ValueError):
+    pass
+
+
+# Readers run in the extraction process pool, keep this module free of the ML imports
+class FileReaderInterface:
+    @abstractmethod
+    def read(self, contents: bytes) -> str:
+        pass
+
+
+class TextFileReader(FileReaderInterface):
+    def read(self, contents: bytes) -> str:
+        return contents.decode("utf-8")
+
+
+class PDFReader(FileReaderInterface):
+    def read(self, contents: bytes) -> str:
+        import PyPDF2
+
+        pdf_reader = PyPDF2.PdfReader(io.BytesIO(contents))
+        if len(pdf_reader.pages) > config.MAX_PDF_PAGES:
+            raise ExtractionError(
+                f"PDF has {len(pdf_reader.pages)} pages, the limit is {config.MAX_PDF_PAGES}"
+            )
+
+        pages: List[str] = []
+        for page in pdf_reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                pages.append(page_text)
+
+        return "\n".join(pages).strip()
+
+
+class WordReader(FileReaderInterface):
+    def read(self, contents: bytes) -> str:
+        from docx import Document
+
+        word_reader = Document(io.BytesIO(contents))
+        paragraphs = [paragraph.text for paragraph in word_reader.paragraphs if paragraph.text]
+        return "\n".join(paragraphs).strip()
+
+
+def normalise_newlines(text: str) -> str:
+    # same length replacements so chunk offsets still index into the stored text
+    return text.replace("\r\n", " \n").replace("\r", "\n")
+
+
+def file_reader_factory(file_name: str) -> FileReaderInterface:
+    file_type = file_name.split(".")[-1].lower()
+    if file_type == "txt":
+        return TextFileReader()
+    elif file_type == "pdf":
+        return PDFReader()
+    elif file_type == "docx":
+        return WordReader()
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+
+def extract_text(file_name: str, contents: bytes) -> Tuple[str, float]:
+    """Extract the text of an uploaded file, returning it with the seconds it took."""
+    if len(contents) > config.MAX_UPLOAD_BYTES:
+        raise ExtractionError(
+            f"File is {len(contents)} bytes, the limit is {config.MAX_UPLOAD_BYTES}"
+        )
+    start = time.perf_counter()
+    text = file_reader_factory(file_name).read(contents)
+    return text, time.perf_counter() - start
+
+
+def extract_to_store(file_name: str, contents: bytes) -> Tuple[str, int, float]:
+    """extract_text, storing the text in the blob store.
+
+    Returns the text's ref and length with the seconds extraction took. Run in the
+    pool, the text is written by the pool process and never sent back to the API.
+    """
+    text, extraction_seconds = extract_text(file_name, contents)
+    text_ref, text_length = get_blob_store().put_text(text)
+    return text_ref, text_length, extraction_seconds
+
+
+_extraction_pool = None
+
+
+def get_extraction_pool() -> ProcessPoolExecutor:
+    global _extraction_pool
+    if _extraction_pool is None:
+        _extraction_pool = ProcessPoolExecutor(max_workers=config.EXTRACTION_WORKERS)
+    return _extraction_pool
+
+
+def shutdown_extraction_pool():
+    global _extraction_pool
+    if _extraction_pool is not None:
+        _extraction_pool.shutdown(cancel_futures=True)
+        _extraction_pool = None
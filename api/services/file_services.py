@@ -1,89 +1,27 @@
-from abc import abstractmethod
 from datetime import datetime, timezone
+import hashlib
 import io
-import re
-from typing import Dict, List
-from celery.utils.log import get_task_logger
-from ..celery_app import celery_app, get_model_pipeline, get_embed_model, get_tokenizer
-import numpy as np
-import PyPDF2
-from docx import Document
-from sqlmodel import Session
-from functools import lru_cache
+import os
+from typing import Dict, List, Optional, Tuple
+import zipfile
+from ..celery_app import PROCESS_FILE_TASK, celery_app, process_file_queue
+from .blob_store import get_blob_store
+from .progress import publish_progress
+from .task_registry import claim_task, drop_tasks, task_key
+from fastapi.concurrency import run_in_threadpool
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 import magic
 
 from ..models.file_model import (
     ChunkingStrategy,
-    ClassificationLabel,
-    FileClassificationChunk,
-    FileClassificationScore,
-    FileClassification,
     FileRecord,
-    FileStatus
+    FileStatus,
+    Models,
 )
 from fastapi import File
-from ..database import engine
+from ..database import async_engine
 
-task_logger = get_task_logger(__name__)
-
-
-class FileReaderInterface:
-    @abstractmethod
-    async def read(self, file: File) -> str:
-        pass
-
-
-class TextFileReader(FileReaderInterface):
-    async def read(self, file: File) -> str:
-        contents = await file.read()
-        return contents.decode("utf-8")
-
-
-class PDFReader(FileReaderInterface):
-    async def read(self, file: File) -> str:
-        # Read the entire file content into an in-memory bytes buffer
-        pdf_contents = await file.read()
-        pdf_stream = io.BytesIO(pdf_contents)
-
-        pdf_reader = PyPDF2.PdfReader(pdf_stream)
-
-        # Initialize empty string to store text
-        text_content = ""
-
-        # Iterate through all pages
-        for page in pdf_reader.pages:
-            # Extract text from page and append to content
-            page_text = page.extract_text()
-            if page_text:
-                text_content += page_text + "\n"
-
-        return text_content.strip()
-
-
-class WordReader(FileReaderInterface):
-    async def read(self, file: File) -> str:
-        word_contents = await file.read()
-        word_stream = io.BytesIO(word_contents)
-
-        word_reader = Document(word_stream)
-        text_content = ""
-        for paragraph in word_reader.paragraphs:
-            if paragraph.text:
-                text_content += paragraph.text + "\n"
-
-        return text_content.strip()
-
-
-def file_reader_factory(file_name: str) -> FileReaderInterface:
-    file_type = file_name.split(".")[-1].lower()
-    if file_type == "txt":
-        return TextFileReader()
-    elif file_type == "pdf":
-        return PDFReader()
-    elif file_type == "docx":
-        return WordReader()
-    else:
-        raise ValueError(f"Unsupported file type: {file_type}")
 
 ALLOWED_MIME_TYPES = [
     "application/pdf",
@@ -92,6 +30,12 @@ ALLOWED_MIME_TYPES = [
     "text/plain",
 ]
 
+EXTENSION_MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "txt": "text/plain",
+}
+
 
 async def check_file(file: File):
     client_mime = file.content_type
@@ -110,237 +54,232 @@ async def check_file(file: File):
 
     return True, None
 
-def chunk_text(text: str):
-    # basic implementation but allows easy improvements for headings and lists
-    chunks = []
-    text = text.replace("\r\n", "\n").replace("\r", "\n")
-    paragraphs = re.split(r"\n\s*\n+", text.strip())
-    offset = 0
-    for paragraph in paragraphs:
-        if paragraph.strip():
-            chunks.append(
-                {
-                    "text": paragraph.strip(),
-                    "start": offset,
-                    "end": offset + len(paragraph),
-                    "token_count": None,
-                }
-            )
-            offset += len(paragraph)
-
-    return chunks
-
-
-def group_similar_chunks(chunks: List[Dict], similarity_threshold: float = 0.8):
-    text = [chunk["text"] for chunk in chunks]
-    embeddings = get_embed_model().encode(text, normalize_embeddings=True, batch_size=32)
-
-    grouped_chunks = []
-    i = 0
-    while i < len(chunks):
-        current = chunks[i]
-        current_embedding = embeddings[i]
-        j = i + 1
-        while j < len(chunks):
-            # because we normalised earlier we dont need to run cosine sim
-            sim = float(np.dot(current_embedding, embeddings[j]))
-            if sim > similarity_threshold:
-                current["text"] += "\n" + chunks[j]["text"]
-                current["end"] = chunks[j]["end"]
-                current_embedding = current_embedding + embeddings[j]
-                current_embedding = current_embedding / np.linalg.norm(
-                    current_embedding
-                )
-                j += 1
-            else:
-                break
-        grouped_chunks.append(current)
-        i = j
-    return grouped_chunks
-
-
-def split_large_paragraph(model_name: str, paragraph: str, max_tokens: int):
-    """Split a paragraph into subchunks under max_tokens."""
-    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+", paragraph) if s.strip()]
-    chunks, current = [], []
-
-    for sent in sentences:
-        candidate = " ".join(current + [sent]).strip()
-        if count_tokens(model_name, candidate) > max_tokens:
-            if current:
-                chunks.append(" ".join(current).strip())
-                current = [sent]
-            else:
-                # sentence itself too long -> split by words
-                words = sent.split()
-                subcurrent = []
-                for w in words:
-                    subcandidate = " ".join(subcurrent + [w])
-                    if count_tokens(model_name, subcandidate) > max_tokens:
-                        chunks.append(" ".join(subcurrent))
-                        subcurrent = [w]
-                    else:
-                        subcurrent.append(w)
-                if subcurrent:
-                    chunks.append(" ".join(subcurrent))
-                current = []
-        else:
-            current.append(sent)
-
-    if current:
-        chunks.append(" ".join(current).strip())
-    return chunks
-
-@lru_cache(maxsize=10000)
-def count_tokens(model_name: str, text: str):
-    return len(get_tokenizer(model_name).encode(text, add_special_tokens=False))
-
-
-def chunk_by_token(model_name: str, chunk: Dict, chunk_size=500) -> List[Dict]:
-    # Need to think about overlap and when to do it
-    token_count = count_tokens(model_name, chunk["text"])
-    if token_count <= chunk_size:
-        return [{**chunk, "token_count": token_count}]
-
-    # otherwise split into sentences
-    sentences = [
-        s.strip() for s in re.split(r"(?<=[.!?])\s+", chunk["text"]) if s.strip()
-    ]
-
-    # Start & End data is being lost
-    chunks, current = [], []
-    for sentence in sentences:
-        candidate = " ".join(current + [sentence]).strip()
-        if count_tokens(model_name, candidate) > chunk_size:
-            if current:
-                chunks.append(
-                    {
-                        "text": " ".join(current).strip(),
-                        "token_count": count_tokens(
-                            model_name, " ".join(current).strip()
-                        ),
-                    }
-                )
-                current = [sentence]
-            else:
-                # sentence itself too long -> split by words
-                words = sentence.split()
-                word_current = []
-                for word in words:
-                    subcandidate = " ".join(word_current + [word])
-                    if count_tokens(model_name, subcandidate) > chunk_size:
-                        chunks.append(
-                            {
-                                "text": " ".join(word_current).strip(),
-                                "token_count": count_tokens(
-                                    model_name, " ".join(word_current).strip()
-                                ),
-                            }
-                        )
-                        word_current = [word]
-                    else:
-                        word_current.append(word)
-                if word_current:
-                    chunks.append(
-                        {
-                            "text": " ".join(word_current).strip(),
-                            "token_count": count_tokens(
-                                model_name, " ".join(word_current).strip()
-                            ),
-                        }
-                    )
-                current = []
-        else:
-            current.append(sentence)
-
-    if current:
-        chunks.append(
-            {
-                "text": " ".join(current).strip(),
-                "token_count": count_tokens(model_name, " ".join(current).strip()),
-            }
+
+class FileTooLargeError(ValueError):
+    pass
+
+
+def content_hash(contents: bytes) -> str:
+    return hashlib.sha256(contents).hexdigest()
+
+
+async def read_upload(file: File, max_bytes: int) -> Tuple[bytes, str]:
+    """Read an upload with the sha256 of its bytes, hashed as the blocks arrive."""
+    # read in blocks so an oversized upload is rejected without buffering all of it
+    blocks, size = [], 0
+    digest = hashlib.sha256()
+    while block := await file.read(1024 * 1024):
+        size += len(block)
+        if size > max_bytes:
+            raise FileTooLargeError(f"File is larger than the {max_bytes} byte limit")
+        digest.update(block)
+        blocks.append(block)
+    return b"".join(blocks), digest.hexdigest()
+
+
+def check_archive_member(file_name: str, file_bytes: bytes):
+    # zip members have no client mime type, compare against the one their extension implies
+    file_type = file_name.split(".")[-1].lower()
+    expected_mime = EXTENSION_MIME_TYPES.get(file_type)
+    if not expected_mime:
+        return False, f"Unsupported file type: {file_type}"
+
+    real_mime = magic.from_buffer(file_bytes[:2048], mime=True)
+    if real_mime not in ALLOWED_MIME_TYPES:
+        return False, f"Invalid file type {real_mime}"
+
+    if expected_mime != real_mime:
+        return (
+            False,
+            f"MIME mismatch: extension implies {expected_mime}, but real type is {real_mime}",
+        )
+
+    return True, None
+
+
+def unpack_zip(
+    contents: bytes, max_files: int, max_bytes: int, max_total_bytes: int
+) -> List[Tuple[str, bytes]]:
+    with zipfile.ZipFile(io.BytesIO(contents)) as archive:
+        infos = [
+            info
+            for info in archive.infolist()
+            if not info.is_dir()
+            and os.path.basename(info.filename)
+            and not info.filename.startswith("__MACOSX/")
+        ]
+        # counts and declared sizes are checked before anything is decompressed
+        if len(infos) > max_files:
+            raise ValueError(f"Archive has more than {max_files} files")
+        for info in infos:
+            if info.file_size > max_bytes:
+                name = os.path.basename(info.filename)
+                raise FileTooLargeError(f"'{name}' is larger than the {max_bytes} byte limit")
+        too_large = f"Archive expands to more than the {max_total_bytes} bytes left in this batch"
+        if sum(info.file_size for info in infos) > max_total_bytes:
+            raise FileTooLargeError(too_large)
+
+        members, total = [], 0
+        for info in infos:
+            name = os.path.basename(info.filename)
+            # the header sizes can lie, never read past either limit
+            limit = min(max_bytes, max_total_bytes - total)
+            with archive.open(info) as member:
+                data = member.read(limit + 1)
+            if len(data) > max_bytes:
+                raise FileTooLargeError(f"'{name}' is larger than the {max_bytes} byte limit")
+            if len(data) > limit:
+                raise FileTooLargeError(too_large)
+            total += len(data)
+            members.append((name, data))
+    return members
+
+
+async def find_extracted_texts(content_hashes: List[str]) -> Dict[str, Tuple[str, int]]:
+    """Text ref and length already extracted from earlier uploads with these hashes."""
+    if not content_hashes:
+        return {}
+    async with AsyncSession(async_engine) as db:
+        statement = select(
+            FileRecord.content_hash, FileRecord.text_ref, FileRecord.text_length
+        ).where(
+            FileRecord.content_hash.in_(content_hashes),
+            # set once extraction has stored the text
+            FileRecord.extraction_seconds.is_not(None),
+            FileRecord.text_ref.is_not(None),
         )
-    return chunks
-
-@celery_app.task
-def process_file(
-    file_id: int,
-    model: str,
-    chunking_strategy: ChunkingStrategy,
-    chunk_size: int,
-    overlap: int,
-    multi_label: bool = False,
+        return {
+            file_hash: (text_ref, text_length)
+            for file_hash, text_ref, text_length in (await db.exec(statement)).all()
+        }
+
+
+def store_uploads(uploads: List[bytes]) -> List[str]:
+    """Keep uploaded files in the blob store, returning their refs."""
+    blob_store = get_blob_store()
+    return [blob_store.put(contents) for contents in uploads]
+
+
+async def store_extraction_results(
+    extracted: Dict[int, Tuple[str, int, float]],
+    failed: List[int],
+    content_hashes: Dict[int, str],
+    upload_refs: Optional[Dict[int, str]] = None,
+) -> List[int]:
+    """Save extracted text refs and failures for a set of files in one transaction.
+
+    extracted maps file ids to (text ref, text length, extraction seconds) and
+    content_hashes to the hash of the upload that was extracted. Files re-uploaded
+    since then have another hash and are left alone, the newer upload's extraction
+    stores theirs. Returns the ids of the files that are ready to be classified.
+    """
+    upload_refs = upload_refs or {}
+    stored, failed_now = [], []
+    async with AsyncSession(async_engine) as db:
+        now = datetime.now(timezone.utc)
+        statement = select(FileRecord).where(FileRecord.id.in_([*extracted, *failed]))
+        for file_record in (await db.exec(statement)).all():
+            if file_record.content_hash != content_hashes.get(file_record.id):
+                continue
+            if file_record.id in extracted:
+                text_ref, text_length, extraction_seconds = extracted[file_record.id]
+                file_record.text_ref = text_ref
+                file_record.text_length = text_length
+                file_record.extraction_seconds = extraction_seconds
+                stored.append(file_record.id)
+            else:
+                file_record.status = FileStatus.failed
+                failed_now.append(file_record.id)
+            file_record.upload_ref = upload_refs.get(file_record.id)
+            file_record.updated_at = now
+            db.add(file_record)
+        await db.commit()
+    for file_id in stored:
+        publish_progress(file_id, "extracted", extraction_seconds=extracted[file_id][2])
+    for file_id in failed_now:
+        publish_progress(file_id, "failed")
+    return stored
+
+
+async def release_blobs(refs: List[Optional[str]]) -> List[str]:
+    """Remove the blobs of refs that no file references any more, returning those removed.
+
+    Call it after the commit that dropped the references. Files share blobs when their
+    contents are the same, so a blob stays as long as any file still points at it.
+    """
+    refs = list({ref for ref in refs if ref})
+    if not refs:
+        return []
+    async with AsyncSession(async_engine) as db:
+        referenced = (
+            await db.exec(select(FileRecord.text_ref).where(FileRecord.text_ref.in_(refs)))
+        ).all()
+        referenced += (
+            await db.exec(select(FileRecord.upload_ref).where(FileRecord.upload_ref.in_(refs)))
+        ).all()
+    return await run_in_threadpool(get_blob_store().remove_unreferenced, refs, referenced)
+
+
+def default_processing_args(file_id: int):
+    # how newly uploaded files are classified
+    return (
+        file_id,
+        Models.comprehend_it_base.value,
+        ChunkingStrategy.paragraph,
+        None,
+        None,
+        False,
+    )
+
+
+def process_file_signature(
+    *args, text_length: Optional[int] = None, task_id: Optional[str] = None
 ):
-    with Session(engine) as db:
-        file = db.get(FileRecord, file_id)
-        if not file:
-            task_logger.error(f"File with id {file_id} not found for processing.")
-            return
-        try:
-            chunks = chunk_text(file.file_contents)
-            grouped_chunks = group_similar_chunks(chunks)
-            chunks_by_token = []
-            for chunk in grouped_chunks:
-                chunks_by_token.extend(chunk_by_token(model, chunk))
-            candidate_labels = [label.value for label in ClassificationLabel]
-            results = {label: [] for label in candidate_labels}
-            weights = {label: [] for label in candidate_labels}
-            for chunk in chunks_by_token:
-                result = get_model_pipeline(model, multi_label)(chunk["text"], candidate_labels)
-                max_chunk_classification = {
-                    "label": result["labels"][0],
-                    "score": result["scores"][0],
-                }
-                for label, score in zip(result["labels"], result["scores"]):
-                    if score > max_chunk_classification["score"]:
-                        max_chunk_classification = {"label": label, "score": score}
-                    results[label].append(score)
-                    weights[label].append(len(chunk["text"].split()))
-                chunk["chunk_classification"] = max_chunk_classification
-
-            file_classification = FileClassification(
-                file_id=file.id,
-                model=model,
-                multi_label=multi_label,
-                chunking_strategy=chunking_strategy,
-                chunk_size=chunk_size,
-                chunk_overlap_size=overlap,
-            )
-            db.add(file_classification)
-            db.commit()
-            db.refresh(file_classification)
-
-            for label in candidate_labels:
-                score = np.average(results[label], weights=weights[label])
-
-                score_obj = FileClassificationScore(
-                    file_classification_id=file_classification.id,
-                    classification=label,
-                    classification_score=score,
-                )
-                db.add(score_obj)
-
-            for chunk in chunks_by_token:
-                chunk_obj = FileClassificationChunk(
-                    file_classification_id=file_classification.id,
-                    start=chunk.get("start", 0),
-                    end=chunk.get("end", 0),
-                    chunk=chunk["text"],
-                    chunk_classification_score=chunk["chunk_classification"]["score"],
-                    chunk_classification_label=chunk["chunk_classification"]["label"],
-                )
-                db.add(chunk_obj)
-
-            file.status = FileStatus.completed 
-            file.updated_at = datetime.now(timezone.utc)
-            db.add(file)
-            db.commit()
-        except Exception as err:
-            db.rollback()
-            task_logger.exception(err)
-            file_to_fail = db.get(FileRecord, file_id)
-            if file_to_fail:
-                file_to_fail.status = FileStatus.failed
-                file_to_fail.updated_at = datetime.now(timezone.utc)
-                db.add(file_to_fail)
-                db.commit()
+    """Signature of the worker's process_file task, with default_processing_args style args.
+
+    The task is referenced by name so the API never imports the worker's task module
+    and the ML libraries behind it. It is routed to the queue of its model and of the
+    size tier of text_length characters. task_id is the id claim_task registered it under.
+    """
+    signature = celery_app.signature(
+        PROCESS_FILE_TASK,
+        args=args,
+        immutable=True,
+        queue=process_file_queue(args[1], text_length),
+    )
+    if task_id:
+        signature.set(task_id=task_id)
+    return signature
+
+
+async def claim_default_processing(content_hashes: Dict[int, str]) -> Dict[int, str]:
+    """Register runs of default_processing_args for files, returning their task ids.
+
+    content_hashes maps file ids to their content hash. Files with the same run already
+    queued or running are left out, they are classified by that task.
+    """
+    task_ids = {}
+    async with AsyncSession(async_engine) as db:
+        for file_id, file_hash in content_hashes.items():
+            key = task_key(file_hash, *default_processing_args(file_id))
+            task_id, created = await claim_task(db, key, file_id)
+            if created:
+                task_ids[file_id] = task_id
+    return task_ids
+
+
+async def fail_unqueued(file_tasks: Dict[int, str]):
+    """Undo claim_task for runs that could not be enqueued and mark their files failed.
+
+    file_tasks maps file ids to the task ids claimed for them.
+    """
+    async with AsyncSession(async_engine) as db:
+        await drop_tasks(db, list(file_tasks.values()))
+        statement = select(FileRecord).where(FileRecord.id.in_(list(file_tasks)))
+        for file_record in (await db.exec(statement)).all():
+            file_record.status = FileStatus.failed
+            file_record.updated_at = datetime.now(timezone.utc)
+            db.add(file_record)
+        await db.commit()
+    for file_id in file_tasks:
+        publish_progress(file_id, "failed")
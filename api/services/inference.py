@@ -0,0 +1,131 @@
+from functools import partial
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+
+from .. import config
+from ..models.file_model import EMBEDDING_MODELS
+from .batching import run_batched
+from .embedding_classifier import embedding_scores
+from .model_registry import get_model_pipeline, resolve_backend
+
+# Same template the transformers zero-shot pipeline uses by default
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+
+def get_entailment_ids(model_config):
+    # mirrors ZeroShotClassificationPipeline.entailment_id / postprocess
+    entailment_id = -1
+    for index, label in model_config.id2label.items():
+        if label.lower().startswith("entail"):
+            entailment_id = int(index)
+            break
+    contradiction_id = -1 if entailment_id == 0 else 0
+    return entailment_id, contradiction_id
+
+
+def scores_from_logits(logits: np.ndarray, model_config, multi_label: bool) -> np.ndarray:
+    """Turn NLI logits of shape (chunks, labels, classes) into label scores."""
+    entailment_id, contradiction_id = get_entailment_ids(model_config)
+    if multi_label or logits.shape[1] == 1:
+        # softmax entailment vs contradiction for each label independently
+        entail_contr_logits = logits[..., [contradiction_id, entailment_id]]
+        exp = np.exp(entail_contr_logits - entail_contr_logits.max(-1, keepdims=True))
+        return (exp / exp.sum(-1, keepdims=True))[..., 1]
+    # softmax the entailment logits over all candidate labels
+    entail_logits = logits[..., entailment_id]
+    exp = np.exp(entail_logits - entail_logits.max(-1, keepdims=True))
+    return exp / exp.sum(-1, keepdims=True)
+
+
+def format_results(scores: np.ndarray, candidate_labels: List[str]) -> List[Dict]:
+    # same {"labels", "scores"} shape (highest score first) as the pipeline output
+    results = []
+    for chunk_scores in scores:
+        order = np.argsort(chunk_scores)[::-1]
+        results.append(
+            {
+                "labels": [candidate_labels[i] for i in order],
+                "scores": [float(chunk_scores[i]) for i in order],
+            }
+        )
+    return results
+
+
+def classify_chunks(
+    model_name: str,
+    texts: List[str],
+    candidate_labels: List[str],
+    multi_label: bool = False,
+    batch_size: Optional[int] = None,
+    backend: Optional[str] = None,
+) -> List[Dict]:
+    """Classify every chunk of a document with the backend that suits the model.
+
+    backend picks how NLI models run (see InferenceBackend), the worker's default when None.
+
+    Returns one pipeline-style result dict per chunk, in input order.
+    """
+    if not texts:
+        return []
+    if model_name in EMBEDDING_MODELS:
+        scores = embedding_scores(model_name, texts, candidate_labels, multi_label, batch_size)
+        return format_results(scores, candidate_labels)
+    return classify_chunks_nli(model_name, texts, candidate_labels, multi_label, batch_size, backend)
+
+
+def run_nli_batch(classifier, features: List[Dict]) -> np.ndarray:
+    """Logits for a batch of tokenized (chunk, hypothesis) pairs, padded to the longest."""
+    tokenizer, model = classifier.tokenizer, classifier.model
+    with torch.inference_mode():
+        inputs = tokenizer.pad(features, return_tensors="pt").to(model.device)
+        return model(**inputs).logits.float().cpu().numpy()
+
+
+def classify_chunks_nli(
+    model_name: str,
+    texts: List[str],
+    candidate_labels: List[str],
+    multi_label: bool = False,
+    batch_size: Optional[int] = None,
+    backend: Optional[str] = None,
+) -> List[Dict]:
+    """Zero-shot classify every chunk of a document in padded, length-sorted batches.
+
+    Every (chunk, hypothesis) pair is tokenized once, sorted by length and sent
+    through the model batch_size pairs at a time, instead of one pipeline call
+    per chunk. With micro-batching the batches are shared with the other tasks
+    of the worker. Returns one pipeline-style result dict per chunk, in input order.
+    """
+    if not texts:
+        return []
+    batch_size = batch_size or config.INFERENCE_BATCH_SIZE
+    classifier = get_model_pipeline(model_name, backend)
+    tokenizer, model = classifier.tokenizer, classifier.model
+
+    hypotheses = [HYPOTHESIS_TEMPLATE.format(label) for label in candidate_labels]
+    premises = [text for text in texts for _ in hypotheses]
+    encoded = tokenizer(
+        premises,
+        hypotheses * len(texts),
+        truncation="only_first",
+    )
+    features = [
+        {key: encoded[key][i] for key in encoded.keys()} for i in range(len(premises))
+    ]
+    order = np.array(
+        sorted(range(len(features)), key=lambda i: len(features[i]["input_ids"])), dtype=np.int64
+    )
+
+    logits = np.empty((len(features), model.config.num_labels), dtype=np.float32)
+    logits[order] = run_batched(
+        ("nli", model_name, resolve_backend(backend)),
+        partial(run_nli_batch, classifier),
+        [features[i] for i in order],
+        batch_size,
+    )
+    logits = logits.reshape(len(texts), len(candidate_labels), -1)
+    return format_results(
+        scores_from_logits(logits, model.config, multi_label), candidate_labels
+    )
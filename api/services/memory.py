@@ -0,0 +1,46 @@
+import os
+from typing import Dict, Optional
+
+
+def current_rss_bytes() -> Optional[int]:
+    """Resident memory of this process, None when it can't be read."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss
+
+
+def process_memory() -> Dict[str, Optional[int]]:
+    """Resident ("rss"), proportional ("pss") and shared memory of this process in bytes.
+
+    PSS splits every shared page between the processes mapping it, so the PSS of the
+    children of a prefork worker adds up to what they take together, where their RSS
+    counts the weights they share copy-on-write once per child. Only rss is known
+    outside Linux.
+    """
+    memory = {"rss": current_rss_bytes(), "pss": None, "shared": None}
+    try:
+        with open("/proc/self/smaps_rollup") as smaps:
+            fields = {}
+            for line in smaps:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    except (OSError, ValueError):
+        return memory
+    memory["pss"] = fields.get("Pss")
+    if "Shared_Clean" in fields:
+        memory["shared"] = fields["Shared_Clean"] + fields.get("Shared_Dirty", 0)
+    return memory
+
+
+def format_bytes(size: Optional[float]) -> str:
+    if size is None:
+        return "unknown"
+    return f"{size / (1024 * 1024):.0f}MB"
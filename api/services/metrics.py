@@ -0,0 +1,264 @@
+import contextvars
+import cProfile
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from sqlalchemy import event
+
+from .memory import process_memory
+
+logger = logging.getLogger("classifyinator")
+
+# Process wide Prometheus metrics, the API serves its own on /metrics and workers on
+# WORKER_METRICS_PORT. Processes forked by uvicorn or a prefork pool share theirs
+# through PROMETHEUS_MULTIPROC_DIR
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+STAGE_SECONDS = Histogram(
+    "classifyinator_stage_seconds",
+    "Duration of a stage of a classification run",
+    ["stage", "model"],
+    buckets=SECONDS_BUCKETS,
+)
+RUN_SECONDS = Histogram(
+    "classifyinator_run_seconds",
+    "Duration of a whole classification run",
+    ["model", "outcome"],
+    buckets=SECONDS_BUCKETS,
+)
+# throughput of a stage is the rate of these over the rate of its seconds
+STAGE_CHUNKS = Counter("classifyinator_stage_chunks", "Chunks a stage went through", ["stage", "model"])
+STAGE_TOKENS = Counter("classifyinator_stage_tokens", "Tokens a stage went through", ["stage", "model"])
+CACHE_LOOKUPS = Counter(
+    "classifyinator_classification_cache_lookups", "Chunk classification cache lookups", ["result"]
+)
+MODEL_LOAD_SECONDS = Histogram(
+    "classifyinator_model_load_seconds",
+    "Time taken to load a model into a worker",
+    ["kind", "model"],
+    buckets=SECONDS_BUCKETS,
+)
+EXTRACTION_SECONDS = Histogram(
+    "classifyinator_extraction_seconds",
+    "Text extraction time of an upload",
+    ["format"],
+    buckets=SECONDS_BUCKETS,
+)
+# micro-batching of forward passes, per scheduler queue (kind/model[/backend]/batch size)
+INFERENCE_QUEUE_DEPTH = Gauge(
+    "classifyinator_inference_queue_depth",
+    "Items waiting for a micro-batched forward pass",
+    ["queue"],
+    multiprocess_mode="livesum",
+)
+INFERENCE_BATCH_ITEMS = Histogram(
+    "classifyinator_inference_batch_items",
+    "Items in a micro-batched forward pass",
+    ["queue"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+INFERENCE_WAIT_SECONDS = Histogram(
+    "classifyinator_inference_wait_seconds",
+    "Time a request waited before its first items were put in a batch",
+    ["queue"],
+    buckets=SECONDS_BUCKETS,
+)
+# pool usage is checked out over limit, per engine ("sync" or "async") and process
+DB_POOL_CHECKED_OUT = Gauge(
+    "classifyinator_db_pool_checked_out",
+    "Database connections in use",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_LIMIT = Gauge(
+    "classifyinator_db_pool_limit",
+    "Most database connections the pool opens, its size plus overflow",
+    ["engine"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_CHECKOUTS = Counter("classifyinator_db_pool_checkouts", "Database connections handed out", ["engine"])
+DB_POOL_CONNECTS = Counter("classifyinator_db_pool_connects", "Database connections opened", ["engine"])
+# memory of each worker process ("rss", "pss" or "shared"), per pid with PROMETHEUS_MULTIPROC_DIR
+WORKER_MEMORY_BYTES = Gauge(
+    "classifyinator_worker_memory_bytes",
+    "Memory of a worker process",
+    ["kind"],
+    multiprocess_mode="liveall",
+)
+
+
+class RunMetrics:
+    """Stage timings and counts of one process_file run, stored with its classification."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.started = time.perf_counter()
+        self.stages: List[Dict] = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add_stage(
+        self,
+        stage: str,
+        seconds: float,
+        model: Optional[str] = None,
+        chunks: Optional[int] = None,
+        tokens: Optional[int] = None,
+    ):
+        self.stages.append(
+            {"stage": stage, "model": model, "seconds": seconds, "chunks": chunks, "tokens": tokens}
+        )
+
+    @property
+    def seconds(self) -> float:
+        return time.perf_counter() - self.started
+
+
+_current_run: contextvars.ContextVar[Optional[RunMetrics]] = contextvars.ContextVar(
+    "current_run", default=None
+)
+
+
+def current_run() -> Optional[RunMetrics]:
+    return _current_run.get()
+
+
+@contextmanager
+def track_run(model: str):
+    """Collect the stages recorded in this block (and this thread) into a RunMetrics."""
+    run = RunMetrics(model)
+    token = _current_run.set(run)
+    try:
+        yield run
+    finally:
+        _current_run.reset(token)
+
+
+@contextmanager
+def stage(name: str, model: Optional[str] = None):
+    """Time a stage of the current run, the yielded dict takes its "chunks" and "tokens" counts."""
+    counts = {}
+    start = time.perf_counter()
+    try:
+        yield counts
+    finally:
+        seconds = time.perf_counter() - start
+        run = current_run()
+        model = model or (run.model if run else "")
+        STAGE_SECONDS.labels(name, model).observe(seconds)
+        if counts.get("chunks") is not None:
+            STAGE_CHUNKS.labels(name, model).inc(counts["chunks"])
+        if counts.get("tokens") is not None:
+            STAGE_TOKENS.labels(name, model).inc(counts["tokens"])
+        if run:
+            run.add_stage(name, seconds, model, counts.get("chunks"), counts.get("tokens"))
+
+
+def record_cache_lookups(hits: int, misses: int):
+    CACHE_LOOKUPS.labels("hit").inc(hits)
+    CACHE_LOOKUPS.labels("miss").inc(misses)
+    run = current_run()
+    if run:
+        run.cache_hits += hits
+        run.cache_misses += misses
+
+
+def record_model_load(kind: str, name: str, seconds: float):
+    MODEL_LOAD_SECONDS.labels(kind, name).observe(seconds)
+    run = current_run()
+    if run:
+        run.add_stage("load_model", seconds, name)
+
+
+def record_worker_memory() -> Dict[str, Optional[int]]:
+    """Set WORKER_MEMORY_BYTES from this process's memory, which is returned."""
+    memory = process_memory()
+    for kind, value in memory.items():
+        if value is not None:
+            WORKER_MEMORY_BYTES.labels(kind).set(value)
+    return memory
+
+
+def mark_process_dead():
+    """Drop the live gauges of this process, called when a child of a forking server exits."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def instrument_pool(engine, name: str, limit: int):
+    """Report the connection pool of a (sync) SQLAlchemy engine in the DB_POOL_* metrics."""
+    DB_POOL_LIMIT.labels(name).set(limit)
+
+    def checkout(*args):
+        DB_POOL_CHECKOUTS.labels(name).inc()
+        DB_POOL_CHECKED_OUT.labels(name).inc()
+
+    event.listen(engine, "checkout", checkout)
+    event.listen(engine, "checkin", lambda *args: DB_POOL_CHECKED_OUT.labels(name).dec())
+    event.listen(engine, "connect", lambda *args: DB_POOL_CONNECTS.labels(name).inc())
+
+
+def metrics_registry() -> CollectorRegistry:
+    """This process's metrics, or those of every process sharing PROMETHEUS_MULTIPROC_DIR."""
+    if not os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def render_metrics():
+    """Body and content type of a /metrics response."""
+    return generate_latest(metrics_registry()), CONTENT_TYPE_LATEST
+
+
+def serve_metrics(port: int):
+    start_http_server(port, registry=metrics_registry())
+
+
+# held by the one run being profiled
+_profiler_lock = threading.Lock()
+
+
+@contextmanager
+def profiled(path: Optional[str]):
+    """Run the block under cProfile and dump its stats to path, a no-op without a path.
+
+    Only the calling thread is profiled, not the micro-batching threads it hands work to.
+    The stats open with python -m pstats, snakeviz or other cProfile viewers. Python
+    allows one active profiler per process since 3.12, so on a threads pool a run that
+    asks for a profile while another one is profiled runs without it.
+    """
+    if not path:
+        yield
+        return
+    if not _profiler_lock.acquire(blocking=False):
+        logger.warning(f"Another run is being profiled, not writing {path}")
+        yield
+        return
+    try:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            profiler.dump_stats(path)
+    finally:
+        _profiler_lock.release()
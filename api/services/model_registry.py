@@ -0,0 +1,280 @@
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import torch
+from transformers import AutoTokenizer, pipeline
+from sentence_transformers import SentenceTransformer
+
+from .. import config
+from ..models.file_model import EMBEDDING_MODELS, ClassificationLabel, InferenceBackend, Models
+from .memory import current_rss_bytes, format_bytes
+from .metrics import record_model_load
+
+logger = logging.getLogger("classifyinator")
+
+SIMILARITY_MODEL = "all-MiniLM-L6-v2"
+
+
+def get_device():
+    if torch.cuda.is_available():
+        return "cuda"
+    else:
+        return "cpu"
+
+
+def model_size_bytes(model) -> int:
+    """Bytes of weights behind a pipeline, module or ONNX Runtime model."""
+    model = getattr(model, "model", model)
+    if isinstance(model, torch.nn.Module):
+        # the state dict also has the packed int8 weights of quantized layers
+        size, seen = 0, set()
+        for value in model.state_dict().values():
+            for tensor in value if isinstance(value, tuple) else (value,):
+                if isinstance(tensor, torch.Tensor) and tensor.data_ptr() not in seen:
+                    seen.add(tensor.data_ptr())
+                    size += tensor.numel() * tensor.element_size()
+        return size
+    # ONNX Runtime holds the exported graph's weights
+    model_path = getattr(model, "model_path", None)
+    return os.path.getsize(model_path) if model_path and os.path.exists(model_path) else 0
+
+
+@dataclass
+class LoadedModel:
+    model: Any
+    size_bytes: int
+    load_seconds: float
+    # change in the worker's resident memory across the load, other threads can skew it
+    rss_delta_bytes: Optional[int]
+
+
+class ModelRegistry:
+    """Loaded models shared by the worker's threads, unloaded least recently used first
+    once their weights take more than budget_bytes.
+
+    Each model is loaded by one thread, the others wait for it instead of loading a copy.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._entries: "OrderedDict[Tuple[str, str], LoadedModel]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks: Dict[Tuple[str, str], threading.Lock] = {}
+
+    def get(self, kind: str, name: str, load: Callable[[], Any]) -> Any:
+        key = (kind, name)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry.model
+            load_lock = self._load_locks.setdefault(key, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    return entry.model
+            rss_before = current_rss_bytes()
+            start = time.perf_counter()
+            model = load()
+            load_seconds = time.perf_counter() - start
+            record_model_load(kind, name, load_seconds)
+            rss_after = current_rss_bytes()
+            entry = LoadedModel(
+                model=model,
+                size_bytes=model_size_bytes(model),
+                load_seconds=load_seconds,
+                rss_delta_bytes=(
+                    rss_after - rss_before
+                    if rss_before is not None and rss_after is not None
+                    else None
+                ),
+            )
+            with self._lock:
+                self._entries[key] = entry
+                evicted = self._evict(keep=key)
+            logger.info(
+                f"Loaded {kind} {name} in {load_seconds:.1f}s, "
+                f"weights {format_bytes(entry.size_bytes)}, RSS +{format_bytes(entry.rss_delta_bytes)}"
+            )
+        if evicted:
+            self._release(evicted)
+        return model
+
+    def _evict(self, keep: Tuple[str, str]) -> List[Tuple[str, str]]:
+        evicted = []
+        while self.loaded_bytes() > self.budget_bytes:
+            key = next((key for key in self._entries if key != keep), None)
+            if key is None:
+                break
+            del self._entries[key]
+            evicted.append(key)
+        return evicted
+
+    def _release(self, evicted: List[Tuple[str, str]]):
+        # tasks still using an evicted model keep it alive until they finish
+        for kind, name in evicted:
+            logger.info(f"Unloaded {kind} {name} to stay within {format_bytes(self.budget_bytes)}")
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    def loaded_bytes(self) -> int:
+        return sum(entry.size_bytes for entry in self._entries.values())
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            return [
+                {
+                    "kind": kind,
+                    "name": name,
+                    "size_bytes": entry.size_bytes,
+                    "load_seconds": entry.load_seconds,
+                    "rss_delta_bytes": entry.rss_delta_bytes,
+                }
+                for (kind, name), entry in self._entries.items()
+            ]
+
+
+model_registry = ModelRegistry(config.MODEL_MEMORY_BUDGET_MB * 1024 * 1024)
+
+
+def resolve_backend(backend: Optional[str] = None) -> InferenceBackend:
+    # requests that don't choose a backend use the worker's
+    return InferenceBackend(backend or config.INFERENCE_BACKEND)
+
+
+def inference_backend(model_name: str, backend: Optional[str] = None) -> Optional[InferenceBackend]:
+    """Backend a model runs on, None for the embedding models which don't have one."""
+    if model_name in EMBEDDING_MODELS:
+        return None
+    return resolve_backend(backend)
+
+
+def artifact_dir(backend: InferenceBackend, model_name: str) -> str:
+    return os.path.join(config.MODEL_ARTIFACT_DIR, backend.value, model_name.replace("/", "--"))
+
+
+def load_quantized_model(model_name: str):
+    """Dynamic int8 quantization of the model's Linear layers, saved after the first conversion.
+
+    Later loads build the quantized model from its config and load the saved int8
+    weights, so the float32 checkpoint is never read again.
+    """
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+
+    path = os.path.join(artifact_dir(InferenceBackend.quantized, model_name), "model.pt")
+    if os.path.exists(path):
+        model = AutoModelForSequenceClassification.from_config(AutoConfig.from_pretrained(model_name))
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        # written by us below, packed int8 weights aren't loadable with weights_only
+        model.load_state_dict(torch.load(path, weights_only=False))
+        return model.eval()
+
+    logger.info(f"Quantizing {model_name} to int8, saving it to {path}")
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    torch.save(model.state_dict(), f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    return model.eval()
+
+
+def load_onnx_model(model_name: str):
+    """ONNX Runtime model, exported from the checkpoint on first use and kept on disk."""
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError as err:
+        raise RuntimeError(
+            "The onnx inference backend needs optimum[onnxruntime] installed"
+        ) from err
+
+    path = artifact_dir(InferenceBackend.onnx, model_name)
+    if os.path.exists(os.path.join(path, "config.json")):
+        return ORTModelForSequenceClassification.from_pretrained(path)
+
+    logger.info(f"Exporting {model_name} to ONNX in {path}")
+    model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+    model.save_pretrained(path)
+    return ORTModelForSequenceClassification.from_pretrained(path)
+
+
+def get_model_pipeline(model_name: str, backend: Optional[str] = None):
+    """Zero-shot pipeline of an NLI model, multi_label is passed when it is called."""
+    backend = resolve_backend(backend)
+
+    def load():
+        if backend == InferenceBackend.torch:
+            device = get_device()
+            logger.info(f"Loading model {model_name} on {device}")
+            return pipeline("zero-shot-classification", model=model_name, device=device)
+        # both converted backends run on the CPU
+        if backend == InferenceBackend.quantized:
+            model = load_quantized_model(model_name)
+        else:
+            model = load_onnx_model(model_name)
+        return pipeline(
+            "zero-shot-classification", model=model, tokenizer=get_tokenizer(model_name), device="cpu"
+        )
+
+    return model_registry.get(f"{backend.value} pipeline", model_name, load)
+
+
+def get_embed_model(model_name: str = SIMILARITY_MODEL):
+    return model_registry.get(
+        "embedder", model_name, lambda: SentenceTransformer(model_name, device=get_device())
+    )
+
+
+@lru_cache(maxsize=len(Models) + 1)
+def get_tokenizer(model_name):
+    # small next to the weights, not worth counting against the budget
+    return AutoTokenizer.from_pretrained(model_name, use_fast=True)
+
+
+def preload_models(model_names: List[str]):
+    """Load models up front and log the time and memory each of them took."""
+    from .embedding_classifier import get_label_embeddings
+
+    rss_before = current_rss_bytes()
+    start = time.perf_counter()
+    candidate_labels = tuple(label.value for label in ClassificationLabel)
+    for model_name in model_names:
+        if model_name == SIMILARITY_MODEL:
+            get_embed_model(model_name)
+            continue
+        if model_name in EMBEDDING_MODELS:
+            get_label_embeddings(model_name, candidate_labels)
+        else:
+            get_model_pipeline(model_name)
+        get_tokenizer(model_name)
+    rss_after = current_rss_bytes()
+    logger.info(
+        f"Preloaded {len(model_names)} models in {time.perf_counter() - start:.1f}s, "
+        f"RSS {format_bytes(rss_before)} -> {format_bytes(rss_after)}"
+    )
+    for entry in model_registry.stats():
+        logger.info(
+            f"  {entry['kind']} {entry['name']}: {entry['load_seconds']:.1f}s, "
+            f"weights {format_bytes(entry['size_bytes'])}, RSS +{format_bytes(entry['rss_delta_bytes'])}"
+        )
+
+
+def models_to_preload(setting: str) -> List[str]:
+    if setting.strip().lower() == "all":
+        return [SIMILARITY_MODEL, *(model.value for model in Models)]
+    names = [name.strip() for name in setting.split(",") if name.strip()]
+    known = {SIMILARITY_MODEL, *(model.value for model in Models)}
+    for name in names:
+        if name not in known:
+            raise ValueError(f"Unknown model in PRELOAD_MODELS: {name}")
+    return names
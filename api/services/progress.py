@@ -0,0 +1,136 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import AsyncIterator, Dict, Optional
+
+from .. import config
+
+logger = logging.getLogger("classifyinator")
+
+# Stages after which no more events are published for a run
+TERMINAL_STAGES = {"completed", "failed", "cancelled"}
+
+
+class InMemoryProgressBroker:
+    """Pub/sub inside one process, used when Redis isn't available.
+
+    Events can be published from any thread (e.g. Celery worker threads or an
+    eager task) and are handed to each subscriber's event loop.
+    """
+
+    def __init__(self, max_files: int = 1000):
+        self.max_files = max_files
+        self._subscribers: Dict[int, set] = {}
+        self._latest = OrderedDict()
+        self._lock = threading.Lock()
+
+    def publish(self, file_id: int, event: Dict):
+        with self._lock:
+            self._latest[file_id] = event
+            self._latest.move_to_end(file_id)
+            while len(self._latest) > self.max_files:
+                self._latest.popitem(last=False)
+            subscribers = list(self._subscribers.get(file_id, ()))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    def clear(self, file_id: int):
+        with self._lock:
+            self._latest.pop(file_id, None)
+
+    async def subscribe(self, file_id: int, timeout: float) -> AsyncIterator[Optional[Dict]]:
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(file_id, set()).add(subscriber)
+            latest = self._latest.get(file_id)
+        try:
+            if latest:
+                yield latest
+            while True:
+                try:
+                    yield await asyncio.wait_for(subscriber[1].get(), timeout)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                self._subscribers[file_id].discard(subscriber)
+                if not self._subscribers[file_id]:
+                    del self._subscribers[file_id]
+
+
+class RedisProgressBroker:
+    """Redis pub/sub, so events published by workers reach every API process."""
+
+    channel_prefix = "file-progress:"
+    latest_prefix = "file-progress-latest:"
+    latest_ttl_seconds = 24 * 60 * 60
+
+    def __init__(self, url: str):
+        import redis
+
+        self.url = url
+        self._redis = redis.Redis.from_url(url)
+
+    def publish(self, file_id: int, event: Dict):
+        payload = json.dumps(event)
+        pipe = self._redis.pipeline()
+        pipe.set(f"{self.latest_prefix}{file_id}", payload, ex=self.latest_ttl_seconds)
+        pipe.publish(f"{self.channel_prefix}{file_id}", payload)
+        pipe.execute()
+
+    def clear(self, file_id: int):
+        self._redis.delete(f"{self.latest_prefix}{file_id}")
+
+    async def subscribe(self, file_id: int, timeout: float) -> AsyncIterator[Optional[Dict]]:
+        import redis.asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        try:
+            # subscribe before reading the latest event so nothing is missed in between
+            await pubsub.subscribe(f"{self.channel_prefix}{file_id}")
+            latest = await client.get(f"{self.latest_prefix}{file_id}")
+            if latest:
+                yield json.loads(latest)
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=timeout)
+                yield json.loads(message["data"]) if message else None
+        finally:
+            await pubsub.aclose()
+            await client.aclose()
+
+
+@lru_cache(maxsize=1)
+def get_progress_broker():
+    backend = config.PROGRESS_BACKEND
+    if backend in ("redis", "auto"):
+        try:
+            broker = RedisProgressBroker(config.REDIS_URL)
+            broker._redis.ping()
+            return broker
+        except Exception as err:
+            if backend == "redis":
+                raise
+            logger.warning(f"Redis unavailable for progress events, using in-memory pub/sub: {err}")
+    return InMemoryProgressBroker()
+
+
+def publish_progress(file_id: int, stage: str, **data):
+    """Publish a progress event for a file, never failing the caller."""
+    event = {"file_id": file_id, "stage": stage, "time": time.time(), **data}
+    try:
+        get_progress_broker().publish(file_id, event)
+    except Exception as err:
+        logger.warning(f"Could not publish progress for file {file_id}: {err}")
+
+
+def clear_progress(file_id: int):
+    """Forget the latest event of a deleted file, its id may be handed to a new one."""
+    try:
+        get_progress_broker().clear(file_id)
+    except Exception as err:
+        logger.warning(f"Could not clear progress for file {file_id}: {err}")
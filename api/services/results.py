@@ -0,0 +1,239 @@
+from array import array
+import math
+from typing import Dict, List, Optional
+
+from sqlalchemy import delete, insert, literal
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from ..models.file_model import (
+    ChunkingStrategy,
+    ClassificationLabel,
+    FileClassification,
+    FileClassificationChunk,
+    FileClassificationChunkRead,
+    FileClassificationScore,
+    FileClassificationStage,
+    FileParagraphEmbedding,
+    FileRecord,
+    FileTask,
+    InferenceBackend,
+)
+from .extraction import normalise_newlines
+
+# labels are packed in enum order, new labels have to go at the end
+PACKED_LABELS = list(ClassificationLabel)
+
+
+def pack_scores(scores: Optional[Dict[str, float]]) -> Optional[bytes]:
+    """A chunk's label -> score dict as float32 bytes, one per ClassificationLabel."""
+    if not scores:
+        return None
+    # array("f") is float32 like numpy's, numpy isn't imported in the API process
+    return array("f", [scores.get(label.value, math.nan) for label in PACKED_LABELS]).tobytes()
+
+
+def unpack_scores(packed: Optional[bytes]) -> Optional[Dict[ClassificationLabel, float]]:
+    if not packed:
+        return None
+    values = array("f")
+    values.frombytes(packed)
+    return {
+        label: value for label, value in zip(PACKED_LABELS, values) if not math.isnan(value)
+    }
+
+
+def chunk_read(chunk: FileClassificationChunk, file_contents: Optional[str]) -> FileClassificationChunkRead:
+    """The API view of a stored chunk, with its text sliced from the file's."""
+    text = chunk.chunk
+    if text is None:
+        # offsets index into the text the chunker saw, normalise_newlines keeps lengths
+        text = normalise_newlines(file_contents[chunk.start : chunk.end])
+    return FileClassificationChunkRead(
+        id=chunk.id,
+        file_classification_id=chunk.file_classification_id,
+        start=chunk.start,
+        end=chunk.end,
+        chunk=text,
+        chunk_classification_label=chunk.chunk_classification_label,
+        chunk_classification_score=chunk.chunk_classification_score,
+        scores=unpack_scores(chunk.scores),
+        model=chunk.model,
+    )
+
+
+def insert_classification_rows(
+    db: Session, file_classification_id: int, label_scores: Dict[str, float], chunks: List[Dict]
+):
+    """Insert a run's document scores and classified chunks, one executemany per table.
+
+    chunks are chunk_document dicts with their "chunk_classification". Only the
+    offsets of a chunk are stored, not its text. Nothing is committed, so the rows
+    land in the caller's transaction.
+    """
+    db.execute(
+        insert(FileClassificationScore),
+        [
+            {
+                "file_classification_id": file_classification_id,
+                "classification": label,
+                "classification_score": score,
+            }
+            for label, score in label_scores.items()
+        ],
+    )
+    if chunks:
+        db.execute(
+            insert(FileClassificationChunk),
+            [
+                {
+                    "file_classification_id": file_classification_id,
+                    "start": chunk["start"],
+                    "end": chunk["end"],
+                    "chunk_classification_score": chunk["chunk_classification"]["score"],
+                    "chunk_classification_label": chunk["chunk_classification"]["label"],
+                    "scores": pack_scores(chunk["chunk_classification"].get("scores")),
+                    "model": chunk["chunk_classification"]["model"],
+                }
+                for chunk in chunks
+            ],
+        )
+
+
+def insert_stage_rows(db: Session, file_classification_id: int, stages: List[Dict]):
+    """Insert the RunMetrics stages of a run, uncommitted."""
+    if stages:
+        db.execute(
+            insert(FileClassificationStage),
+            [{"file_classification_id": file_classification_id, **stage} for stage in stages],
+        )
+
+
+def find_reusable_classification(
+    db: Session,
+    file: FileRecord,
+    model: str,
+    chunking_strategy: ChunkingStrategy,
+    chunk_size: Optional[int],
+    overlap: Optional[int],
+    multi_label: bool,
+    backend: Optional[InferenceBackend] = None,
+    cascade_model: Optional[str] = None,
+    cascade_min_score: Optional[float] = None,
+    cascade_min_margin: Optional[float] = None,
+    adaptive: bool = False,
+) -> Optional[FileClassification]:
+    """Latest classification of another file with the same bytes and the same parameters."""
+    if not file.content_hash:
+        return None
+    statement = (
+        select(FileClassification)
+        .join(FileRecord, FileClassification.file_id == FileRecord.id)
+        .where(
+            FileRecord.content_hash == file.content_hash,
+            FileRecord.id != file.id,
+            FileClassification.model == model,
+            FileClassification.chunking_strategy == ChunkingStrategy(chunking_strategy),
+            FileClassification.chunk_size == chunk_size,
+            FileClassification.chunk_overlap_size == overlap,
+            FileClassification.multi_label == multi_label,
+            FileClassification.backend == backend,
+            FileClassification.cascade_model == cascade_model,
+            FileClassification.cascade_min_score == cascade_min_score,
+            FileClassification.cascade_min_margin == cascade_min_margin,
+            FileClassification.adaptive == adaptive,
+        )
+        .order_by(FileClassification.id.desc())
+    )
+    return db.exec(statement).first()
+
+
+def copy_classification(db: Session, source: FileClassification, file_id: int) -> FileClassification:
+    """Copy a classification with its scores and chunks to another file, uncommitted.
+
+    Chunk offsets stay valid because the copy is only made between files with the same text.
+    """
+    file_classification = FileClassification(
+        file_id=file_id,
+        model=source.model,
+        multi_label=source.multi_label,
+        chunking_strategy=source.chunking_strategy,
+        chunk_size=source.chunk_size,
+        chunk_overlap_size=source.chunk_overlap_size,
+        backend=source.backend,
+        cascade_model=source.cascade_model,
+        cascade_min_score=source.cascade_min_score,
+        cascade_min_margin=source.cascade_min_margin,
+        adaptive=source.adaptive,
+        chunks_classified=source.chunks_classified,
+        chunks_total=source.chunks_total,
+        top_label=source.top_label,
+        top_score=source.top_score,
+    )
+    db.add(file_classification)
+    db.flush()
+    # INSERT ... SELECT, the rows never leave SQLite
+    db.execute(
+        insert(FileClassificationScore).from_select(
+            ["file_classification_id", "classification", "classification_score"],
+            select(
+                literal(file_classification.id),
+                FileClassificationScore.classification,
+                FileClassificationScore.classification_score,
+            ).where(FileClassificationScore.file_classification_id == source.id),
+        )
+    )
+    db.execute(
+        insert(FileClassificationChunk).from_select(
+            [
+                "file_classification_id",
+                "start",
+                "end",
+                "chunk",
+                "chunk_classification_label",
+                "chunk_classification_score",
+                "scores",
+                "model",
+            ],
+            select(
+                literal(file_classification.id),
+                FileClassificationChunk.start,
+                FileClassificationChunk.end,
+                FileClassificationChunk.chunk,
+                FileClassificationChunk.chunk_classification_label,
+                FileClassificationChunk.chunk_classification_score,
+                FileClassificationChunk.scores,
+                FileClassificationChunk.model,
+            )
+            .where(FileClassificationChunk.file_classification_id == source.id)
+            .order_by(FileClassificationChunk.id),
+        )
+    )
+    return file_classification
+
+
+async def delete_classifications(db: AsyncSession, file_classification_ids: List[int]):
+    """Delete classifications with their scores, chunks and stages, uncommitted.
+
+    Bulk deletes, as session.delete would lazy load every chunk to cascade to it,
+    which an AsyncSession can't do.
+    """
+    if not file_classification_ids:
+        return
+    for child in (FileClassificationChunk, FileClassificationScore, FileClassificationStage):
+        await db.exec(delete(child).where(child.file_classification_id.in_(file_classification_ids)))
+    await db.exec(delete(FileClassification).where(FileClassification.id.in_(file_classification_ids)))
+
+
+async def delete_file(db: AsyncSession, file_id: int):
+    """Delete a file with its classifications, paragraph embeddings and task rows, uncommitted.
+
+    Runs of the file still going stop at their next cancellation check, their row is gone.
+    """
+    file_classification_ids = (
+        await db.exec(select(FileClassification.id).where(FileClassification.file_id == file_id))
+    ).all()
+    await delete_classifications(db, file_classification_ids)
+    await db.exec(delete(FileParagraphEmbedding).where(FileParagraphEmbedding.file_id == file_id))
+    await db.exec(delete(FileTask).where(FileTask.file_id == file_id))
+    await db.exec(delete(FileRecord).where(FileRecord.id == file_id))
@@ -0,0 +1,134 @@
+import time
+from statistics import NormalDist
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# classify(chunk indices) -> (pipeline-style results, model that scored each chunk)
+ClassifyChunks = Callable[[List[int]], Tuple[List[Dict], List[str]]]
+
+
+def stratified_order(count: int, strata: int, rng: np.random.Generator) -> List[int]:
+    """Chunk indices in a random order that covers the whole document early.
+
+    The chunks are split into strata runs of consecutive chunks, each run is shuffled
+    and the runs are interleaved, so every strata indices take one chunk from each run.
+    """
+    if count <= 0:
+        return []
+    runs = np.array_split(np.arange(count), min(max(strata, 1), count))
+    runs = [rng.permutation(run) for run in runs]
+    # array_split makes the first runs the longest
+    return [int(run[i]) for i in range(len(runs[0])) for run in runs if i < len(run)]
+
+
+class WeightedEstimate:
+    """Running estimate of the document scores from a sample of its chunks.
+
+    A document score is the chunk length weighted mean of the chunk scores, the
+    sample estimates it with the same weighted mean (a ratio estimator). Its
+    variance is approximated by linearisation with a finite population correction,
+    which treats the stratified sample as a simple random one and so errs wide.
+    """
+
+    def __init__(self, labels: Sequence[str], population: int, confidence: float):
+        self.labels = list(labels)
+        self.population = population
+        self.z = NormalDist().inv_cdf(0.5 + confidence / 2)
+        self._scores: List[List[float]] = []
+        self._weights: List[float] = []
+
+    def add(self, result: Dict, weight: float):
+        scores = dict(zip(result["labels"], result["scores"]))
+        self._scores.append([scores[label] for label in self.labels])
+        self._weights.append(weight)
+
+    @property
+    def count(self) -> int:
+        return len(self._weights)
+
+    def _standard_error(self, values: np.ndarray, weights: np.ndarray, mean) -> np.ndarray:
+        n = len(weights)
+        if n < 2 or not weights.sum():
+            return np.full(np.shape(mean), np.inf)
+        residuals = weights.reshape(-1, *[1] * (values.ndim - 1)) * (values - mean)
+        variance = (residuals**2).sum(0) / (n - 1) / n / weights.mean() ** 2
+        return np.sqrt(variance * (1 - n / self.population))
+
+    def _arrays(self):
+        return np.array(self._scores, dtype=np.float64), np.array(self._weights, dtype=np.float64)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Estimate and confidence interval half width of every label's score."""
+        scores, weights = self._arrays()
+        if not weights.sum():
+            return {}
+        means = np.average(scores, axis=0, weights=weights)
+        half_widths = self.z * self._standard_error(scores, weights, means)
+        return {
+            label: {"score": float(mean), "half_width": float(half_width)}
+            for label, mean, half_width in zip(self.labels, means, half_widths)
+        }
+
+    def settled(self) -> bool:
+        """Whether the top label's lead over the runner up is clear of its confidence interval."""
+        scores, weights = self._arrays()
+        if len(self.labels) < 2 or not weights.sum():
+            return False
+        means = np.average(scores, axis=0, weights=weights)
+        runner_up, top = np.argsort(means)[-2:]
+        # the interval of the per chunk difference, not of each label, as both move together
+        differences = scores[:, top] - scores[:, runner_up]
+        lead = means[top] - means[runner_up]
+        return lead - self.z * self._standard_error(differences, weights, lead) > 0
+
+
+def classify_sampled(
+    weights: Sequence[float],
+    labels: Sequence[str],
+    classify: ClassifyChunks,
+    rng: np.random.Generator,
+    round_chunks: int,
+    min_chunks: int,
+    max_chunks: int,
+    time_budget_seconds: float,
+    confidence: float,
+    on_round: Optional[Callable[[WeightedEstimate], None]] = None,
+) -> Tuple[List[int], List[Dict], List[str], str]:
+    """Classify chunks round by round in stratified order until the top label is settled.
+
+    Stops once the lead is settled (after at least min_chunks), when max_chunks have
+    been classified, when time_budget_seconds has passed, or when every chunk is done.
+    Returns the classified indices in document order with their results and models,
+    and why it stopped.
+    """
+    started = time.monotonic()
+    order = stratified_order(len(weights), round_chunks, rng)
+    estimate = WeightedEstimate(labels, len(order), confidence)
+    classified = {}
+    reason = "exhausted"
+    while estimate.count < len(order):
+        indices = order[estimate.count : min(estimate.count + round_chunks, max(max_chunks, 1))]
+        for index, result, model in zip(indices, *classify(indices)):
+            classified[index] = (result, model)
+            estimate.add(result, weights[index])
+        if on_round:
+            on_round(estimate)
+        if estimate.count >= len(order):
+            break
+        if estimate.count >= min_chunks and estimate.settled():
+            reason = "settled"
+            break
+        if estimate.count >= max_chunks:
+            reason = "chunk_budget"
+            break
+        if time.monotonic() - started >= time_budget_seconds:
+            reason = "time_budget"
+            break
+    indices = sorted(classified)
+    return (
+        indices,
+        [classified[i][0] for i in indices],
+        [classified[i][1] for i in indices],
+        reason,
+    )
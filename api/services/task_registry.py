@@ -0,0 +1,179 @@
+import hashlib
+import json
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .. import config
+from ..database import engine
+from ..models.file_model import ChunkingStrategy, FileTask, FileTaskStatus
+
+
+class TaskCancelled(Exception):
+    """The task was superseded by a re-upload or a delete while it ran."""
+
+
+def task_key(
+    content_hash: Optional[str],
+    file_id: int,
+    model: str,
+    chunking_strategy: ChunkingStrategy,
+    chunk_size: Optional[int],
+    overlap: Optional[int],
+    multi_label: bool = False,
+    backend: Optional[str] = None,
+    cascade_model: Optional[str] = None,
+    cascade_min_score: Optional[float] = None,
+    cascade_min_margin: Optional[float] = None,
+    adaptive: bool = False,
+) -> str:
+    """Idempotency key of a process_file run, from the file's content hash and the task's args.
+
+    The content hash is part of it, so after a re-upload the same request is a new run.
+    Args left out take process_file's defaults, default_processing_args gets the same
+    key as a request spelling them out.
+    """
+    params = [
+        content_hash,
+        file_id,
+        model,
+        chunking_strategy,
+        chunk_size,
+        overlap,
+        multi_label,
+        backend,
+        cascade_model,
+        cascade_min_score,
+        cascade_min_margin,
+        adaptive,
+    ]
+    params = [getattr(param, "value", param) for param in params]
+    return hashlib.sha256(json.dumps(params).encode("utf-8")).hexdigest()
+
+
+def stale_before() -> datetime:
+    # a worker that died mid run never deletes its row, don't attach to it forever
+    return datetime.now(timezone.utc) - timedelta(seconds=config.TASK_COALESCE_SECONDS)
+
+
+async def claim_task(db: AsyncSession, key: str, file_id: int) -> Tuple[str, bool]:
+    """The id of the live task for key, registering a new queued one when there is none.
+
+    Returns (task id, whether it is new). The row is committed, enqueue a new task
+    with this id afterwards. Two requests racing for a key both get the same task.
+    """
+    await db.exec(
+        delete(FileTask).where(FileTask.key == key, FileTask.created_at < stale_before())
+    )
+    live = select(FileTask.task_id).where(
+        FileTask.key == key, FileTask.status != FileTaskStatus.cancelled
+    )
+    task_id = (await db.exec(live)).first()
+    if task_id:
+        await db.commit()
+        return task_id, False
+    task_id = str(uuid.uuid4())
+    db.add(FileTask(task_id=task_id, key=key, file_id=file_id))
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return (await db.exec(live)).one(), False
+    return task_id, True
+
+
+async def cancel_file_tasks(db: AsyncSession, file_ids: List[int]) -> List[str]:
+    """Mark the live tasks of these files cancelled, uncommitted, returning their ids.
+
+    They aren't revoked in Celery: a revoked task drops the rest of its chain, which
+    holds the runs of identical files. Workers skip queued ones in start_task instead.
+    """
+    if not file_ids:
+        return []
+    # rows of cancelled tasks that never reached a worker are never deleted by one
+    await db.exec(
+        delete(FileTask).where(
+            FileTask.status == FileTaskStatus.cancelled, FileTask.updated_at < stale_before()
+        )
+    )
+    statement = select(FileTask.task_id).where(
+        FileTask.file_id.in_(file_ids), FileTask.status != FileTaskStatus.cancelled
+    )
+    task_ids = list((await db.exec(statement)).all())
+    if task_ids:
+        await db.exec(
+            update(FileTask)
+            .where(FileTask.task_id.in_(task_ids))
+            .values(status=FileTaskStatus.cancelled, updated_at=datetime.now(timezone.utc))
+        )
+    return task_ids
+
+
+async def drop_tasks(db: AsyncSession, task_ids: List[str]):
+    """Delete the rows of claimed tasks that could not be enqueued, uncommitted.
+
+    Requests would otherwise attach to a task no worker will ever run until
+    TASK_COALESCE_SECONDS have passed.
+    """
+    if task_ids:
+        await db.exec(delete(FileTask).where(FileTask.task_id.in_(task_ids)))
+
+
+def start_task(db: Session, task_id: Optional[str]) -> Optional[FileTaskStatus]:
+    """Mark a task running, its status is cancelled when it was cancelled while queued.
+
+    None for tasks without a row (enqueued without claim_task, or called directly),
+    those just run.
+    """
+    task = db.get(FileTask, task_id) if task_id else None
+    if not task:
+        return None
+    if task.status == FileTaskStatus.cancelled:
+        db.delete(task)
+        db.commit()
+        return FileTaskStatus.cancelled
+    task.status = FileTaskStatus.running
+    task.updated_at = datetime.now(timezone.utc)
+    db.add(task)
+    db.commit()
+    return FileTaskStatus.running
+
+
+def finish_task(task_id: Optional[str]):
+    if not task_id:
+        return
+    with Session(engine) as db:
+        db.exec(delete(FileTask).where(FileTask.task_id == task_id))
+        db.commit()
+
+
+class CancellationCheck:
+    """Raises TaskCancelled when called after the task's row was cancelled or deleted.
+
+    Meant to be called between chunks, the row is read at most every interval seconds
+    unless forced, in a session of its own so the run's transaction isn't touched.
+    """
+
+    def __init__(self, task_id: Optional[str], interval: Optional[float] = None):
+        self.task_id = task_id
+        self.interval = config.TASK_CANCEL_CHECK_SECONDS if interval is None else interval
+        self._checked = time.monotonic()
+
+    def __call__(self, force: bool = False):
+        if not self.task_id:
+            return
+        now = time.monotonic()
+        if not force and now - self._checked < self.interval:
+            return
+        self._checked = now
+        with Session(engine) as db:
+            status = db.exec(select(FileTask.status).where(FileTask.task_id == self.task_id)).first()
+        if status is None or status == FileTaskStatus.cancelled:
+            raise TaskCancelled(f"Task {self.task_id} was cancelled")
+
@@ -0,0 +1,374 @@
+import os
+import zlib
+from datetime import datetime, timezone
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from celery.utils.log import get_task_logger
+from sqlmodel import Session
+
+from .. import config
+from ..celery_app import PROCESS_FILE_TASK, celery_app
+from ..database import engine
+from ..models.file_model import (
+    ChunkingStrategy,
+    ClassificationLabel,
+    FileClassification,
+    FileRecord,
+    FileStatus,
+    FileTaskStatus,
+    InferenceBackend,
+)
+from .batching import get_inference_scheduler
+from .blob_store import read_file_text
+from .chunking import chunk_document, chunk_text
+from .classification_cache import classify_chunks_cached, get_classification_cache
+from .embeddings import get_file_paragraph_embeddings
+from .metrics import RUN_SECONDS, profiled, stage, track_run
+from .model_registry import inference_backend
+from .progress import publish_progress
+from .results import (
+    copy_classification,
+    find_reusable_classification,
+    insert_classification_rows,
+    insert_stage_rows,
+)
+from .sampling import classify_sampled
+from .task_registry import CancellationCheck, TaskCancelled, finish_task, start_task
+
+# Only imported by workers, the API enqueues these by name through celery_app
+task_logger = get_task_logger(__name__)
+
+
+def needs_escalation(result: Dict, min_score: float, min_margin: float) -> bool:
+    scores = result["scores"]
+    margin = scores[0] - scores[1] if len(scores) > 1 else scores[0]
+    return scores[0] < min_score or margin < min_margin
+
+
+def classify_chunk_texts(
+    file_id: int,
+    model: str,
+    texts: List[str],
+    candidate_labels: List[str],
+    multi_label: bool,
+    backend: Optional[InferenceBackend] = None,
+    cascade_model: Optional[str] = None,
+    cascade_min_score: Optional[float] = None,
+    cascade_min_margin: Optional[float] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> Tuple[List[Dict], List[str]]:
+    """Results for texts and the model that scored each, escalating unsure chunks to cascade_model."""
+    chunk_results = classify_chunks_cached(
+        model, texts, candidate_labels, multi_label, on_progress=on_progress, backend=backend
+    )
+    chunk_models = [model] * len(texts)
+    if cascade_model:
+        escalated = [
+            i
+            for i, result in enumerate(chunk_results)
+            if needs_escalation(result, cascade_min_score, cascade_min_margin)
+        ]
+        publish_progress(
+            file_id, "escalated", model=cascade_model, chunks=len(escalated), chunks_total=len(chunk_results)
+        )
+        task_logger.info(f"Escalating {len(escalated)}/{len(chunk_results)} chunks to {cascade_model}")
+        with stage("escalate", cascade_model) as counts:
+            escalated_results = classify_chunks_cached(
+                cascade_model,
+                [texts[i] for i in escalated],
+                candidate_labels,
+                multi_label,
+                backend=inference_backend(cascade_model, backend),
+            )
+            counts["chunks"] = len(escalated)
+        for i, result in zip(escalated, escalated_results):
+            chunk_results[i] = result
+            chunk_models[i] = cascade_model
+    return chunk_results, chunk_models
+
+
+def classify_file(
+    db: Session,
+    file: FileRecord,
+    model: str,
+    chunking_strategy: ChunkingStrategy,
+    chunk_size: int,
+    overlap: int,
+    multi_label: bool,
+    backend: Optional[InferenceBackend] = None,
+    cascade_model: Optional[str] = None,
+    cascade_min_score: Optional[float] = None,
+    cascade_min_margin: Optional[float] = None,
+    adaptive: bool = False,
+    check_cancelled: Callable[[], None] = lambda: None,
+) -> FileClassification:
+    """Chunk and classify a file's text, adding the results to the session uncommitted.
+
+    With a cascade_model, the chunks whose top score or margin is below the cascade
+    thresholds are classified again by it and keep its scores. Adaptive runs classify
+    a stratified sample of the chunks, only those are stored and averaged. The time
+    of each stage goes to the run being tracked. check_cancelled is called between
+    chunks and raises to stop the run.
+    """
+    file_id = file.id
+    text = read_file_text(file.text_ref)
+    paragraph_embeddings = None
+    is_paragraph_strategy = ChunkingStrategy(chunking_strategy) == ChunkingStrategy.paragraph
+    if is_paragraph_strategy:
+        with stage("embed") as counts:
+            paragraphs = chunk_text(text)
+            paragraph_embeddings = get_file_paragraph_embeddings(
+                db, file, [paragraph["text"] for paragraph in paragraphs]
+            )
+            counts["chunks"] = len(paragraphs)
+        publish_progress(file_id, "chunked", paragraphs=len(paragraphs))
+    with stage("chunk") as counts:
+        chunks_by_token = chunk_document(
+            model,
+            text,
+            chunking_strategy,
+            chunk_size,
+            overlap,
+            paragraph_embeddings,
+        )
+        counts["chunks"] = len(chunks_by_token)
+        counts["tokens"] = sum(chunk["token_count"] or 0 for chunk in chunks_by_token)
+    if not chunks_by_token:
+        # e.g. a scanned PDF, there are no scores to average
+        raise ValueError(f"File {file_id} has no text to classify")
+    publish_progress(
+        file_id, "merged" if is_paragraph_strategy else "chunked", chunks=len(chunks_by_token)
+    )
+    candidate_labels = [label.value for label in ClassificationLabel]
+    results = {label: [] for label in candidate_labels}
+    weights = {label: [] for label in candidate_labels}
+    classify = partial(
+        classify_chunk_texts,
+        file_id,
+        model,
+        candidate_labels=candidate_labels,
+        multi_label=multi_label,
+        backend=backend,
+        cascade_model=cascade_model,
+        cascade_min_score=cascade_min_score,
+        cascade_min_margin=cascade_min_margin,
+    )
+
+    def on_progress(done, total):
+        check_cancelled()
+        publish_progress(file_id, "classified", chunks_done=done, chunks_total=total)
+
+    def on_round(estimate):
+        check_cancelled()
+        publish_progress(
+            file_id,
+            "sampled",
+            chunks_done=estimate.count,
+            chunks_total=len(chunks_by_token),
+            estimate=estimate.summary(),
+        )
+
+    with stage("classify") as counts:
+        if adaptive:
+            chunk_weights = [len(chunk["text"].split()) for chunk in chunks_by_token]
+            indices, chunk_results, chunk_models, reason = classify_sampled(
+                chunk_weights,
+                candidate_labels,
+                lambda indices: classify([chunks_by_token[i]["text"] for i in indices]),
+                # seeded by the text so a rerun samples, and hits the cache for, the same chunks
+                np.random.default_rng(zlib.crc32(text.encode("utf-8"))),
+                config.ADAPTIVE_ROUND_CHUNKS,
+                config.ADAPTIVE_MIN_CHUNKS,
+                config.ADAPTIVE_MAX_CHUNKS,
+                config.ADAPTIVE_TIME_BUDGET_SECONDS,
+                config.ADAPTIVE_CONFIDENCE,
+                on_round=on_round,
+            )
+            task_logger.info(
+                f"Adaptive run of file {file_id} stopped ({reason}) after "
+                f"{len(indices)}/{len(chunks_by_token)} chunks"
+            )
+            classified_chunks = [chunks_by_token[i] for i in indices]
+        else:
+            chunk_results, chunk_models = classify(
+                [chunk["text"] for chunk in chunks_by_token],
+                on_progress=on_progress,
+            )
+            classified_chunks = chunks_by_token
+        counts["chunks"] = len(classified_chunks)
+        counts["tokens"] = sum(chunk["token_count"] or 0 for chunk in classified_chunks)
+    task_logger.info(f"Classification cache stats: {get_classification_cache().stats()}")
+    if config.INFERENCE_MICRO_BATCHING:
+        task_logger.info(f"Inference scheduler stats: {get_inference_scheduler().stats()}")
+    for chunk, result, chunk_model in zip(classified_chunks, chunk_results, chunk_models):
+        max_chunk_classification = {
+            "label": result["labels"][0],
+            "score": result["scores"][0],
+            "model": chunk_model,
+        }
+        for label, score in zip(result["labels"], result["scores"]):
+            if score > max_chunk_classification["score"]:
+                max_chunk_classification = {"label": label, "score": score, "model": chunk_model}
+            results[label].append(score)
+            weights[label].append(len(chunk["text"].split()))
+        max_chunk_classification["scores"] = dict(zip(result["labels"], result["scores"]))
+        chunk["chunk_classification"] = max_chunk_classification
+
+    label_scores = {
+        label: float(np.average(results[label], weights=weights[label]))
+        for label in candidate_labels
+    }
+    top_label = max(label_scores, key=label_scores.get)
+    file_classification = FileClassification(
+        file_id=file.id,
+        model=model,
+        multi_label=multi_label,
+        chunking_strategy=chunking_strategy,
+        chunk_size=chunk_size,
+        chunk_overlap_size=overlap,
+        backend=backend,
+        cascade_model=cascade_model,
+        cascade_min_score=cascade_min_score,
+        cascade_min_margin=cascade_min_margin,
+        adaptive=adaptive,
+        chunks_classified=len(classified_chunks),
+        chunks_total=len(chunks_by_token),
+        top_label=top_label,
+        top_score=label_scores[top_label],
+    )
+    with stage("persist") as counts:
+        db.add(file_classification)
+        db.flush()
+        insert_classification_rows(db, file_classification.id, label_scores, classified_chunks)
+        counts["chunks"] = len(classified_chunks)
+    return file_classification
+
+
+def profile_path(file_id: int) -> str:
+    return os.path.join(
+        config.PROFILE_DIR, f"file-{file_id}-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}.prof"
+    )
+
+
+@celery_app.task(name=PROCESS_FILE_TASK, bind=True)
+def process_file(
+    self,
+    file_id: int,
+    model: str,
+    chunking_strategy: ChunkingStrategy,
+    chunk_size: int,
+    overlap: int,
+    multi_label: bool = False,
+    backend: Optional[str] = None,
+    cascade_model: Optional[str] = None,
+    cascade_min_score: Optional[float] = None,
+    cascade_min_margin: Optional[float] = None,
+    adaptive: bool = False,
+    profile: bool = False,
+):
+    task_id = self.request.id
+    with Session(engine) as db, track_run(model) as run:
+        status = start_task(db, task_id)
+        if status == FileTaskStatus.cancelled:
+            task_logger.info(f"Skipping cancelled task {task_id} of file {file_id}")
+            return
+        file = db.get(FileRecord, file_id)
+        if not file:
+            task_logger.error(f"File with id {file_id} not found for processing.")
+            finish_task(task_id)
+            return
+        # only tasks registered by the API can be cancelled
+        check_cancelled = CancellationCheck(task_id if status else None)
+        try:
+            with profiled(profile_path(file_id) if profile else None):
+                backend = inference_backend(model, backend)
+                cascade = ()
+                if cascade_model:
+                    cascade = (
+                        cascade_model,
+                        config.CASCADE_MIN_SCORE if cascade_min_score is None else cascade_min_score,
+                        config.CASCADE_MIN_MARGIN if cascade_min_margin is None else cascade_min_margin,
+                    )
+                publish_progress(
+                    file_id, "started", model=model, backend=backend, cascade_model=cascade_model
+                )
+                # a file with the same bytes may already have been classified the same way
+                reusable = find_reusable_classification(
+                    db,
+                    file,
+                    model,
+                    chunking_strategy,
+                    chunk_size,
+                    overlap,
+                    multi_label,
+                    backend,
+                    *cascade,
+                    adaptive=adaptive,
+                )
+                if reusable:
+                    task_logger.info(
+                        f"Reusing classification {reusable.id} of file {reusable.file_id} for file {file_id}"
+                    )
+                    with stage("reuse"):
+                        file_classification = copy_classification(db, reusable, file.id)
+                else:
+                    file_classification = classify_file(
+                        db,
+                        file,
+                        model,
+                        chunking_strategy,
+                        chunk_size,
+                        overlap,
+                        multi_label,
+                        backend,
+                        *cascade,
+                        adaptive=adaptive,
+                        check_cancelled=check_cancelled,
+                    )
+
+                # the file may have been re-uploaded or deleted while this ran
+                check_cancelled(force=True)
+                file_classification.cache_hits = run.cache_hits
+                file_classification.cache_misses = run.cache_misses
+                file.status = FileStatus.completed
+                file.updated_at = datetime.now(timezone.utc)
+                db.add(file)
+                with stage("commit"):
+                    db.commit()
+            # the timings go in after the results, so they include the commit
+            file_classification.duration_seconds = run.seconds
+            db.add(file_classification)
+            insert_stage_rows(db, file_classification.id, run.stages)
+            db.commit()
+            RUN_SECONDS.labels(model, "reused" if reusable else "classified").observe(run.seconds)
+            task_logger.info(
+                f"Classified file {file_id} in {run.seconds:.2f}s: "
+                + ", ".join(f"{entry['stage']} {entry['seconds']:.2f}s" for entry in run.stages)
+            )
+            publish_progress(
+                file_id,
+                "persisted",
+                file_classification_id=file_classification.id,
+                reused_from=reusable.id if reusable else None,
+            )
+            publish_progress(file_id, "completed")
+        except TaskCancelled as err:
+            db.rollback()
+            task_logger.info(f"{err}, dropping its results for file {file_id}")
+            RUN_SECONDS.labels(model, "cancelled").observe(run.seconds)
+            publish_progress(file_id, "cancelled")
+        except Exception as err:
+            db.rollback()
+            task_logger.exception(err)
+            RUN_SECONDS.labels(model, "failed").observe(run.seconds)
+            file_to_fail = db.get(FileRecord, file_id)
+            if file_to_fail:
+                file_to_fail.status = FileStatus.failed
+                file_to_fail.updated_at = datetime.now(timezone.utc)
+                db.add(file_to_fail)
+                db.commit()
+            publish_progress(file_id, "failed")
+        finally:
+            finish_task(task_id)
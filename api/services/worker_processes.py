@@ -0,0 +1,88 @@
+import gc
+import logging
+import os
+from typing import Dict, Optional
+
+import torch
+
+from .. import config
+from .memory import format_bytes
+from .metrics import record_worker_memory
+
+logger = logging.getLogger("classifyinator")
+
+# set in the parent of a prefork worker before it forks, read by every child
+_child_torch_threads = None
+
+
+def available_cpus() -> int:
+    """CPUs this process may run on, which can be fewer than the machine has."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def torch_threads_per_child(concurrency: int) -> int:
+    if config.WORKER_TORCH_THREADS > 0:
+        return config.WORKER_TORCH_THREADS
+    return max(1, available_cpus() // max(1, concurrency))
+
+
+def set_torch_threads():
+    """Torch threads of a worker running its tasks in one process, when WORKER_TORCH_THREADS says."""
+    if config.WORKER_TORCH_THREADS > 0:
+        torch.set_num_threads(config.WORKER_TORCH_THREADS)
+
+
+def prepare_parent(concurrency: int) -> int:
+    """Called in the parent of a prefork worker before it loads the models.
+
+    The parent runs torch on one thread, so it has no OpenMP thread pool for the
+    children to inherit (an OpenMP pool doesn't survive fork and can hang a child).
+    Returns the torch threads each child will use.
+    """
+    global _child_torch_threads
+    _child_torch_threads = torch_threads_per_child(concurrency)
+    torch.set_num_threads(1)
+    return _child_torch_threads
+
+
+def freeze_parent() -> Dict[str, Optional[int]]:
+    """Called in the parent of a prefork worker once the models are loaded, before it forks.
+
+    The weights are shared copy-on-write with the children. Frozen objects are left
+    alone by the garbage collector, which would otherwise write to the pages of every
+    object the parent loaded and make each child copy them. Returns the parent's memory.
+    """
+    gc.collect()
+    gc.freeze()
+    return record_worker_memory()
+
+
+def init_child():
+    """Called in each child of a prefork worker right after the fork."""
+    torch.set_num_threads(_child_torch_threads or torch_threads_per_child(1))
+    reset_inherited_state()
+    memory = record_worker_memory()
+    logger.info(
+        f"Worker process {os.getpid()} started with {torch.get_num_threads()} torch threads, "
+        f"RSS {format_bytes(memory['rss'])}, PSS {format_bytes(memory['pss'])}, "
+        f"shared {format_bytes(memory['shared'])}"
+    )
+
+
+def reset_inherited_state():
+    """Drop the connections and threads a child inherited from its parent.
+
+    Pooled database connections, the SQLite and Redis handles of the caches and the
+    micro-batching threads belong to the parent, the child opens its own on first use.
+    """
+    from ..database import engine
+    from .batching import get_inference_scheduler
+    from .classification_cache import get_classification_cache
+    from .progress import get_progress_broker
+
+    engine.dispose(close=False)
+    for cached in (get_inference_scheduler, get_classification_cache, get_progress_broker):
+        cached.cache_clear()
@@ -5,7 +5,7 @@ import {
   CardHeader,
   CardTitle,
 } from '@/components/ui/card'
-import type { SchemaFileRecordWithClassifications } from '@/types/types'
+import type { SchemaFileRecordSummary } from '@/types/types'
 import { Tooltip, TooltipContent, TooltipTrigger } from '../tooltip'
 import { Select } from '@radix-ui/react-select'
 import {
@@ -23,7 +23,7 @@ import type { useClassificationData } from '@/hooks/use-classification-data'
 type ClassificationData = ReturnType<typeof useClassificationData>
 
 interface ClassificationChartProps extends ClassificationData {
-  row: SchemaFileRecordWithClassifications
+  row: SchemaFileRecordSummary
 }
 
 export function ClassificationChart({
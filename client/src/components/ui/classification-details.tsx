@@ -5,6 +5,7 @@ import { Collapsible, CollapsibleContent } from './collapsible'
 import type { useClassificationData } from '@/hooks/use-classification-data'
 import { Tooltip, TooltipContent, TooltipTrigger } from './tooltip'
 import { ScrollArea } from '@/components/ui/scroll-area'
+import { useClassificationChunks } from '@/hooks/use-classification-chunks'
 
 type ClassificationData = ReturnType<typeof useClassificationData>
 
@@ -16,6 +17,10 @@ export const ClassificationDetails = ({
   selectedClassification,
 }: ClassificationDetailsProps) => {
   const [isOpen, setIsOpen] = useState<boolean>(false)
+  const { chunks, hasMore, isLoading, loadMore } = useClassificationChunks(
+    selectedClassification?.id,
+    isOpen,
+  )
 
   return (
     <div>
@@ -40,44 +45,52 @@ export const ClassificationDetails = ({
         <CollapsibleContent>
           {selectedClassification ? (
             <ScrollArea className="h-[400px] rounded-md border p-4 bg-muted/50">
-              {selectedClassification.file_classification_chunks.map(
-                (chunk) => {
-                  const chartColor = chunk.chunk_classification_label
-                    .toLowerCase()
-                    .replace(/ /g, '-')
-                  return (
-                    <div
-                      key={chunk.id}
-                      className={`font-mono text-sm py-1 px-2 text-white my-2 w-fit rounded-md bg-secondary border-l-6`}
-                      style={{
-                        borderLeftColor: `var(--chart-${chartColor})`,
-                      }}
-                    >
-                      <Tooltip>
-                        <TooltipTrigger className="text-left">
-                          {chunk.chunk}
-                        </TooltipTrigger>
-                        <TooltipContent className="flex items-center">
-                          <div
-                            style={{
-                              backgroundColor: `var(--chart-${chartColor})`,
-                              height: '1.5em',
-                              width: '1.5em',
-                              borderRadius: '20%',
-                              display: 'inline-block',
-                              marginRight: '0.5em',
-                            }}
-                          ></div>
-                          <span>
-                            {chunk.chunk_classification_label}:{' '}
-                            {Math.round(chunk.chunk_classification_score * 100)}
-                            %
-                          </span>
-                        </TooltipContent>
-                      </Tooltip>
-                    </div>
-                  )
-                },
+              {chunks.map((chunk) => {
+                const chartColor = chunk.chunk_classification_label
+                  .toLowerCase()
+                  .replace(/ /g, '-')
+                return (
+                  <div
+                    key={chunk.id}
+                    className={`font-mono text-sm py-1 px-2 text-white my-2 w-fit rounded-md bg-secondary border-l-6`}
+                    style={{
+                      borderLeftColor: `var(--chart-${chartColor})`,
+                    }}
+                  >
+                    <Tooltip>
+                      <TooltipTrigger className="text-left">
+                        {chunk.chunk}
+                      </TooltipTrigger>
+                      <TooltipContent className="flex items-center">
+                        <div
+                          style={{
+                            backgroundColor: `var(--chart-${chartColor})`,
+                            height: '1.5em',
+                            width: '1.5em',
+                            borderRadius: '20%',
+                            display: 'inline-block',
+                            marginRight: '0.5em',
+                          }}
+                        ></div>
+                        <span>
+                          {chunk.chunk_classification_label}:{' '}
+                          {Math.round(chunk.chunk_classification_score * 100)}%
+                        </span>
+                      </TooltipContent>
+                    </Tooltip>
+                  </div>
+                )
+              })}
+              {hasMore && (
+                <Button
+                  variant="outline"
+                  size="sm"
+                  className="my-2"
+                  disabled={isLoading}
+                  onClick={loadMore}
+                >
+                  Load more
+                </Button>
               )}
             </ScrollArea>
           ) : (
@@ -3,13 +3,13 @@ import { ArrowUpDown } from 'lucide-react'
 import { Skeleton } from '@/components/ui/skeleton'
 import { Button } from '@/components/ui/button'
 import {
-  type SchemaFileRecordWithClassifications,
+  type SchemaFileRecordSummary,
   FileStatus,
-  type SchemaFileClassificationWithScoresAndChunks,
+  type SchemaFileClassificationSummary,
 } from '@/types/types'
 import { StatusDot } from './status-dot'
 
-export const columns: ColumnDef<SchemaFileRecordWithClassifications>[] = [
+export const columns: ColumnDef<SchemaFileRecordSummary>[] = [
   {
     accessorKey: 'status',
     header: 'Status',
@@ -48,7 +48,7 @@ export const columns: ColumnDef<SchemaFileRecordWithClassifications>[] = [
 
       const classifications = row.getValue(
         'classifications',
-      ) as SchemaFileClassificationWithScoresAndChunks[]
+      ) as SchemaFileClassificationSummary[]
 
       if (classifications.length === 0) {
         return <div>-</div>
@@ -66,7 +66,7 @@ export const columns: ColumnDef<SchemaFileRecordWithClassifications>[] = [
       const status = row.getValue('status') as FileStatus
       const classifications = row.getValue(
         'classifications',
-      ) as SchemaFileClassificationWithScoresAndChunks[]
+      ) as SchemaFileClassificationSummary[]
 
       if (status === FileStatus.Processing) {
         return <Skeleton className="h-[20px] w-[100px] rounded-full" />
@@ -91,7 +91,7 @@ export const columns: ColumnDef<SchemaFileRecordWithClassifications>[] = [
       const status = row.getValue('status') as FileStatus
       const classifications = row.getValue(
         'classifications',
-      ) as SchemaFileClassificationWithScoresAndChunks[]
+      ) as SchemaFileClassificationSummary[]
 
       if (status === FileStatus.Processing) {
         return <Skeleton className="h-[20px] w-[40px] rounded-full" />
@@ -31,17 +31,20 @@ import {
 } from '@/components/ui/table'
 import {
   FileStatus,
-  type SchemaFileRecordWithClassifications,
+  type SchemaFileRecordSummary,
 } from '@/types/types'
 import { RowDialog } from './row-dialog'
 import { UploadFile } from './upload-file'
 import { TablePagination } from './table-pagination'
 
 interface DataTableProps {
-  data: SchemaFileRecordWithClassifications[]
-  columns: ColumnDef<SchemaFileRecordWithClassifications>[]
+  data: SchemaFileRecordSummary[]
+  columns: ColumnDef<SchemaFileRecordSummary>[]
   onFileUploadSuccess: (fileId: number) => void
   deleteFile: (fileId: number) => void
+  hasMore: boolean
+  isLoadingMore: boolean
+  loadMore: () => void
 }
 
 export function DataTable({
@@ -49,6 +52,9 @@ export function DataTable({
   columns,
   onFileUploadSuccess,
   deleteFile,
+  hasMore,
+  isLoadingMore,
+  loadMore,
 }: DataTableProps) {
   const [sorting, setSorting] = useState<SortingState>([])
   const [columnFilters, setColumnFilters] = useState<ColumnFiltersState>([])
@@ -57,7 +63,7 @@ export function DataTable({
   const [isDialogOpen, setIsDialogOpen] = useState(false)
   const [isRowDetailsDialogOpen, setIsRowDetailsDialogOpen] = useState(false)
   const [selectedRow, setSelectedRow] =
-    useState<SchemaFileRecordWithClassifications>()
+    useState<SchemaFileRecordSummary>()
 
   const table = useReactTable({
     data,
@@ -179,7 +185,12 @@ export function DataTable({
           </TableBody>
         </Table>
       </div>
-      <TablePagination table={table} />
+      <TablePagination
+        table={table}
+        hasMore={hasMore}
+        isLoadingMore={isLoadingMore}
+        loadMore={loadMore}
+      />
       <RowDialog
         selectedRow={selectedRow}
         isRowDetailsDialogOpen={isRowDetailsDialogOpen}
@@ -1,6 +1,6 @@
 import {
   FileStatus,
-  type SchemaFileRecordWithClassifications,
+  type SchemaFileRecordSummary,
 } from '@/types/types'
 import { Dialog, DialogContent, DialogTitle } from '../dialog'
 import type { Dispatch, SetStateAction } from 'react'
@@ -13,7 +13,7 @@ import { DeleteFile } from '../delete-file'
 import { ScrollArea } from '../scroll-area'
 
 interface RowDialogProps {
-  selectedRow: SchemaFileRecordWithClassifications | undefined
+  selectedRow: SchemaFileRecordSummary | undefined
   isRowDetailsDialogOpen: boolean
   setIsRowDetailsDialogOpen: Dispatch<SetStateAction<boolean>>
   onFileUploadSuccess: (fileId: number) => void
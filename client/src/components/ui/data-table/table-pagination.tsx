@@ -1,11 +1,20 @@
 import type { Table } from '@tanstack/react-table'
 import { Button } from '../button'
-import type { SchemaFileRecordWithClassifications } from '@/types/types'
+import type { SchemaFileRecordSummary } from '@/types/types'
 
 interface TablePaginationProps {
-  table: Table<SchemaFileRecordWithClassifications>
+  table: Table<SchemaFileRecordSummary>
+  // older files are fetched from the API a page at a time
+  hasMore: boolean
+  isLoadingMore: boolean
+  loadMore: () => void
 }
-export const TablePagination = ({ table }: TablePaginationProps) => {
+export const TablePagination = ({
+  table,
+  hasMore,
+  isLoadingMore,
+  loadMore,
+}: TablePaginationProps) => {
   return (
     <div className="flex items-center justify-end space-x-2 py-4">
       <div className="text-muted-foreground flex-1 text-sm">
@@ -13,6 +22,16 @@ export const TablePagination = ({ table }: TablePaginationProps) => {
         {table.getFilteredRowModel().rows.length} row(s) selected.
       </div>
       <div className="space-x-2">
+        {hasMore && (
+          <Button
+            variant="outline"
+            size="sm"
+            onClick={loadMore}
+            disabled={isLoadingMore}
+          >
+            Load more
+          </Button>
+        )}
         <Button
           variant="outline"
           size="sm"
@@ -1,6 +1,6 @@
 import {
   FileStatus,
-  type SchemaFileRecordWithClassifications,
+  type SchemaFileRecordSummary,
 } from '@/types/types'
 import { Dialog, DialogContent, DialogTitle, DialogTrigger } from '../dialog'
 import { VisuallyHidden } from '@radix-ui/react-visually-hidden'
@@ -12,7 +12,7 @@ import { FileInput } from '../file-input'
 interface UploadFileProps {
   isDialogOpen: boolean
   setIsDialogOpen: Dispatch<SetStateAction<boolean>>
-  data: SchemaFileRecordWithClassifications[]
+  data: SchemaFileRecordSummary[]
   onFileUploadSuccess: (fileId: number) => void
 }
 
@@ -5,12 +5,12 @@ import {
   DialogTitle,
 } from '@/components/ui/dialog'
 import { Button } from '@/components/ui/button'
-import type { SchemaFileRecordWithClassifications } from '@/types/types'
+import type { SchemaFileRecordSummary } from '@/types/types'
 import { useHandleFileError } from '@/hooks/use-handle-file-error'
 
 interface ProcessingFileErrorDialogProps {
-  data: SchemaFileRecordWithClassifications[]
-  setData: (data: SchemaFileRecordWithClassifications[]) => void
+  data: SchemaFileRecordSummary[]
+  setData: (data: SchemaFileRecordSummary[]) => void
   fileId: number | null
   setFileId: (fileId: number | null) => void
 }
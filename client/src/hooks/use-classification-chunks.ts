@@ -0,0 +1,59 @@
+import { useCallback, useEffect, useState } from 'react'
+import type {
+  SchemaFileClassificationChunkPage,
+  SchemaFileClassificationChunkRead,
+} from '@/types/types'
+
+const CHUNK_PAGE_SIZE = 200
+
+export const useClassificationChunks = (
+  fileClassificationId: number | undefined,
+  enabled: boolean,
+) => {
+  const [chunks, setChunks] = useState<SchemaFileClassificationChunkRead[]>([])
+  const [nextCursor, setNextCursor] = useState<number | null>(null)
+  const [isLoading, setIsLoading] = useState<boolean>(false)
+  const apiUrl = import.meta.env.VITE_API_URL
+
+  const fetchPage = useCallback(
+    async (cursor: number | null) => {
+      if (fileClassificationId === undefined) return
+      setIsLoading(true)
+      try {
+        const params = new URLSearchParams({
+          limit: CHUNK_PAGE_SIZE.toString(),
+        })
+        if (cursor !== null) params.set('cursor', cursor.toString())
+        const response = await fetch(
+          `${apiUrl}/files/classifications/${fileClassificationId}/chunks?${params}`,
+        )
+        if (!response.ok) throw new Error('Failed to fetch chunks')
+        const page: SchemaFileClassificationChunkPage = await response.json()
+        setChunks((current) =>
+          cursor === null
+            ? (page.items ?? [])
+            : [...current, ...(page.items ?? [])],
+        )
+        setNextCursor(page.next_cursor ?? null)
+      } catch (error) {
+        console.error('Error fetching classification chunks:', error)
+      } finally {
+        setIsLoading(false)
+      }
+    },
+    [apiUrl, fileClassificationId],
+  )
+
+  // chunks are only loaded once the details are opened
+  useEffect(() => {
+    setChunks([])
+    setNextCursor(null)
+    if (enabled) fetchPage(null)
+  }, [enabled, fetchPage])
+
+  const loadMore = useCallback(() => {
+    if (nextCursor !== null) fetchPage(nextCursor)
+  }, [fetchPage, nextCursor])
+
+  return { chunks, hasMore: nextCursor !== null, isLoading, loadMore }
+}
@@ -1,7 +1,7 @@
 import type { ChartConfig } from '@/components/ui/chart'
 import type {
-  SchemaFileClassificationWithScoresAndChunks,
-  SchemaFileRecordWithClassifications,
+  SchemaFileClassificationSummary,
+  SchemaFileRecordSummary,
 } from '@/types/types'
 import { useEffect, useMemo, useState } from 'react'
 
@@ -12,18 +12,18 @@ type ChartDataType = {
 }[]
 
 const generateClassificationKey = (
-  classification: SchemaFileClassificationWithScoresAndChunks,
+  classification: SchemaFileClassificationSummary,
 ) => {
   return `${classification.model}-${classification.file_id}-${classification.multi_label}-${classification.chunking_strategy}-${classification.chunk_size}-${classification.chunk_overlap_size}`
 }
 
 export const useClassificationData = (
-  row: SchemaFileRecordWithClassifications | undefined,
+  row: SchemaFileRecordSummary | undefined,
 ) => {
   const classifications = useMemo(() => {
     if (!row) return {}
     return row.classifications?.reduce<
-      Record<string, SchemaFileClassificationWithScoresAndChunks>
+      Record<string, SchemaFileClassificationSummary>
     >((acc, classification) => {
       const key = generateClassificationKey(classification)
       acc[key] = classification
@@ -48,7 +48,7 @@ export const useClassificationData = (
   }, [row])
 
   const selectedClassification = useMemo<
-    SchemaFileClassificationWithScoresAndChunks | undefined
+    SchemaFileClassificationSummary | undefined
   >(() => {
     if (!selectedClassificationKey) return undefined
     return classifications![selectedClassificationKey]
@@ -1,15 +1,48 @@
 import { useState, useCallback, useEffect, useRef } from 'react'
 import {
   FileStatus,
-  type SchemaFileRecordWithClassifications,
+  type SchemaFileRecordPage,
+  type SchemaFileRecordSummary,
 } from '@/types/types'
 import { useHandleFileError } from '@/hooks/use-handle-file-error'
 
+const FILE_PAGE_SIZE = 100
+
+// best scoring classifications first, and the best scores of each first
+const sortClassifications = (
+  file: SchemaFileRecordSummary,
+): SchemaFileRecordSummary => {
+  if (!file.classifications || file.classifications.length === 0) {
+    return file
+  }
+  const sortedClassifications = file.classifications
+    .map((classification) => ({
+      ...classification,
+      file_classification_scores:
+        classification.file_classification_scores.sort(
+          (a, b) => b.classification_score - a.classification_score,
+        ),
+    }))
+    .sort(
+      (a, b) =>
+        (b.file_classification_scores[0]?.classification_score ?? 0) -
+        (a.file_classification_scores[0]?.classification_score ?? 0),
+    )
+  return {
+    ...file,
+    classifications: sortedClassifications,
+  }
+}
+
 export const useFileData = () => {
   const [fileId, setFileId] = useState<number | null>(null)
-  const [data, setData] = useState<SchemaFileRecordWithClassifications[]>([])
+  const [data, setData] = useState<SchemaFileRecordSummary[]>([])
+  const [nextCursor, setNextCursor] = useState<number | null>(null)
+  const [isLoadingMore, setIsLoadingMore] = useState<boolean>(false)
   const apiUrl = import.meta.env.VITE_API_URL
   const intervalRef = useRef<number | null>(null)
+  // set once older pages were loaded, a refresh of the first page keeps them
+  const loadedMoreRef = useRef<boolean>(false)
 
   const { setIsFileProcessingErrorDialogOpen, setErrorFilename } =
     useHandleFileError({
@@ -18,40 +51,61 @@ export const useFileData = () => {
       setData,
     })
 
+  const fetchPage = useCallback(
+    async (cursor: number | null) => {
+      // the list is paged, newest first
+      const params = new URLSearchParams({ limit: FILE_PAGE_SIZE.toString() })
+      if (cursor !== null) params.set('cursor', cursor.toString())
+      const response = await fetch(`${apiUrl}/files/list?${params}`)
+      if (!response.ok) throw new Error('Failed to fetch file list')
+      const page: SchemaFileRecordPage = await response.json()
+      return {
+        items: (page.items ?? []).map(sortClassifications),
+        nextCursor: page.next_cursor ?? null,
+      }
+    },
+    [apiUrl],
+  )
+
   const fetchData = useCallback(async () => {
     try {
-      const response = await fetch(`${apiUrl}/files/list`)
-      if (!response.ok) throw new Error('Failed to fetch file list')
-      const files = await response.json()
-      const sortedFiles = files.map(
-        (file: SchemaFileRecordWithClassifications) => {
-          if (!file.classifications || file.classifications.length === 0) {
-            return file
-          }
-          const sortedClassifications = file.classifications
-            .map((classification) => ({
-              ...classification,
-              file_classification_scores:
-                classification.file_classification_scores.sort(
-                  (a, b) => b.classification_score - a.classification_score,
-                ),
-            }))
-            .sort(
-              (a, b) =>
-                (b.file_classification_scores[0]?.classification_score ?? 0) -
-                (a.file_classification_scores[0]?.classification_score ?? 0),
-            )
-          return {
-            ...file,
-            classifications: sortedClassifications,
-          }
-        },
+      const page = await fetchPage(null)
+      if (!loadedMoreRef.current) {
+        setData(page.items)
+        setNextCursor(page.nextCursor)
+        return
+      }
+      // the first page is fresh, the files loaded after it are kept
+      const oldest = page.items[page.items.length - 1]?.id
+      setData((currentData) =>
+        oldest === undefined
+          ? page.items
+          : [...page.items, ...currentData.filter((file) => file.id < oldest)],
       )
-      setData(sortedFiles)
     } catch (error) {
       console.error('Error fetching file list:', error)
     }
-  }, [apiUrl])
+  }, [fetchPage])
+
+  const loadMore = useCallback(async () => {
+    if (nextCursor === null) return
+    setIsLoadingMore(true)
+    try {
+      const page = await fetchPage(nextCursor)
+      loadedMoreRef.current = true
+      setData((currentData) => [
+        ...currentData,
+        ...page.items.filter(
+          (file) => !currentData.some((loaded) => loaded.id === file.id),
+        ),
+      ])
+      setNextCursor(page.nextCursor)
+    } catch (error) {
+      console.error('Error fetching file list:', error)
+    } finally {
+      setIsLoadingMore(false)
+    }
+  }, [fetchPage, nextCursor])
 
   useEffect(() => {
     fetchData()
@@ -145,5 +199,15 @@ export const useFileData = () => {
     [apiUrl],
   )
 
-  return { data, setData, fileId, setFileId, onFileUploadSuccess, deleteFile }
+  return {
+    data,
+    setData,
+    fileId,
+    setFileId,
+    onFileUploadSuccess,
+    deleteFile,
+    hasMore: nextCursor !== null,
+    isLoadingMore,
+    loadMore,
+  }
 }
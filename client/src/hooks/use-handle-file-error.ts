@@ -1,13 +1,13 @@
 import type {
   SchemaFileRecord,
-  SchemaFileRecordWithClassifications,
+  SchemaFileRecordSummary,
 } from '@/types/types'
 import { useState } from 'react'
 
 interface useHandleFileErrorProps {
-  data: SchemaFileRecordWithClassifications[]
+  data: SchemaFileRecordSummary[]
   setFileId: (fileId: number | null) => void
-  setData: (data: SchemaFileRecordWithClassifications[]) => void
+  setData: (data: SchemaFileRecordSummary[]) => void
 }
 
 export const useHandleFileError = ({
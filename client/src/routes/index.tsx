@@ -9,8 +9,17 @@ export const Route = createFileRoute('/')({
 })
 
 function App() {
-  const { data, setData, fileId, setFileId, onFileUploadSuccess, deleteFile } =
-    useFileData()
+  const {
+    data,
+    setData,
+    fileId,
+    setFileId,
+    onFileUploadSuccess,
+    deleteFile,
+    hasMore,
+    isLoadingMore,
+    loadMore,
+  } = useFileData()
 
   return (
     <div className="flex h-screen items-center justify-center w-full">
@@ -19,6 +28,9 @@ function App() {
         columns={columns}
         onFileUploadSuccess={onFileUploadSuccess}
         deleteFile={deleteFile}
+        hasMore={hasMore}
+        isLoadingMore={isLoadingMore}
+        loadMore={loadMore}
       />
       <ProcessingFileErrorDialog
         data={data}
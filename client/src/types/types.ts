@@ -21,6 +21,28 @@ export interface paths {
     patch?: never
     trace?: never
   }
+  '/files/classifications/{file_classification_id}/chunks': {
+    parameters: {
+      query?: never
+      header?: never
+      path?: never
+      cookie?: never
+    }
+    /**
+     * List Classification Chunks
+     * @description Chunks of one classification in document order, for the deep dive view.
+     *
+     *     Each chunk has every label's score and its text, sliced from the file's text.
+     */
+    get: operations['list_classification_chunks_files_classifications__file_classification_id__chunks_get']
+    put?: never
+    post?: never
+    delete?: never
+    options?: never
+    head?: never
+    patch?: never
+    trace?: never
+  }
   '/files/process': {
     parameters: {
       query?: never
@@ -111,8 +133,15 @@ export interface components {
      * @enum {string}
      */
     ClassificationLabel: ClassificationLabel
-    /** FileClassificationChunk */
-    FileClassificationChunk: {
+    /** FileClassificationChunkPage */
+    FileClassificationChunkPage: {
+      /** Items */
+      items?: components['schemas']['FileClassificationChunkRead'][]
+      /** Next Cursor */
+      next_cursor?: number | null
+    }
+    /** FileClassificationChunkRead */
+    FileClassificationChunkRead: {
       /** Id */
       id: number
       /** File Classification Id */
@@ -126,6 +155,12 @@ export interface components {
       chunk_classification_label: components['schemas']['ClassificationLabel']
       /** Chunk Classification Score */
       chunk_classification_score: number
+      /** Scores */
+      scores?: {
+        [key: string]: number
+      } | null
+      /** Model */
+      model?: string | null
     }
     /** FileClassificationScore */
     FileClassificationScore: {
@@ -137,8 +172,8 @@ export interface components {
       classification_score: number
       classification: components['schemas']['ClassificationLabel']
     }
-    /** FileClassificationWithScoresAndChunks */
-    FileClassificationWithScoresAndChunks: {
+    /** FileClassificationSummary */
+    FileClassificationSummary: {
       /** Id */
       id: number
       /** File Id */
@@ -152,6 +187,31 @@ export interface components {
       chunk_size: number | null
       /** Chunk Overlap Size */
       chunk_overlap_size: number | null
+      backend?: components['schemas']['InferenceBackend'] | null
+      /** Cascade Model */
+      cascade_model?: string | null
+      /** Cascade Min Score */
+      cascade_min_score?: number | null
+      /** Cascade Min Margin */
+      cascade_min_margin?: number | null
+      /**
+       * Adaptive
+       * @default false
+       */
+      adaptive: boolean
+      /** Chunks Classified */
+      chunks_classified?: number | null
+      /** Chunks Total */
+      chunks_total?: number | null
+      /** Duration Seconds */
+      duration_seconds?: number | null
+      /** Cache Hits */
+      cache_hits?: number | null
+      /** Cache Misses */
+      cache_misses?: number | null
+      top_label: components['schemas']['ClassificationLabel'] | null
+      /** Top Score */
+      top_score: number | null
       /**
        * Created At
        * Format: date-time
@@ -159,8 +219,6 @@ export interface components {
       created_at: string
       /** File Classification Scores */
       file_classification_scores: components['schemas']['FileClassificationScore'][]
-      /** File Classification Chunks */
-      file_classification_chunks: components['schemas']['FileClassificationChunk'][]
     }
     /** FileRecord */
     FileRecord: {
@@ -168,10 +226,20 @@ export interface components {
       id?: number | null
       /** Filename */
       filename: string
-      /** File Contents */
-      file_contents: string
+      /** Text Ref */
+      text_ref?: string | null
+      /** Text Length */
+      text_length?: number | null
+      /** Content Hash */
+      content_hash?: string | null
+      /** Upload Ref */
+      upload_ref?: string | null
       /** @default Processing */
       status: components['schemas']['FileStatus']
+      /** Extraction Seconds */
+      extraction_seconds?: number | null
+      /** Batch Id */
+      batch_id?: number | null
       /**
        * Created At
        * Format: date-time
@@ -183,13 +251,28 @@ export interface components {
        */
       updated_at?: string
     }
-    /** FileRecordWithClassifications */
-    FileRecordWithClassifications: {
+    /** FileRecordPage */
+    FileRecordPage: {
+      /** Items */
+      items?: components['schemas']['FileRecordSummary'][]
+      /** Next Cursor */
+      next_cursor?: number | null
+    }
+    /** FileRecordSummary */
+    FileRecordSummary: {
       /** Id */
       id: number
       /** Filename */
       filename: string
+      /** Content Hash */
+      content_hash?: string | null
+      /** Text Length */
+      text_length?: number | null
       status: components['schemas']['FileStatus']
+      /** Extraction Seconds */
+      extraction_seconds?: number | null
+      /** Batch Id */
+      batch_id?: number | null
       /**
        * Created At
        * Format: date-time
@@ -201,13 +284,18 @@ export interface components {
        */
       updated_at: string
       /** Classifications */
-      classifications?: components['schemas']['FileClassificationWithScoresAndChunks'][]
+      classifications?: components['schemas']['FileClassificationSummary'][]
     }
     /**
      * FileStatus
      * @enum {string}
      */
     FileStatus: FileStatus
+    /**
+     * InferenceBackend
+     * @enum {string}
+     */
+    InferenceBackend: InferenceBackend
     /** HTTPValidationError */
     HTTPValidationError: {
       /** Detail */
@@ -255,16 +343,20 @@ export type SchemaBodyUploadFileFilesUploadPost =
 export type SchemaChunkingStrategy = components['schemas']['ChunkingStrategy']
 export type SchemaClassificationLabel =
   components['schemas']['ClassificationLabel']
-export type SchemaFileClassificationChunk =
-  components['schemas']['FileClassificationChunk']
+export type SchemaFileClassificationChunkPage =
+  components['schemas']['FileClassificationChunkPage']
+export type SchemaFileClassificationChunkRead =
+  components['schemas']['FileClassificationChunkRead']
 export type SchemaFileClassificationScore =
   components['schemas']['FileClassificationScore']
-export type SchemaFileClassificationWithScoresAndChunks =
-  components['schemas']['FileClassificationWithScoresAndChunks']
+export type SchemaFileClassificationSummary =
+  components['schemas']['FileClassificationSummary']
 export type SchemaFileRecord = components['schemas']['FileRecord']
-export type SchemaFileRecordWithClassifications =
-  components['schemas']['FileRecordWithClassifications']
+export type SchemaFileRecordPage = components['schemas']['FileRecordPage']
+export type SchemaFileRecordSummary =
+  components['schemas']['FileRecordSummary']
 export type SchemaFileStatus = components['schemas']['FileStatus']
+export type SchemaInferenceBackend = components['schemas']['InferenceBackend']
 export type SchemaHttpValidationError =
   components['schemas']['HTTPValidationError']
 export type SchemaModels = components['schemas']['Models']
@@ -275,7 +367,14 @@ export type $defs = Record<string, never>
 export interface operations {
   list_files_files_list_get: {
     parameters: {
-      query?: never
+      query?: {
+        cursor?: number | null
+        limit?: number
+        status?: components['schemas']['FileStatus'] | null
+        label?: components['schemas']['ClassificationLabel'] | null
+        created_after?: string | null
+        created_before?: string | null
+      }
       header?: never
       path?: never
       cookie?: never
@@ -288,7 +387,50 @@ export interface operations {
           [name: string]: unknown
         }
         content: {
-          'application/json': components['schemas']['FileRecordWithClassifications'][]
+          'application/json': components['schemas']['FileRecordPage']
+        }
+      }
+      /** @description Validation Error */
+      422: {
+        headers: {
+          [name: string]: unknown
+        }
+        content: {
+          'application/json': components['schemas']['HTTPValidationError']
+        }
+      }
+    }
+  }
+  list_classification_chunks_files_classifications__file_classification_id__chunks_get: {
+    parameters: {
+      query?: {
+        cursor?: number | null
+        limit?: number
+      }
+      header?: never
+      path: {
+        file_classification_id: number
+      }
+      cookie?: never
+    }
+    requestBody?: never
+    responses: {
+      /** @description Successful Response */
+      200: {
+        headers: {
+          [name: string]: unknown
+        }
+        content: {
+          'application/json': components['schemas']['FileClassificationChunkPage']
+        }
+      }
+      /** @description Validation Error */
+      422: {
+        headers: {
+          [name: string]: unknown
+        }
+        content: {
+          'application/json': components['schemas']['HTTPValidationError']
         }
       }
     }
@@ -442,6 +584,11 @@ export enum FileStatus {
   Completed = 'Completed',
   Failed = 'Failed',
 }
+export enum InferenceBackend {
+  torch = 'torch',
+  quantized = 'quantized',
+  onnx = 'onnx',
+}
 export enum Models {
   facebook_bart_large_mnli = 'facebook/bart-large-mnli',
   knowledgator_comprehend_it_base = 'knowledgator/comprehend_it-base',